@@ -0,0 +1,355 @@
+"""
+Auswertung der Experten-Bewertungen: Welche Parameter und Ringe hängen mit guten Noten zusammen?
+
+Alle bewerteten Einträge werden in einem einzigen Durchlauf (seitenweise,
+Keyset-Pagination) in spaltenweise NumPy-Arrays geladen: Bewertung,
+Bewertungszeitpunkt, Weintyp und eine float32-Matrix der 16 Parameter.
+Alle Kennzahlen werden danach vektorisiert aus diesen Spalten berechnet
+(bincount statt Schleifen über Zeilen).
+
+- Korrelation jedes Parameters mit der Bewertung (Pearson und Spearman)
+- Durchschnittsnote je Parameter-Bereich (z.B. Säure 0.6–0.8)
+- je Ring: Note mit sichtbarem Ring gegenüber ohne (sichtbar ab Intensität 0.2)
+- je Weintyp, Notenverteilung, Verlauf pro Woche
+
+Der Bericht wird zwischengespeichert und nach neuen Bewertungen, Löschungen
+oder Importen beim nächsten Abruf neu berechnet.
+
+Verwendung:
+    python analytics.py                 # Bericht als Tabelle
+    python analytics.py --json          # Bericht als JSON
+    python analytics.py --period D      # Verlauf pro Tag statt pro Woche
+"""
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import expert_db as db
+from similarity_index import NUMERIC_KEYS, WINE_TYPES, wine_type
+
+
+# Bereiche für die Aufschlüsselung je Parameter (Intensitäten 0..1)
+PARAM_BINS = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+# Restzucker in g/L: trocken, halbtrocken, lieblich, Spätlese, Auslese, edelsüß
+SUGAR_BINS = (0.0, 9.0, 18.0, 45.0, 80.0, 150.0, 1000.0)
+
+# Ab dieser Intensität zeichnet imagegen._layer_rings einen Ring
+RING_VISIBLE = 0.2
+
+# Zeiträume für den Verlauf (NumPy-datetime64-Einheiten)
+PERIODS = {"D": "Tag", "W": "Woche", "M": "Monat"}
+
+# Weniger Bewertungen ergeben keine belastbaren Korrelationen
+MIN_SAMPLES = 3
+
+
+class RatingFrame:
+    """Spaltenweise Sicht auf alle bewerteten Einträge."""
+
+    def __init__(self, capacity: int = 0):
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.ratings = np.zeros(capacity, dtype=np.float32)
+        self.evaluated_at = np.zeros(capacity, dtype="datetime64[s]")
+        self.wine_types = np.zeros(capacity, dtype=np.int8)
+        self.params = np.zeros((capacity, len(NUMERIC_KEYS)), dtype=np.float32)
+        self.n = 0
+
+    def _reserve(self, needed: int):
+        if needed <= len(self.ids):
+            return
+        capacity = max(needed, 2 * len(self.ids))
+        for name in ("ids", "ratings", "evaluated_at", "wine_types", "params"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def _append(self, rows: list):
+        start, end = self.n, self.n + len(rows)
+        self._reserve(end)
+        ids, ratings, params, types, stamps = [], [], [], [], []
+        for evaluation_id, viz_params, rating, evaluated_at in rows:
+            p = json.loads(viz_params)
+            ids.append(evaluation_id)
+            ratings.append(rating)
+            params.append([_float(p.get(key)) for key in NUMERIC_KEYS])
+            types.append(WINE_TYPES.index(wine_type(p)))
+            stamps.append((evaluated_at or "")[:19] or "NaT")
+        self.ids[start:end] = ids
+        self.ratings[start:end] = ratings
+        self.params[start:end] = params
+        self.wine_types[start:end] = types
+        self.evaluated_at[start:end] = np.array(stamps, dtype="datetime64[s]")
+        self.n = end
+
+    def trim(self) -> "RatingFrame":
+        for name in ("ids", "ratings", "evaluated_at", "wine_types", "params"):
+            setattr(self, name, getattr(self, name)[:self.n])
+        return self
+
+    def column(self, key: str) -> np.ndarray:
+        return self.params[:, NUMERIC_KEYS.index(key)]
+
+
+def _float(value: Any) -> float:
+    try:
+        value = float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+    return value if np.isfinite(value) else 0.0
+
+
+def load_frame(batch_size: int = 2000) -> RatingFrame:
+    """
+    Lädt alle bewerteten Einträge in einem Durchlauf.
+
+    Gelesen werden nur ID, Parameter, Bewertung und Zeitpunkt (keine Texte
+    und Bilder); die Arrays werden anhand der Anzahl vorab angelegt.
+    """
+    db.flush_writes()
+    conn = db._connect()
+    try:
+        count = conn.execute("SELECT COUNT(*) FROM evaluations WHERE rating IS NOT NULL").fetchone()[0]
+        frame = RatingFrame(count)
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                """SELECT id, viz_params, rating, evaluated_at FROM evaluations
+                   WHERE rating IS NOT NULL AND id > ? ORDER BY id LIMIT ?""",
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            frame._append(rows)
+            last_id = rows[-1][0]
+    finally:
+        conn.close()
+    return frame.trim()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Kennzahlen (alle vektorisiert über die Spalten)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _pearson(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Korrelation jeder Spalte von ``x`` mit ``y``; konstante Spalten ergeben NaN."""
+    constant = np.ptp(x, axis=0) == 0
+    x = x.astype(np.float64)
+    x -= x.mean(axis=0)
+    y = y.astype(np.float64)
+    y -= y.mean()
+    denominator = np.sqrt((x * x).sum(axis=0) * (y @ y))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(constant | (denominator == 0), np.nan, (y @ x) / denominator)
+
+
+def _ranks(x: np.ndarray) -> np.ndarray:
+    """Ränge je Spalte, gleiche Werte bekommen den mittleren Rang."""
+    x = np.atleast_2d(x.T).T
+    ranks = np.empty(x.shape, dtype=np.float64)
+    for j in range(x.shape[1]):
+        values, inverse, counts = np.unique(x[:, j], return_inverse=True, return_counts=True)
+        upper = np.cumsum(counts)
+        ranks[:, j] = (upper - (counts - 1) / 2.0)[inverse]
+    return ranks
+
+
+def correlations(frame: RatingFrame) -> List[Dict[str, Any]]:
+    """Pearson- und Spearman-Korrelation jedes Parameters mit der Bewertung, stärkste zuerst."""
+    if frame.n < MIN_SAMPLES:
+        return []
+    pearson = _pearson(frame.params, frame.ratings)
+    spearman = _pearson(_ranks(frame.params), _ranks(frame.ratings)[:, 0])
+    nonzero = np.count_nonzero(frame.params, axis=0)
+    result = [
+        {"param": key, "pearson": _round(pearson[i]), "spearman": _round(spearman[i]), "nonzero": int(nonzero[i])}
+        for i, key in enumerate(NUMERIC_KEYS)
+    ]
+    result.sort(key=lambda r: -abs(r["pearson"]) if r["pearson"] is not None else 0.0)
+    return result
+
+
+def _grouped(groups: np.ndarray, ratings: np.ndarray, n_groups: int):
+    """Anzahl und Durchschnittsnote je Gruppe (bincount)."""
+    counts = np.bincount(groups, minlength=n_groups)
+    sums = np.bincount(groups, weights=ratings, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    return counts, means
+
+
+def param_breakdown(frame: RatingFrame) -> Dict[str, List[Dict[str, Any]]]:
+    """Anzahl und Durchschnittsnote je Wertebereich jedes Parameters."""
+    result = {}
+    for i, key in enumerate(NUMERIC_KEYS):
+        edges = np.array(SUGAR_BINS if key == "residual_sugar" else PARAM_BINS)
+        # Oberste Grenze gehört zum letzten Bereich
+        bins = np.clip(np.searchsorted(edges, frame.params[:, i], side="right") - 1, 0, len(edges) - 2)
+        counts, means = _grouped(bins, frame.ratings, len(edges) - 1)
+        result[key] = [
+            {"range": f"{edges[b]:g}–{edges[b + 1]:g}", "count": int(counts[b]), "mean_rating": _round(means[b])}
+            for b in range(len(edges) - 1)
+        ]
+    return result
+
+
+def ring_breakdown(frame: RatingFrame) -> List[Dict[str, Any]]:
+    """Je Ring: wie oft sichtbar, Durchschnittsnote mit und ohne den Ring."""
+    from imagegen import RING_DEFINITIONS
+
+    result = []
+    for name, _, _, _, key, _ in RING_DEFINITIONS:
+        visible = (frame.column(key) >= RING_VISIBLE).astype(np.int64)
+        counts, means = _grouped(visible, frame.ratings, 2)
+        result.append({
+            "ring": name,
+            "param": key,
+            "visible": int(counts[1]),
+            "hidden": int(counts[0]),
+            "mean_visible": _round(means[1]),
+            "mean_hidden": _round(means[0]),
+            "difference": _round(means[1] - means[0]),
+        })
+    return result
+
+
+def wine_type_breakdown(frame: RatingFrame) -> List[Dict[str, Any]]:
+    counts, means = _grouped(frame.wine_types.astype(np.int64), frame.ratings, len(WINE_TYPES))
+    return [
+        {"wine_type": t, "count": int(counts[i]), "mean_rating": _round(means[i])}
+        for i, t in enumerate(WINE_TYPES)
+    ]
+
+
+def distribution(frame: RatingFrame) -> Dict[int, int]:
+    counts = np.bincount(frame.ratings.astype(np.int64), minlength=6)
+    return {stars: int(counts[stars]) for stars in range(1, 6)}
+
+
+def trend(frame: RatingFrame, period: str = "W") -> List[Dict[str, Any]]:
+    """Anzahl und Durchschnittsnote je Tag, Woche oder Monat der Bewertung."""
+    if period not in PERIODS:
+        raise ValueError(f"Unbekannter Zeitraum: {period} (erlaubt: {', '.join(PERIODS)})")
+    known = ~np.isnat(frame.evaluated_at)
+    days = frame.evaluated_at[known].astype("datetime64[D]")
+    if days.size == 0:
+        return []
+    # NumPy-Wochen beginnen donnerstags (1970-01-01); um 3 Tage verschoben beginnen sie montags
+    shift = np.timedelta64(3 if period == "W" else 0, "D")
+    starts, inverse = np.unique((days + shift).astype(f"datetime64[{period}]"), return_inverse=True)
+    counts, means = _grouped(inverse, frame.ratings[known], len(starts))
+    return [
+        {"period": str(start.astype("datetime64[D]") - shift), "count": int(counts[i]), "mean_rating": _round(means[i])}
+        for i, start in enumerate(starts)
+    ]
+
+
+def _round(value: float, digits: int = 3) -> Optional[float]:
+    return None if not np.isfinite(value) else round(float(value), digits)
+
+
+def compute(frame: RatingFrame, period: str = "W") -> Dict[str, Any]:
+    """Vollständiger Bericht als JSON-taugliches Dict."""
+    return {
+        "rated": frame.n,
+        "mean_rating": _round(frame.ratings.mean()) if frame.n else None,
+        "distribution": distribution(frame),
+        "correlations": correlations(frame),
+        "rings": ring_breakdown(frame),
+        "wine_types": wine_type_breakdown(frame),
+        "params": param_breakdown(frame),
+        "trend": trend(frame, period),
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Cache mit Invalidierung über expert_db.add_change_listener
+# ─────────────────────────────────────────────────────────────────────────────
+
+class RatingAnalytics:
+    """
+    Hält den zuletzt berechneten Bericht je Zeitraum.
+
+    Der Listener markiert den Cache nur als veraltet (er läuft im
+    Writer-Thread); neu berechnet wird beim nächsten Abruf.
+    """
+
+    # Ereignisse, die bewertete Einträge verändern können ("save" legt nur unbewertete an)
+    EVENTS = ("rating", "delete", "import", "external")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reports: Dict[str, Dict[str, Any]] = {}
+        self._generation = 0
+
+    def on_change(self, event: str, evaluation_id: Optional[int]):
+        if event in self.EVENTS:
+            with self._lock:
+                self._generation += 1
+                self._reports.clear()
+
+    def report(self, period: str = "W") -> Dict[str, Any]:
+        with self._lock:
+            cached = self._reports.get(period)
+            generation = self._generation
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        frame = load_frame()
+        loaded = time.perf_counter()
+        report = compute(frame, period)
+        report["timings_ms"] = {
+            "load": round((loaded - start) * 1000, 1),
+            "compute": round((time.perf_counter() - loaded) * 1000, 1),
+        }
+        with self._lock:
+            # Nur speichern, wenn zwischendurch nichts geändert wurde
+            if generation == self._generation:
+                self._reports[period] = report
+        return report
+
+
+def open_analytics() -> RatingAnalytics:
+    """Cache mit registriertem Listener (für die App)."""
+    analytics = RatingAnalytics()
+    db.add_change_listener(analytics.on_change)
+    return analytics
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Auswertung der Bewertungen nach Parametern und Ringen")
+    parser.add_argument("--period", choices=list(PERIODS), default="W")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    report = RatingAnalytics().report(args.period)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    print(f"{report['rated']} Bewertungen, Durchschnitt {report['mean_rating']} "
+          f"(geladen in {report['timings_ms']['load']} ms, berechnet in {report['timings_ms']['compute']} ms)")
+    print(f"\n{'Parameter':<20} {'Pearson':>8} {'Spearman':>9} {'≠ 0':>6}")
+    for r in report["correlations"]:
+        print(f"{r['param']:<20} {r['pearson'] if r['pearson'] is not None else '-':>8} "
+              f"{r['spearman'] if r['spearman'] is not None else '-':>9} {r['nonzero']:>6}")
+    print(f"\n{'Ring':<14} {'sichtbar':>8} {'Ø mit':>7} {'Ø ohne':>7} {'Diff.':>7}")
+    for r in report["rings"]:
+        print(f"{r['ring']:<14} {r['visible']:>8} {_fmt(r['mean_visible']):>7} "
+              f"{_fmt(r['mean_hidden']):>7} {_fmt(r['difference']):>7}")
+    print(f"\n{PERIODS[args.period]:<12} {'Anzahl':>7} {'Ø':>6}")
+    for r in report["trend"]:
+        print(f"{r['period']:<12} {r['count']:>7} {_fmt(r['mean_rating']):>6}")
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.2f}"
+
+
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,33 @@
 Wine Expert Tool - Streamlit App
 Interaktive Bewertung von Wein-Visualisierungen durch Experten.
 """
+import os
+import time
+import concurrent.futures
 import streamlit as st
-from io import BytesIO
-import expert_db as db
-from text_analyzer import analyze_wine_description
-from imagegen import generate_wine_png_bytes
-from imagefetch import generate_wine_external_api
+import app_cache
+import image_encoding
+import perf
 import base64
 
 cookie = base64.b64encode(b'bWVnc3plbnRzZWd0ZWxlbml0').decode('ascii')
 
+# Maximale Wartezeit auf die externe Bildgenerierung (Sekunden)
+EXTERNAL_API_TIMEOUT = float(os.environ.get("WINE_EXTERNAL_TIMEOUT", 30))
+
+# Material-Icon statt Emoji: ein Emoji als page_icon lädt beim ersten Lauf
+# Streamlits komplette Emoji-Tabelle (~40 ms vor dem ersten Element)
 st.set_page_config(
     page_title="🍷 Wine Expert Tool",
-    page_icon="🍷",
+    page_icon=":material/wine_bar:",
     layout="wide",
 )
 
+# Prozessweite Ressourcen (über Reruns gecacht, siehe app_cache)
+db = app_cache.db_handle()
+# Änderungen anderer Prozesse (Job-Worker, Render-API, Import) invalidieren die Caches
+db.check_external_changes()
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Session State Initialisierung
 # ─────────────────────────────────────────────────────────────────────────────
@@ -25,6 +36,16 @@ if "current_viz" not in st.session_state:
     st.session_state.current_viz = None  # {"id": ..., "image_bytes": ..., "params": ...}
 if "show_history" not in st.session_state:
     st.session_state.show_history = False
+if "show_queue" not in st.session_state:
+    st.session_state.show_queue = False
+if "show_analytics" not in st.session_state:
+    st.session_state.show_analytics = False
+if "show_jobs" not in st.session_state:
+    st.session_state.show_jobs = False
+if "batch_job" not in st.session_state:
+    st.session_state.batch_job = None
+if "rating_queue" not in st.session_state:
+    st.session_state.rating_queue = None
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -32,7 +53,7 @@ if "show_history" not in st.session_state:
 # ─────────────────────────────────────────────────────────────────────────────
 with st.sidebar:
     st.header("📊 Statistiken")
-    stats = db.get_statistics()
+    stats = app_cache.statistics()
     
     col1, col2 = st.columns(2)
     col1.metric("Gesamt", stats["total"])
@@ -45,6 +66,27 @@ with st.sidebar:
     
     if st.button("📜 Bisherige Bewertungen", width="content"):
         st.session_state.show_history = not st.session_state.show_history
+        st.session_state.show_queue = False
+        st.session_state.show_analytics = False
+        st.session_state.show_jobs = False
+    
+    if st.button("📥 Queue-Modus", width="content"):
+        st.session_state.show_queue = not st.session_state.show_queue
+        st.session_state.show_history = False
+        st.session_state.show_analytics = False
+        st.session_state.show_jobs = False
+    
+    if st.button("📈 Auswertung", width="content"):
+        st.session_state.show_analytics = not st.session_state.show_analytics
+        st.session_state.show_history = False
+        st.session_state.show_queue = False
+        st.session_state.show_jobs = False
+    
+    if st.button("🧰 Render-Jobs", width="content"):
+        st.session_state.show_jobs = not st.session_state.show_jobs
+        st.session_state.show_history = False
+        st.session_state.show_queue = False
+        st.session_state.show_analytics = False
     
     if stats["unevaluated"] > 0:
         st.warning(f"🔔 {stats['unevaluated']} unbewertete Visualisierungen")
@@ -53,35 +95,404 @@ with st.sidebar:
 # ─────────────────────────────────────────────────────────────────────────────
 # History View
 # ─────────────────────────────────────────────────────────────────────────────
+HISTORY_PAGE_SIZE = 20
+GALLERY_PAGE_SIZE = 120
+GALLERY_COLUMNS = 8
+
+
+def _show_evaluation(evaluation_id):
+    """Lädt einen Eintrag inkl. Bild in die Hauptansicht."""
+    full_ev = db.get_evaluation_with_image(evaluation_id)
+    st.session_state.current_viz = {
+        "id": full_ev["id"],
+        "image_bytes": full_ev["image_blob"],
+        "image_format": full_ev["image_format"],
+        "params": full_ev["viz_params"],
+        "description": full_ev["wine_description"],
+        "existing_rating": full_ev["rating"],
+        "existing_comment": full_ev["comment"],
+    }
+    st.session_state.show_history = False
+    st.rerun()
+
+
+def _render_gallery():
+    """Zeigt alle Visualisierungen als Vorschaubild-Raster."""
+    missing = app_cache.missing_thumbnail_count()
+    if missing:
+        st.caption(f"{missing} Einträge ohne Vorschaubild")
+        if st.button("🖼️ Fehlende Vorschaubilder erzeugen"):
+            with st.spinner("Erzeuge Vorschaubilder..."):
+                db.backfill_thumbnails()
+            st.rerun()
+    
+    missing_hashes = app_cache.missing_phash_count()
+    if missing_hashes:
+        st.caption(f"{missing_hashes} Einträge ohne Perceptual Hash (Duplikat-Erkennung)")
+        if st.button("♻️ Fehlende Hashes berechnen"):
+            with st.spinner("Berechne Perceptual Hashes..."):
+                db.backfill_phashes()
+            st.rerun()
+    
+    total = stats["total"] - missing
+    if total <= 0:
+        st.info("Noch keine Bewertungen vorhanden.")
+        return
+    
+    n_pages = (total + GALLERY_PAGE_SIZE - 1) // GALLERY_PAGE_SIZE
+    page = 1
+    if n_pages > 1:
+        page = st.number_input("Seite", min_value=1, max_value=n_pages, value=1, step=1, key="gallery_page")
+    
+    thumbs = app_cache.thumbnails(limit=GALLERY_PAGE_SIZE, offset=(page - 1) * GALLERY_PAGE_SIZE)
+    cols = st.columns(GALLERY_COLUMNS)
+    for i, th in enumerate(thumbs):
+        with cols[i % GALLERY_COLUMNS]:
+            st.image(th["thumb_blob"], caption=f"ID {th['id']} {'⭐' * (th['rating'] or 0) or '❓'}")
+            if st.button("Anzeigen", key=f"thumb_{th['id']}"):
+                _show_evaluation(th["id"])
+
+
+SIMILAR_COUNT = 5
+
+
+def _render_similar(viz):
+    """Zeigt die ähnlichsten bereits bewerteten Weine (Ähnlichkeitsindex über viz_params)."""
+    with st.expander("🔍 Ähnliche bewertete Weine"):
+        hits = app_cache.similarity_index().query(viz["params"], k=SIMILAR_COUNT, exclude_id=viz.get("id"))
+        if not hits:
+            st.info("Noch keine bewerteten Weine vorhanden.")
+            return
+        thumbs = app_cache.similar_thumbnails(tuple(hit["id"] for hit in hits))
+        cols = st.columns(SIMILAR_COUNT)
+        for col, hit in zip(cols, hits):
+            with col:
+                th = thumbs.get(hit["id"])
+                if th:
+                    st.image(th["thumb_blob"])
+                st.caption(f"ID {hit['id']} {'⭐' * (hit['rating'] or 0)} · Abstand {hit['distance']:.2f}")
+                if st.button("Anzeigen", key=f"similar_{hit['id']}"):
+                    _show_evaluation(hit["id"])
+
+
+WINE_TYPES = ["auto", "white", "rose", "red"]
+
+
+@st.fragment
+def _render_tuning_editor(viz):
+    """
+    Parameter von Hand nachjustieren, mit Live-Vorschau in reduzierter Auflösung.
+
+    Slider melden ihren Wert erst beim Loslassen, und als Fragment rendert
+    nur der Editor neu; der PreviewRenderer berechnet nur geänderte Layer.
+    """
+    import preview
+    from imagegen import RING_DEFINITIONS
+
+    renderer = st.session_state.get("preview_renderer")
+    if renderer is None:
+        renderer = st.session_state.preview_renderer = preview.PreviewRenderer()
+
+    original = viz["params"]
+    params = dict(original)
+    prefix = f"tune_{viz['id']}_"
+    sliders = [(key, name, default) for name, _, _, _, key, default in RING_DEFINITIONS]
+    sliders += [("effervescence", "Perlage", 0.0), ("tannin", "Tannin", 0.0), ("sweetness", "Süße", 0.0)]
+
+    col_controls, col_preview = st.columns([3, 2])
+    with col_controls:
+        col1, col2 = st.columns(2)
+        params["base_color_hex"] = col1.color_picker(
+            "Basisfarbe", original.get("base_color_hex") or "#F6F2AF", key=prefix + "base_color_hex")
+        wine_type = original.get("wine_type", "auto")
+        params["wine_type"] = col2.selectbox(
+            "Weintyp", WINE_TYPES, index=WINE_TYPES.index(wine_type) if wine_type in WINE_TYPES else 0,
+            key=prefix + "wine_type")
+        for i, (key, name, default) in enumerate(sliders):
+            col = col1 if i % 2 == 0 else col2
+            value = min(max(float(original.get(key, default) or 0.0), 0.0), 1.0)
+            params[key] = col.slider(name, 0.0, 1.0, value, step=0.01, key=prefix + key)
+        sugar = float(original.get("residual_sugar") or 0.0)
+        params["residual_sugar"] = st.slider(
+            "Restzucker (g/L)", 0.0, max(300.0, sugar), sugar, step=1.0, key=prefix + "residual_sugar")
+
+    changed = [key for key in params if params[key] != original.get(key)]
+
+    with col_preview:
+        image = renderer.render(params)
+        st.image(image, caption=f"Vorschau {renderer.size} px · {renderer.timings['total']:.0f} ms")
+        st.caption(f"{len(changed)} Parameter geändert" if changed else "Keine Änderungen")
+        if st.button("💾 Als neue Visualisierung speichern", disabled=not changed, key=prefix + "save"):
+            from imagegen import render_info
+            image_bytes, image_format = app_cache.render_image(params, 350)
+            new_id = db.save_visualization(viz["description"], params, image_bytes, image_format,
+                                           render_info(params, 350))
+            st.session_state.current_viz = {
+                "id": new_id,
+                "image_bytes": image_bytes,
+                "image_format": image_format,
+                "params": params,
+                "description": viz["description"],
+                "existing_rating": None,
+                "existing_comment": None,
+            }
+            st.rerun()
+
+
+def _render_duplicate_hint(evaluation_id, button_label):
+    """
+    Hinweis, wenn ein (fast) gleiches Bild schon bewertet wurde.
+
+    Returns:
+        Das übernommene Duplikat, falls der Button geklickt wurde, sonst None
+    """
+    dupes = app_cache.duplicates(evaluation_id)
+    if not dupes:
+        return None
+    dup = dupes[0]
+    kind = "Gleiches" if dup["distance"] == 0 else "Fast gleiches"
+    st.info(f"♻️ {kind} Bild bereits bewertet: {'⭐' * dup['rating']} (ID {dup['id']})"
+            + (f" – „{dup['comment']}“" if dup["comment"] else ""))
+    if st.button(button_label, key=f"reuse_rating_{evaluation_id}", width="content"):
+        db.save_rating(evaluation_id, dup["rating"], dup["comment"])
+        return dup
+    return None
+
+
+def _render_history_entry(ev):
+    """Zeigt einen Eintrag der Historie als aufklappbares Element."""
+    with st.expander(f"ID {ev['id']} - {ev['created_at'][:10]} - {'⭐' * (ev['rating'] or 0) or '❓ Unbewertet'}"):
+        if ev.get("snippet"):
+            st.markdown(ev["snippet"])
+        else:
+            st.text(ev["wine_description"][:200] + "..." if len(ev["wine_description"]) > 200 else ev["wine_description"])
+        
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            if ev["comment"]:
+                st.caption(f"💬 {ev['comment']}")
+        with col2:
+            if st.button("🖼️ Anzeigen", key=f"show_{ev['id']}"):
+                _show_evaluation(ev["id"])
+
+
 if st.session_state.show_history:
     st.title("📜 Bisherige Bewertungen")
     
-    evaluations = db.get_all_evaluations()
+    history_mode = st.radio("Ansicht", ["Liste", "Galerie"], horizontal=True, label_visibility="collapsed")
+    if history_mode == "Galerie":
+        _render_gallery()
+        st.stop()
     
-    if not evaluations:
-        st.info("Noch keine Bewertungen vorhanden.")
+    search_query = st.text_input(
+        "🔍 Suche",
+        placeholder="Rebsorte, Region oder Kommentar, z.B. 'riesling schiefer'",
+    )
+    
+    if search_query.strip():
+        total_hits = db.count_search_results(search_query)
+        if total_hits == 0:
+            st.info("Keine Treffer.")
+        else:
+            n_pages = (total_hits + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+            page = 1
+            if n_pages > 1:
+                page = st.number_input("Seite", min_value=1, max_value=n_pages, value=1, step=1)
+            st.caption(f"{total_hits} Treffer – Seite {page} von {n_pages}")
+            
+            results = db.search_evaluations(
+                search_query, limit=HISTORY_PAGE_SIZE, offset=(page - 1) * HISTORY_PAGE_SIZE
+            )
+            for ev in results:
+                _render_history_entry(ev)
     else:
-        for ev in evaluations:
-            with st.expander(f"ID {ev['id']} - {ev['created_at'][:10]} - {'⭐' * (ev['rating'] or 0) or '❓ Unbewertet'}"):
-                st.text(ev["wine_description"][:200] + "..." if len(ev["wine_description"]) > 200 else ev["wine_description"])
-                
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    if ev["comment"]:
-                        st.caption(f"💬 {ev['comment']}")
-                with col2:
-                    if st.button("🖼️ Anzeigen", key=f"show_{ev['id']}"):
-                        full_ev = db.get_evaluation_with_image(ev["id"])
-                        st.session_state.current_viz = {
-                            "id": full_ev["id"],
-                            "image_bytes": full_ev["image_blob"],
-                            "params": full_ev["viz_params"],
-                            "description": full_ev["wine_description"],
-                            "existing_rating": full_ev["rating"],
-                            "existing_comment": full_ev["comment"],
-                        }
-                        st.session_state.show_history = False
-                        st.rerun()
+        evaluations = app_cache.all_evaluations()
+        
+        if not evaluations:
+            st.info("Noch keine Bewertungen vorhanden.")
+        else:
+            for ev in evaluations:
+                _render_history_entry(ev)
+    
+    st.stop()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Auswertung: Parameter und Ringe im Vergleich zu den Bewertungen
+# ─────────────────────────────────────────────────────────────────────────────
+if st.session_state.show_analytics:
+    import analytics
+    
+    st.title("📈 Auswertung der Bewertungen")
+    
+    period = st.radio("Verlauf pro", list(analytics.PERIODS), index=1,
+                      format_func=analytics.PERIODS.get, horizontal=True)
+    report = app_cache.rating_analytics().report(period)
+    if report["rated"] < analytics.MIN_SAMPLES:
+        st.info("Noch zu wenige Bewertungen für eine Auswertung.")
+        st.stop()
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Bewertungen", report["rated"])
+    col2.metric("⭐ Durchschnitt", f"{report['mean_rating']:.2f}")
+    col3.metric("Berechnet in", f"{report['timings_ms']['load'] + report['timings_ms']['compute']:.0f} ms")
+    
+    st.subheader("Korrelation der Parameter mit der Bewertung")
+    st.bar_chart(
+        {r["param"]: r["pearson"] or 0.0 for r in report["correlations"]},
+        horizontal=True,
+    )
+    st.dataframe(report["correlations"], hide_index=True)
+    
+    st.subheader("Ringe: Bewertung mit und ohne sichtbaren Ring")
+    st.dataframe(report["rings"], hide_index=True)
+    
+    col_types, col_dist = st.columns(2)
+    with col_types:
+        st.subheader("Weintypen")
+        st.dataframe(report["wine_types"], hide_index=True)
+    with col_dist:
+        st.subheader("Verteilung")
+        st.bar_chart({f"{'⭐' * stars}": count for stars, count in report["distribution"].items()})
+    
+    st.subheader("Verlauf")
+    st.line_chart(
+        {"Zeitraum": [r["period"] for r in report["trend"]],
+         "Ø Bewertung": [r["mean_rating"] for r in report["trend"]]},
+        x="Zeitraum", y="Ø Bewertung",
+    )
+    
+    st.subheader("Parameter im Detail")
+    param = st.selectbox("Parameter", list(report["params"]))
+    st.dataframe(report["params"][param], hide_index=True)
+    
+    st.stop()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Render-Jobs: Dashboard der verteilten Queue (job_queue.py)
+# ─────────────────────────────────────────────────────────────────────────────
+@st.fragment(run_every=2)
+def _render_job_dashboard():
+    """Queue-Tiefe und Durchsatz je Worker (aktualisiert sich selbst)."""
+    import job_queue
+    
+    stats = job_queue.JobQueue().stats()
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Offen", stats["queued"])
+    col2.metric("In Arbeit", stats["leased"])
+    col3.metric("Erledigt", stats["done"])
+    col4.metric("Fehlgeschlagen", stats["failed"])
+    col5.metric("Jobs/s", stats["rate"])
+    if stats["eta_s"]:
+        st.caption(f"Fertig in ca. {stats['eta_s'] // 60} min {stats['eta_s'] % 60} s")
+    
+    if stats["timeline"]:
+        st.subheader("Erledigte Jobs pro Minute")
+        st.bar_chart(
+            {"Minute": [t["minute"] for t in stats["timeline"]], "Jobs": [t["done"] for t in stats["timeline"]]},
+            x="Minute", y="Jobs",
+        )
+    
+    st.subheader("Worker")
+    if stats["workers"]:
+        st.dataframe(stats["workers"], hide_index=True)
+    else:
+        st.info("Noch keine Worker gemeldet. Start: `python job_queue.py work`")
+
+
+if st.session_state.show_jobs:
+    st.title("🧰 Render-Jobs")
+    _render_job_dashboard()
+    st.stop()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Queue-Modus: Datei hochladen, im Hintergrund rendern, nacheinander bewerten
+# ─────────────────────────────────────────────────────────────────────────────
+@st.fragment(run_every=2)
+def _render_batch_progress():
+    """Fortschritt des laufenden Batch-Jobs (aktualisiert sich selbst)."""
+    job = st.session_state.batch_job
+    if job is None:
+        return
+    st.progress(job.completed / max(1, job.total), text=f"{job.completed} / {job.total} gerendert")
+    if job.reused:
+        st.caption(f"♻️ {len(job.reused)} bereits vorhanden (nicht erneut gespeichert)")
+    if job.errors:
+        st.caption(f"⚠️ {len(job.errors)} fehlgeschlagen")
+
+
+if st.session_state.show_queue:
+    import batch_queue
+    
+    st.title("📥 Queue-Modus")
+    
+    with st.expander("Beschreibungen hochladen", expanded=st.session_state.batch_job is None):
+        uploaded = st.file_uploader(
+            "Datei mit Weinbeschreibungen (.txt: durch Leerzeilen getrennt, .csv oder .jsonl)",
+            type=["txt", "csv", "jsonl"],
+        )
+        if uploaded is not None and st.button("▶️ Rendern starten", type="primary"):
+            descriptions = batch_queue.parse_descriptions(uploaded.getvalue(), uploaded.name)
+            if not descriptions:
+                st.error("Keine Beschreibungen in der Datei gefunden.")
+            else:
+                if st.session_state.batch_job is not None:
+                    st.session_state.batch_job.cancel()
+                job = batch_queue.BatchJob(descriptions, app_cache.batch_pool())
+                st.session_state.batch_job = job
+                st.session_state.rating_queue = batch_queue.RatingQueue(job, app_cache.prefetch_loader())
+                st.rerun()
+    
+    _render_batch_progress()
+    
+    if st.session_state.rating_queue is None:
+        # Ohne Upload: alle bisher unbewerteten Einträge bewerten
+        st.session_state.rating_queue = batch_queue.RatingQueue(None, app_cache.prefetch_loader())
+    
+    queue = st.session_state.rating_queue
+    item = queue.current()
+    
+    if item is None:
+        job = st.session_state.batch_job
+        if job is not None and not job.finished:
+            st.info("⏳ Warte auf die nächste Visualisierung...")
+        else:
+            st.success("✅ Keine unbewerteten Visualisierungen mehr in der Queue.")
+    else:
+        st.caption(f"Noch {queue.remaining} zu bewerten")
+        col_img, col_eval = st.columns([2, 1])
+        with col_img:
+            st.image(item["image_blob"], width="content",
+                     output_format=image_encoding.streamlit_format(item["image_format"]))
+            st.text(item["wine_description"])
+        with col_eval:
+            st.subheader(f"⭐ Bewertung (ID {item['id']})")
+            if _render_duplicate_hint(item["id"], "♻️ Bewertung übernehmen & weiter"):
+                queue.advance(item["id"])
+                st.rerun()
+            q_rating = st.radio(
+                "Wie gut passt die Visualisierung zur Beschreibung?",
+                options=[1, 2, 3, 4, 5],
+                format_func=lambda x: "⭐" * x,
+                horizontal=True,
+                index=2,
+                key=f"queue_rating_{item['id']}",
+            )
+            q_comment = st.text_area(
+                "Kommentar (optional):",
+                height=100,
+                key=f"queue_comment_{item['id']}",
+                placeholder="Was passt gut? Was könnte besser sein?",
+            )
+            if st.button("💾 Speichern & weiter", type="primary", width="content"):
+                db.save_rating(item["id"], q_rating, q_comment if q_comment.strip() else None)
+                queue.advance(item["id"])
+                st.rerun()
+            if st.button("⏭️ Überspringen", width="content"):
+                queue.advance(item["id"])
+                st.rerun()
     
     st.stop()
 
@@ -120,32 +531,72 @@ if generate_btn:
     if not wine_description.strip():
         st.error("Bitte gib eine Weinbeschreibung ein.")
     else:
+        from imagefetch import generate_wine_external_api
+        from imagegen import render_info
+        
+        generate_start = time.perf_counter()
         with st.spinner("Analysiere Beschreibung und generiere Visualisierung..."):
             # Analysiere Text
-            params = analyze_wine_description(wine_description)
+            params = app_cache.analyze(wine_description)
             
-            # Generiere Bild (generate_wine_png_bytes erwartet ein dict)
-            image_bytes = generate_wine_png_bytes(params, size=350)
+            # Lokales Rendering und externe API parallel starten
+            executor = app_cache.render_executor()
+            local_future = executor.submit(app_cache.render_image, params, 350)
+            external_future = executor.submit(
+                generate_wine_external_api, wine_description, cookie, EXTERNAL_API_TIMEOUT
+            )
             
-            # In DB speichern
-            new_id = db.save_visualization(wine_description, params, image_bytes)
-
-            # Generiere Bild (mit anderen API)
+            # Jedes Ergebnis anzeigen, sobald es fertig ist
+            col_local, col_external = st.columns(2)
+            local_slot = col_local.empty()
+            external_slot = col_external.empty()
+            local_slot.info("⏳ Lokale Visualisierung...")
+            external_slot.info("⏳ Externe Visualisierung...")
+            
+            new_id = None
+            image_bytes = None
             new_id2 = None
             image_bytes2 = None
+            image_format2 = None
             try:
-                image_bytes2 = generate_wine_external_api(wine_description, cookie)
-
-                new_id2 = db.save_visualization(wine_description, params, image_bytes2)
-            except Exception as e:
-                print(e)
-                pass
+                for future in concurrent.futures.as_completed(
+                    [local_future, external_future], timeout=EXTERNAL_API_TIMEOUT
+                ):
+                    if future is local_future:
+                        image_bytes, image_format = future.result()
+                        new_id = db.save_visualization(wine_description, params, image_bytes, image_format,
+                                                       render_info(params, 350))
+                        local_slot.image(image_bytes, caption=f"ID {new_id}",
+                                         output_format=image_encoding.streamlit_format(image_format))
+                    else:
+                        try:
+                            image_bytes2 = future.result()
+                            image_format2 = image_encoding.sniff_format(image_bytes2)
+                            new_id2 = db.save_visualization(wine_description, params, image_bytes2, image_format2)
+                            external_slot.image(image_bytes2, caption=f"ID {new_id2}")
+                        except Exception as e:
+                            print(e)
+                            external_slot.empty()
+            except concurrent.futures.TimeoutError:
+                # Externe API zu langsam: nicht länger warten, lokales Bild trotzdem verwenden. Der
+                # laufende Aufruf endet von selbst, er hat denselben Timeout (EXTERNAL_API_TIMEOUT)
+                external_slot.empty()
+                print(f"[app] Externe Visualisierung nach {EXTERNAL_API_TIMEOUT:.0f} s nicht abgewartet")
+            
+            if image_bytes is None:
+                # Lokales Rendering läuft unabhängig vom Timeout der externen API
+                image_bytes, image_format = local_future.result()
+                new_id = db.save_visualization(wine_description, params, image_bytes, image_format,
+                                               render_info(params, 350))
+            perf.observe("app.generate", time.perf_counter() - generate_start)
 
             st.session_state.current_viz = {
                 "id": new_id,
                 "id2": new_id2,
                 "image_bytes": image_bytes,
                 "image_bytes2": image_bytes2,
+                "image_format": image_format,
+                "image_format2": image_format2,
                 "params": params,
                 "description": wine_description,
                 "existing_rating": None,
@@ -171,7 +622,8 @@ if st.session_state.current_viz:
     
     with col_img:
         st.divider()
-        st.image(viz["image_bytes"], width="content")
+        st.image(viz["image_bytes"], width="content",
+                 output_format=image_encoding.streamlit_format(viz.get("image_format")))
         
         # Parameter anzeigen
         with st.expander("📐 Extrahierte Parameter"):
@@ -192,10 +644,22 @@ if st.session_state.current_viz:
                 st.write(f"**Mineralik:** {params['mineral_intensity']:.1%}")
                 st.write(f"**Restzucker:** {params['residual_sugar']:.0f} g/L")
                 st.write(f"**Weintyp:** {params['wine_type']}")
-    
+        
+        _render_similar(viz)
+
+        if st.toggle("🎚️ Parameter anpassen", key=f"tune_{viz['id']}"):
+            _render_tuning_editor(viz)
+
     with col_eval:
         st.subheader("⭐ Bewertung")
         
+        if not viz["existing_rating"]:
+            dup = _render_duplicate_hint(viz["id"], "♻️ Bewertung übernehmen")
+            if dup:
+                st.session_state.current_viz["existing_rating"] = dup["rating"]
+                st.session_state.current_viz["existing_comment"] = dup["comment"]
+                st.rerun()
+        
         # Star Rating
         rating = st.radio(
             "Wie gut passt die Visualisierung zur Beschreibung?",
@@ -226,7 +690,8 @@ if st.session_state.current_viz:
         col_img2, col_eval2 = st.columns([2, 1])
 
         with col_img2:
-            st.image(viz["image_bytes2"], width="content")
+            st.image(viz["image_bytes2"], width="content",
+                     output_format=image_encoding.streamlit_format(viz.get("image_format2")))
 
         with col_eval2:
             # Star Rating
@@ -265,3 +730,9 @@ if st.session_state.current_viz:
         st.session_state.current_viz = None
         st.warning("Eintrag gelöscht.")
         st.rerun()
+
+
+# Schwere Module erst nach dem ersten Rendern der Seite im Hintergrund laden
+app_cache.warmup()
+# Periodische DB-Wartung (Vacuum, Checkpoints, Integritätsprüfung), ebenfalls erst danach
+app_cache.background_maintenance()
@@ -0,0 +1,165 @@
+"""
+Caching-Schicht für die Streamlit-App.
+
+Streamlit führt app.py bei jeder Interaktion komplett neu aus. Hier werden
+teure Ergebnisse über Reruns hinweg gehalten:
+
+- Ressourcen pro Prozess (st.cache_resource): DB-Handle, Ähnlichkeitsindex,
+  Auswertung der Bewertungen, Render-Thread-Pool, Worker-Pools des Queue-Modus, Hintergrund-Wartung,
+  Vorladen schwerer Module
+- Daten (st.cache_data): Textanalyse, lokales Rendering, Statistiken,
+  Historie und Galerie
+
+DB-abhängige Caches werden über expert_db.add_change_listener geleert, sobald
+eine Visualisierung gespeichert, bewertet oder gelöscht wurde.
+"""
+import concurrent.futures
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import streamlit as st
+
+import expert_db as db
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Ressourcen (einmal pro Prozess)
+# ─────────────────────────────────────────────────────────────────────────────
+
+@st.cache_resource
+def db_handle():
+    """Registriert die Cache-Invalidierung; die Datenbank wird erst beim ersten Zugriff angelegt."""
+    db.add_change_listener(_on_db_change)
+    return db
+
+
+@st.cache_resource
+def similarity_index():
+    """Ähnlichkeitsindex über viz_params (geladen oder neu aufgebaut, danach inkrementell)."""
+    import similarity_index as si
+    return si.open_index()
+
+
+@st.cache_resource
+def rating_analytics():
+    """Auswertung der Bewertungen (neu berechnet nach Bewertungen, Löschungen und Importen)."""
+    import analytics
+    return analytics.open_analytics()
+
+
+@st.cache_resource
+def render_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Thread-Pool für lokale und externe Bildgenerierung."""
+    return concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="render")
+
+
+@st.cache_resource
+def batch_pool():
+    """Prozess-Pool für den Queue-Modus."""
+    import batch_queue
+    return batch_queue.make_worker_pool()
+
+
+@st.cache_resource
+def prefetch_loader():
+    """Thread-Pool zum Vorladen des nächsten Bildes im Queue-Modus."""
+    import batch_queue
+    return batch_queue.make_loader()
+
+
+@st.cache_resource
+def warmup() -> threading.Thread:
+    """
+    Lädt numpy/PIL, Renderer und externen Client im Hintergrund vor.
+
+    Wird erst nach dem ersten Rendern der Seite aufgerufen; der erste Klick auf
+    "Generieren" muss die schweren Module dann nicht mehr selbst importieren.
+    """
+    def _load():
+        import imagegen
+        import imagefetch
+        import text_analyzer
+    thread = threading.Thread(target=_load, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+@st.cache_resource
+def background_maintenance():
+    """Startet die periodische DB-Wartung."""
+    import db_maintenance
+    return db_maintenance.start_background_maintenance()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Analyse & Rendering (hängen nur von den Eingaben ab, keine Invalidierung nötig)
+# ─────────────────────────────────────────────────────────────────────────────
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def analyze(description: str) -> Dict[str, Any]:
+    """Gecachte Textanalyse."""
+    from text_analyzer import analyze_wine_description
+    return analyze_wine_description(description)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def render_image(params: Dict[str, Any], size: int = 350) -> Tuple[bytes, str]:
+    """Gecachtes lokales Rendering (Schlüssel: Parameter + Größe) im konfigurierten Bildformat."""
+    from image_encoding import IMAGE_FORMAT
+    from imagegen import generate_wine_image_bytes
+    return generate_wine_image_bytes(params, size=size, fmt=IMAGE_FORMAT), IMAGE_FORMAT
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# DB-abhängige Daten (werden bei Änderungen invalidiert)
+# ─────────────────────────────────────────────────────────────────────────────
+
+@st.cache_data(show_spinner=False)
+def statistics() -> Dict[str, Any]:
+    return db_handle().get_statistics()
+
+
+@st.cache_data(show_spinner=False)
+def all_evaluations() -> List[Dict[str, Any]]:
+    return db_handle().get_all_evaluations()
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def thumbnails(limit: int, offset: int) -> List[Dict[str, Any]]:
+    return db_handle().get_thumbnails(limit=limit, offset=offset)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def similar_thumbnails(evaluation_ids: Tuple[int, ...]) -> Dict[int, Dict[str, Any]]:
+    return db_handle().get_thumbnails_for(list(evaluation_ids))
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def duplicates(evaluation_id: int) -> List[Dict[str, Any]]:
+    """Bereits bewertete Beinahe-Duplikate (Perceptual Hash) eines Eintrags."""
+    return db_handle().find_duplicates_of(evaluation_id)
+
+
+@st.cache_data(show_spinner=False)
+def missing_thumbnail_count() -> int:
+    return db_handle().count_missing_thumbnails()
+
+
+@st.cache_data(show_spinner=False)
+def missing_phash_count() -> int:
+    return db_handle().count_missing_phashes()
+
+
+_DB_CACHES = (statistics, all_evaluations, thumbnails, similar_thumbnails, duplicates,
+              missing_thumbnail_count, missing_phash_count)
+
+
+def invalidate_db_caches():
+    """Leert alle Caches, die vom Datenbankinhalt abhängen."""
+    for cached in _DB_CACHES:
+        cached.clear()
+
+
+def _on_db_change(event: str, evaluation_id: Optional[int]):
+    # Wird nach jedem Commit aufgerufen (save, rating, delete, import, thumbnails, phashes)
+    invalidate_db_caches()
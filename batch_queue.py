@@ -0,0 +1,232 @@
+"""
+Queue-Modus: Viele Beschreibungen im Hintergrund analysieren, rendern und speichern.
+
+Ein Experte lädt eine Datei mit Beschreibungen hoch; ein Prozess-Pool rendert
+sie parallel und legt sie als unbewertete Einträge in expert_db an. Die
+Bewertung läuft danach Eintrag für Eintrag, wobei das nächste Bild bereits
+im Hintergrund geladen wird.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import expert_db as db
+
+
+# Bildgröße wie im normalen Generierungs-Flow
+RENDER_SIZE = 350
+
+# Spaltennamen, unter denen in CSV/JSONL die Beschreibung gesucht wird
+DESCRIPTION_FIELDS = ("description", "wine_description", "beschreibung", "text")
+
+
+def parse_descriptions(data: bytes, filename: str = "") -> List[str]:
+    """
+    Liest Beschreibungen aus einer hochgeladenen Datei.
+
+    - ``.csv``: Spalte description/wine_description/beschreibung/text, sonst die erste Spalte
+    - ``.jsonl``: pro Zeile ein String oder ein Objekt mit einem der obigen Felder
+    - sonst Text: Absätze (durch Leerzeilen getrennt); ohne Leerzeilen eine Beschreibung pro Zeile
+
+    Returns:
+        Liste nicht-leerer Beschreibungen in Dateireihenfolge
+    """
+    text = data.decode("utf-8-sig")
+    name = filename.lower()
+
+    if name.endswith(".csv"):
+        rows = list(csv.reader(io.StringIO(text)))
+        if not rows:
+            return []
+        header = [h.strip().lower() for h in rows[0]]
+        column = next((header.index(f) for f in DESCRIPTION_FIELDS if f in header), None)
+        if column is None:
+            column, body = 0, rows
+        else:
+            body = rows[1:]
+        descriptions = [row[column] for row in body if len(row) > column]
+    elif name.endswith(".jsonl"):
+        descriptions = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, dict):
+                record = next((record[f] for f in DESCRIPTION_FIELDS if f in record), "")
+            descriptions.append(str(record))
+    else:
+        normalized = text.replace("\r\n", "\n")
+        if "\n\n" in normalized.strip():
+            descriptions = normalized.split("\n\n")
+        else:
+            descriptions = normalized.split("\n")
+
+    return [d.strip() for d in descriptions if d.strip()]
+
+
+def _analyze_and_render(description: str) -> Tuple[Dict[str, Any], bytes, str, tuple, tuple]:
+    """
+    Läuft im Worker-Prozess: Textanalyse + lokales Rendering (Format aus WINE_IMAGE_FORMAT).
+
+    Vorschaubild und Perceptual Hash entstehen hier aus dem gerenderten Bild
+    (wie in job_queue.execute_job), damit weder die Duplikat-Prüfung noch das
+    Speichern im Hauptprozess dekodieren muss.
+    """
+    from text_analyzer import analyze_wine_description
+    from image_encoding import IMAGE_FORMAT, encode_image
+    from imagegen import render_info, render_wine_image
+    params = analyze_wine_description(description)
+    img = render_wine_image(params, RENDER_SIZE)
+    return (params, encode_image(img, IMAGE_FORMAT), IMAGE_FORMAT, db.image_derivatives(img),
+            render_info(params, RENDER_SIZE))
+
+
+def make_worker_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Prozess-Pool für das CPU-lastige Rendering."""
+    # spawn statt fork: der Streamlit-Prozess hat bereits viele Threads
+    return ProcessPoolExecutor(
+        max_workers=max_workers or max(1, (os.cpu_count() or 2) - 1),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+class BatchJob:
+    """
+    Rendert eine Liste von Beschreibungen im Hintergrund und speichert sie.
+
+    Die Ergebnisse werden in der Reihenfolge der Fertigstellung gespeichert;
+    ``ids`` enthält die IDs in Eingabereihenfolge (None = noch offen/fehlgeschlagen).
+    Gibt es eine Beschreibung samt byte-gleichem Bild schon (z.B. dieselbe Datei
+    erneut hochgeladen), wird der vorhandene Eintrag verwendet und in ``reused``
+    vermerkt statt ein Duplikat zu speichern.
+    """
+
+    def __init__(self, descriptions: List[str], pool: Executor):
+        self.descriptions = descriptions
+        self.ids: List[Optional[int]] = [None] * len(descriptions)
+        self.errors: Dict[int, str] = {}
+        self.reused: set = set()
+        self._lock = threading.Lock()
+        self._futures: List[Future] = []
+        for index, description in enumerate(descriptions):
+            future = pool.submit(_analyze_and_render, description)
+            future.add_done_callback(lambda f, i=index: self._on_done(i, f))
+            self._futures.append(future)
+
+    def _on_done(self, index: int, future: Future):
+        if future.cancelled():
+            return
+        try:
+            params, image_bytes, image_format, derivatives, render_info = future.result()
+            description = self.descriptions[index]
+            new_id = db.find_exact_duplicate(description, image_bytes, derivatives[1])
+            reused = new_id is not None
+            if not reused:
+                new_id = db.save_visualization(description, params, image_bytes, image_format, render_info,
+                                               derivatives)
+        except Exception as e:
+            with self._lock:
+                self.errors[index] = str(e)
+            return
+        with self._lock:
+            if reused:
+                self.reused.add(new_id)
+            self.ids[index] = new_id
+
+    @property
+    def total(self) -> int:
+        return len(self.descriptions)
+
+    @property
+    def completed(self) -> int:
+        with self._lock:
+            return sum(1 for i in self.ids if i is not None) + len(self.errors)
+
+    @property
+    def finished(self) -> bool:
+        return self.completed >= self.total
+
+    def ready_ids(self) -> List[int]:
+        """
+        Bereits gespeicherte IDs in Eingabereihenfolge.
+
+        Wiederverwendete Einträge fehlen: sie stammen aus einem früheren
+        Durchlauf und werden nicht erneut zur Bewertung angeboten.
+        """
+        with self._lock:
+            return [i for i in self.ids if i is not None and i not in self.reused]
+
+    def cancel(self):
+        """Bricht noch nicht gestartete Render-Aufträge ab."""
+        for future in self._futures:
+            future.cancel()
+
+
+class RatingQueue:
+    """
+    Reihenfolge der zu bewertenden Einträge mit Prefetch des nächsten Bildes.
+
+    Args:
+        source: BatchJob (nur dessen Einträge) oder None (alle unbewerteten Einträge)
+        loader: Thread-Pool für das Vorladen
+    """
+
+    def __init__(self, source: Optional[BatchJob], loader: Executor):
+        self.source = source
+        self.loader = loader
+        self.done: set = set()
+        self._prefetched: Dict[int, Future] = {}
+
+    def _candidates(self) -> List[int]:
+        if self.source is not None:
+            ids = self.source.ready_ids()
+        else:
+            ids = db.get_unevaluated_ids()
+        return [i for i in ids if i not in self.done]
+
+    def _load(self, evaluation_id: int) -> Future:
+        future = self._prefetched.get(evaluation_id)
+        if future is None:
+            future = self.loader.submit(db.get_evaluation_with_image, evaluation_id)
+            self._prefetched[evaluation_id] = future
+        return future
+
+    def current(self) -> Optional[Dict[str, Any]]:
+        """
+        Gibt den aktuellen Eintrag zurück und lädt den nächsten bereits vor.
+
+        Einträge, die inzwischen gelöscht wurden oder nicht gespeichert werden
+        konnten, gelten als erledigt; None heißt nur "keine Einträge mehr".
+        """
+        candidates = self._candidates()
+        for index, evaluation_id in enumerate(candidates):
+            if index + 1 < len(candidates):
+                self._load(candidates[index + 1])
+            try:
+                item = self._load(evaluation_id).result()
+            except db.WriteError as e:
+                print(f"[batch_queue] {e}")
+                item = None
+            if item is not None:
+                return item
+            self.advance(evaluation_id)
+        return None
+
+    def advance(self, evaluation_id: int):
+        """Markiert einen Eintrag als erledigt (bewertet oder übersprungen)."""
+        self.done.add(evaluation_id)
+        self._prefetched.pop(evaluation_id, None)
+
+    @property
+    def remaining(self) -> int:
+        return len(self._candidates())
+
+
+def make_loader() -> ThreadPoolExecutor:
+    """Thread-Pool für das Vorladen von Bildern aus der Datenbank."""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
@@ -0,0 +1,267 @@
+"""
+Benchmark für den Renderer (imagegen).
+
+Rendert typische Weinprofile in mehreren Größen und misst pro Fall die
+Gesamtzeit, die Zeit pro Layer (über perf-Spans), den Spitzen-Speicher
+(tracemalloc, eigener Durchlauf) und die PNG-Größe. Mit ``--precisions``
+laufen zusätzlich die reduzierten Genauigkeiten (imagegen.PRECISIONS); für sie
+kommen Abweichung zum exakten Bild sowie Zeit- und Speichergewinn dazu.
+
+Verwendung:
+    python bench_render.py                               # alle Größen, Ergebnis auf der Konsole
+    python bench_render.py --out bench_baseline.json     # als Baseline speichern
+    python bench_render.py --compare bench_baseline.json # Regressionen markieren (Exit-Code 1)
+    python bench_render.py --sizes 128 350 --profiles red tba --repeat 5
+    python bench_render.py --sizes 128 350 1024 --functions png_bytes --precisions exact float16 fixed
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import perf
+from imagegen import PRECISIONS, generate_wine_png, generate_wine_png_bytes, render_wine_image
+
+
+SIZES = (128, 350, 512, 1024, 2048)
+
+# Repräsentative Profile (feste Parameter, unabhängig von Änderungen am Text-Analyzer)
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "dry_white": {
+        "base_color_hex": "#F3EDB0", "wine_type": "white",
+        "acidity": 0.8, "body": 0.3, "depth": 0.3, "mineral_intensity": 0.6,
+        "herbal_intensity": 0.3, "fruit_citrus": 0.7, "fruit_stone": 0.3,
+    },
+    "red": {
+        "base_color_hex": "#5B1A2A", "wine_type": "red",
+        "acidity": 0.5, "body": 0.8, "depth": 0.8, "oak_intensity": 0.6, "spice_intensity": 0.5,
+        "fruit_red": 0.6, "fruit_dark": 0.7, "tannin": 0.7,
+    },
+    "rose": {
+        "base_color_hex": "#F2A58E", "wine_type": "rose",
+        "acidity": 0.6, "body": 0.3, "depth": 0.2, "fruit_red": 0.6, "fruit_citrus": 0.3,
+    },
+    "tba": {
+        "base_color_hex": "#D9A520", "wine_type": "white",
+        "acidity": 0.6, "body": 0.9, "depth": 0.8, "fruit_stone": 0.8, "fruit_tropical": 0.7,
+        "residual_sugar": 180.0,
+    },
+    "champagne": {
+        "base_color_hex": "#F3EBC0", "wine_type": "white",
+        "acidity": 0.8, "body": 0.4, "depth": 0.4, "mineral_intensity": 0.5, "fruit_citrus": 0.6,
+        "effervescence": 1.0,
+    },
+}
+
+# Layer-Spans aus imagegen.render_wine_image (Reihenfolge für die Ausgabe)
+LAYERS = ("setup", "base", "rings", "texture", "blur", "mask", "overlays", "encode")
+
+
+def _render_bytes(params: Dict[str, Any], size: int, tmp_dir: str, precision: str = "exact") -> int:
+    return len(generate_wine_png_bytes(params, size=size, precision=precision))
+
+
+def _render_file(params: Dict[str, Any], size: int, tmp_dir: str, precision: str = "exact") -> int:
+    path = os.path.join(tmp_dir, "bench.png")
+    with contextlib.redirect_stdout(io.StringIO()):  # "saved ..." unterdrücken
+        generate_wine_png(params, size=size, out_path=path, precision=precision)
+    return os.path.getsize(path)
+
+
+FUNCTIONS: Dict[str, Callable[..., int]] = {
+    "png_bytes": _render_bytes,
+    "png_file": _render_file,
+}
+
+
+def bench_case(function: str, params: Dict[str, Any], size: int, repeat: int, tmp_dir: str,
+               precision: str = "exact") -> Dict[str, Any]:
+    """Misst einen Fall: Median über ``repeat`` Läufe plus ein Lauf mit tracemalloc."""
+    render = FUNCTIONS[function]
+    totals: List[float] = []
+    layers: Dict[str, List[float]] = {}
+    png_bytes = 0
+
+    perf.enable()
+    for _ in range(repeat):
+        perf.reset()
+        start = time.perf_counter()
+        png_bytes = render(params, size, tmp_dir, precision)
+        totals.append(time.perf_counter() - start)
+        for name, seconds in perf.flatten(perf.recent_traces(1)[0]):
+            if name.startswith("imagegen.") and name != "imagegen.render":
+                layers.setdefault(name.split(".", 1)[1], []).append(seconds)
+    perf.disable()
+    perf.reset()
+
+    # Eigener Durchlauf, damit tracemalloc die Zeitmessung nicht verfälscht
+    tracemalloc.start()
+    render(params, size, tmp_dir, precision)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        "total_ms": round(statistics.median(totals) * 1000, 3),
+        "min_ms": round(min(totals) * 1000, 3),
+        "layers_ms": {
+            name: round(statistics.median(layers[name]) * 1000, 3) for name in LAYERS if name in layers
+        },
+        "peak_mb": round(peak / 1024 / 1024, 2),
+        "png_bytes": png_bytes,
+    }
+    if precision != "exact":
+        import numpy as np
+        exact = np.asarray(render_wine_image(params, size), dtype=np.int16)
+        reduced = np.asarray(render_wine_image(params, size, precision=precision), dtype=np.int16)
+        diff = np.abs(exact - reduced)
+        result["max_diff"] = int(diff.max())
+        result["mean_diff"] = round(float(diff.mean()), 4)
+    return result
+
+
+def _case_key(function: str, profile: str, size: int, precision: str) -> str:
+    key = f"{function}/{profile}/{size}"
+    return key if precision == "exact" else f"{key}/{precision}"
+
+
+def run_benchmark(sizes, profiles, functions, repeat: int, verbose: bool = True,
+                  precisions=("exact",)) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for function in functions:
+            for profile in profiles:
+                for size in sizes:
+                    for precision in precisions:
+                        key = _case_key(function, profile, size, precision)
+                        # Aufwärmen (Imports, Font-Suche, Caches)
+                        FUNCTIONS[function](PROFILES[profile], min(size, 128), tmp_dir, precision)
+                        results[key] = bench_case(function, PROFILES[profile], size, repeat, tmp_dir, precision)
+                        if verbose:
+                            r = results[key]
+                            print(f"[bench] {key:<36} {r['total_ms']:>9.1f} ms  {r['peak_mb']:>7.1f} MB  "
+                                  f"{r['png_bytes'] / 1024:>8.1f} KB", file=sys.stderr)
+    return {
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_ms: float) -> List[str]:
+    """
+    Vergleicht mit einer Baseline.
+
+    Eine Zeit-Regression liegt vor, wenn ein Fall (oder Layer) um mehr als
+    ``threshold`` (relativ) und mehr als ``min_ms`` (absolut) langsamer ist.
+    Speicher wird nur relativ verglichen; eine geänderte PNG-Größe bedeutet
+    eine geänderte Ausgabe und wird immer gemeldet.
+
+    Returns:
+        Liste der Befunde (leer = keine Regression)
+    """
+    findings = []
+    for key, new in current["results"].items():
+        old = baseline["results"].get(key)
+        if old is None:
+            continue
+        # Gesamtzeit über das Minimum vergleichen: am wenigsten von Störungen durch andere Prozesse betroffen
+        checks = [("gesamt", old["min_ms"], new["min_ms"])]
+        checks += [
+            (layer, old["layers_ms"][layer], ms)
+            for layer, ms in new["layers_ms"].items() if layer in old.get("layers_ms", {})
+        ]
+        for label, before, after in checks:
+            if after > before * (1 + threshold) and after - before > min_ms:
+                findings.append(f"{key} {label}: {before:.1f} → {after:.1f} ms (+{(after / before - 1) * 100:.0f}%)")
+        if new["peak_mb"] > old["peak_mb"] * (1 + threshold) and new["peak_mb"] - old["peak_mb"] > 1:
+            findings.append(f"{key} Speicher: {old['peak_mb']:.1f} → {new['peak_mb']:.1f} MB")
+        if new["png_bytes"] != old["png_bytes"]:
+            findings.append(f"{key} PNG-Größe: {old['png_bytes']} → {new['png_bytes']} Bytes (Ausgabe geändert)")
+    return findings
+
+
+def format_results(data: Dict[str, Any], baseline: Dict[str, Any] = None) -> str:
+    header = f"{'Fall':<36} {'ms':>9} " + " ".join(f"{l[:8]:>8}" for l in LAYERS) + f" {'MB':>7} {'KB':>8}"
+    if baseline:
+        header += f" {'Δ ms':>8}"
+    rows = [header]
+    for key, r in data["results"].items():
+        row = f"{key:<36} {r['total_ms']:>9.1f} "
+        row += " ".join(f"{r['layers_ms'].get(l, 0.0):>8.1f}" for l in LAYERS)
+        row += f" {r['peak_mb']:>7.1f} {r['png_bytes'] / 1024:>8.1f}"
+        if baseline and key in baseline["results"]:
+            row += f" {r['total_ms'] - baseline['results'][key]['total_ms']:>+8.1f}"
+        rows.append(row)
+    return "\n".join(rows)
+
+
+def format_precision_report(data: Dict[str, Any]) -> str:
+    """Gewinn der reduzierten Genauigkeiten gegenüber "exact" (gleiche Funktion, Profil, Größe)."""
+    rows = [f"{'Fall':<36} {'schneller':>10} {'Speicher':>10} {'max Δ':>6} {'mittl. Δ':>9}"]
+    worst = 0
+    for key, r in data["results"].items():
+        if "max_diff" not in r:
+            continue
+        exact = data["results"].get(key.rsplit("/", 1)[0])
+        if exact is None:
+            continue
+        worst = max(worst, r["max_diff"])
+        rows.append(f"{key:<36} {exact['min_ms'] / r['min_ms']:>9.2f}× {exact['peak_mb'] / r['peak_mb']:>9.1f}× "
+                    f"{r['max_diff']:>6} {r['mean_diff']:>9.4f}")
+    rows.append(f"Größte Abweichung zum exakten Bild: {worst} Farbstufen (von 255)")
+    return "\n".join(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark für imagegen")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--profiles", nargs="+", choices=sorted(PROFILES), default=list(PROFILES))
+    parser.add_argument("--functions", nargs="+", choices=sorted(FUNCTIONS), default=list(FUNCTIONS))
+    parser.add_argument("--precisions", nargs="+", choices=PRECISIONS, default=["exact"],
+                        help="Rechengenauigkeiten (reduzierte werden gegen exact verglichen)")
+    parser.add_argument("--repeat", type=int, default=3, help="Läufe pro Fall (Median)")
+    parser.add_argument("--out", help="Ergebnis als JSON speichern")
+    parser.add_argument("--compare", help="Baseline-JSON zum Vergleich")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative Toleranz (0.15 = 15%%)")
+    parser.add_argument("--min-ms", type=float, default=2.0, help="Absolute Toleranz in ms")
+    args = parser.parse_args()
+
+    precisions = ["exact"] + [p for p in args.precisions if p != "exact"]
+    data = run_benchmark(args.sizes, args.profiles, args.functions, args.repeat, precisions=precisions)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(format_results(data, baseline))
+    if len(precisions) > 1:
+        print("\n" + format_precision_report(data))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        print(f"[bench] gespeichert: {args.out}")
+
+    if baseline is not None:
+        findings = compare(data, baseline, args.threshold, args.min_ms)
+        if findings:
+            print(f"\n[bench] {len(findings)} Regression(en) gegenüber {args.compare}:")
+            for finding in findings:
+                print(f"  - {finding}")
+            sys.exit(1)
+        print(f"\n[bench] keine Regressionen gegenüber {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
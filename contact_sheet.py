@@ -0,0 +1,344 @@
+"""
+Kontaktbogen des Archivs: jede Scheibe mit Bewertung und Beschreibungsanfang,
+als mehrseitiges PDF (A4) oder als ein großes Kachel-PNG.
+
+Der Export arbeitet mit konstantem Speicherbedarf:
+
+- die Einträge kommen seitenweise aus expert_db.iter_evaluations
+  (Keyset-Pagination, feste obere ID, damit Zählung und Inhalt passen)
+- Dekodieren und Verkleinern der Bilder läuft in einem Prozess-Pool; es sind
+  höchstens ``PREFETCH`` Kacheln pro Prozess gleichzeitig unterwegs, die
+  Reihenfolge bleibt erhalten
+- das PDF wird Seite für Seite geschrieben (jede Seite ein JPEG), am Ende
+  folgen nur Seitenbaum und Querverweistabelle
+- das PNG wird Kachelzeile für Kachelzeile geschrieben (png_stream.PNGWriter)
+
+Verwendung:
+    python contact_sheet.py archiv.pdf                          # alle Einträge, 4 Spalten
+    python contact_sheet.py bewertet.pdf --min-rating 4 --columns 5
+    python contact_sheet.py archiv.png --columns 12 --tile 160  # ein großes Kachelbild
+"""
+import argparse
+import concurrent.futures
+import io
+import os
+import time
+from collections import deque
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+import expert_db as db
+from overlays import load_font
+
+
+FORMATS = ("pdf", "png")
+
+# Zeilen pro Datenbankabfrage (mit Bild-Blobs)
+DB_PAGE_SIZE = 64
+# Kacheln pro Worker-Prozess, die gleichzeitig dekodiert werden dürfen
+PREFETCH = 4
+
+# A4 in Zoll
+PAGE_INCHES = (8.27, 11.69)
+MARGIN_INCHES = 0.4
+
+BACKGROUND = (255, 255, 255)
+TEXT_COLOR = (40, 40, 40)
+MUTED_COLOR = (120, 120, 120)
+PLACEHOLDER = (235, 235, 235)
+
+# Zeilen unter jeder Kachel: Kopfzeile (ID, Sterne) plus Beschreibungsanfang
+CAPTION_LINES = 3
+
+
+def _decode_tile(image_blob: Optional[bytes], tile_px: int) -> Optional[Tuple[Tuple[int, int], bytes]]:
+    """Worker: Bild dekodieren und in ``tile_px`` × ``tile_px`` einpassen (Größe, RGB-Bytes)."""
+    if not image_blob:
+        return None
+    try:
+        img = Image.open(io.BytesIO(image_blob))
+        img.draft("RGB", (tile_px, tile_px))  # JPEG: direkt verkleinert dekodieren
+        img = img.convert("RGB")
+        img.thumbnail((tile_px, tile_px), Image.LANCZOS)
+        return img.size, img.tobytes()
+    except Exception as e:
+        print(f"[contact_sheet] Bild nicht lesbar: {e}")
+        return None
+
+
+def iter_tiles(
+    tile_px: int,
+    min_rating: Optional[int] = None,
+    up_to_id: Optional[int] = None,
+    processes: Optional[int] = None,
+) -> Iterator[Tuple[Dict[str, Any], Optional[Image.Image]]]:
+    """
+    Liefert (Eintrag ohne Bild-Blob, verkleinerte Kachel) in ID-Reihenfolge.
+
+    Die Kachel ist None, wenn der Eintrag kein lesbares Bild hat.
+    """
+    processes = processes or os.cpu_count() or 1
+    in_flight: deque = deque()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        for page in db.iter_evaluations(DB_PAGE_SIZE, include_images=True,
+                                        min_rating=min_rating, up_to_id=up_to_id):
+            for row in page:
+                blob = row.pop("image_blob")
+                row.pop("image_format", None)
+                in_flight.append((row, pool.submit(_decode_tile, blob, tile_px)))
+                while len(in_flight) > processes * PREFETCH:
+                    yield _finish(*in_flight.popleft())
+        while in_flight:
+            yield _finish(*in_flight.popleft())
+
+
+def _finish(row: Dict[str, Any], future: concurrent.futures.Future) -> Tuple[Dict[str, Any], Optional[Image.Image]]:
+    decoded = future.result()
+    if decoded is None:
+        return row, None
+    size, data = decoded
+    return row, Image.frombytes("RGB", size, data)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Layout
+# ─────────────────────────────────────────────────────────────────────────────
+
+class _Layout:
+    """Geometrie einer Zelle: Kachel plus Beschriftung darunter."""
+
+    def __init__(self, tile_px: int, font_px: int):
+        self.tile = tile_px
+        self.font = load_font(font_px)
+        self.line_h = int(font_px * 1.3)
+        self.pad = max(font_px // 2, 4)
+        self.cell_w = tile_px + 2 * self.pad
+        self.cell_h = tile_px + 2 * self.pad + CAPTION_LINES * self.line_h
+
+    def _fit(self, text: str) -> str:
+        while text and self.font.getlength(text + " …") > self.tile:
+            text = text[:-1]
+        return text.rstrip() + " …"
+
+    def _wrap(self, text: str, lines: int) -> List[str]:
+        """Bricht ``text`` auf Kachelbreite um; was nicht in ``lines`` Zeilen passt, endet mit …"""
+        out, line, truncated = [], "", False
+        for word in text.split():
+            candidate = f"{line} {word}" if line else word
+            if self.font.getlength(candidate) <= self.tile or not line:
+                line = candidate
+            elif len(out) + 1 < lines:
+                out.append(line)
+                line = word
+            else:
+                truncated = True
+                break
+        if line:
+            out.append(line)
+        return [self._fit(l) if (truncated and i == len(out) - 1) or self.font.getlength(l) > self.tile else l
+                for i, l in enumerate(out)]
+
+    def draw_cell(self, canvas: Image.Image, draw: ImageDraw.ImageDraw, x: int, y: int,
+                  row: Dict[str, Any], tile: Optional[Image.Image]):
+        x0, y0 = x + self.pad, y + self.pad
+        if tile is None:
+            draw.ellipse((x0, y0, x0 + self.tile, y0 + self.tile), fill=PLACEHOLDER)
+        else:
+            canvas.paste(tile, (x0 + (self.tile - tile.width) // 2, y0 + (self.tile - tile.height) // 2))
+
+        text_y = y0 + self.tile + self.pad // 2
+        rating = row.get("rating")
+        stars = "★" * rating + "☆" * (5 - rating) if rating else "unbewertet"
+        draw.text((x0, text_y), f"#{row['id']}  {stars}", font=self.font,
+                  fill=TEXT_COLOR if rating else MUTED_COLOR)
+        for i, line in enumerate(self._wrap(row.get("wine_description") or "", CAPTION_LINES - 1)):
+            draw.text((x0, text_y + (i + 1) * self.line_h), line, font=self.font, fill=MUTED_COLOR)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PDF
+# ─────────────────────────────────────────────────────────────────────────────
+
+class PdfWriter:
+    """
+    Minimaler PDF-Writer: jede Seite ein JPEG, sofort geschrieben.
+
+    Im Speicher bleiben nur die Byte-Offsets der Objekte und die
+    Objektnummern der Seiten.
+    """
+
+    def __init__(self, fp: BinaryIO, dpi: int = 150, quality: int = 88):
+        self.fp = fp
+        self.dpi = dpi
+        self.quality = quality
+        self.pages: List[int] = []
+        self._offsets: Dict[int, int] = {}
+        self._next_obj = 3  # 1 = Katalog, 2 = Seitenbaum (am Ende)
+        self._pos = 0
+        self._out(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _out(self, data: bytes):
+        self.fp.write(data)
+        self._pos += len(data)
+
+    def _object(self, number: int, body: bytes, stream: Optional[bytes] = None):
+        self._offsets[number] = self._pos
+        self._out(f"{number} 0 obj\n".encode() + body)
+        if stream is not None:
+            self._out(b"\nstream\n" + stream + b"\nendstream")
+        self._out(b"\nendobj\n")
+
+    def _allocate(self, count: int) -> List[int]:
+        numbers = list(range(self._next_obj, self._next_obj + count))
+        self._next_obj += count
+        return numbers
+
+    def add_page(self, img: Image.Image):
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=self.quality, optimize=True)
+        jpeg = buf.getvalue()
+        w_pt, h_pt = img.width * 72 / self.dpi, img.height * 72 / self.dpi
+
+        image_obj, content_obj, page_obj = self._allocate(3)
+        self._object(image_obj, (
+            f"<< /Type /XObject /Subtype /Image /Width {img.width} /Height {img.height} "
+            f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode /Length {len(jpeg)} >>"
+        ).encode(), jpeg)
+        content = f"q {w_pt:.2f} 0 0 {h_pt:.2f} 0 0 cm /Im0 Do Q".encode()
+        self._object(content_obj, f"<< /Length {len(content)} >>".encode(), content)
+        self._object(page_obj, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {w_pt:.2f} {h_pt:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_obj} 0 R >> >> /Contents {content_obj} 0 R >>"
+        ).encode())
+        self.pages.append(page_obj)
+
+    def close(self):
+        kids = " ".join(f"{page} 0 R" for page in self.pages)
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode())
+        xref = self._pos
+        lines = [f"xref\n0 {self._next_obj}\n", "0000000000 65535 f \n"]
+        lines += [f"{self._offsets[n]:010d} 00000 n \n" for n in range(1, self._next_obj)]
+        lines.append(f"trailer\n<< /Size {self._next_obj} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n")
+        self._out("".join(lines).encode())
+
+
+def write_pdf(
+    fp: BinaryIO,
+    columns: int = 4,
+    dpi: int = 150,
+    min_rating: Optional[int] = None,
+    processes: Optional[int] = None,
+    title: str = "Weinarchiv",
+) -> Dict[str, int]:
+    """Schreibt den Kontaktbogen als A4-PDF; liefert Anzahl Einträge und Seiten."""
+    page_w, page_h = (round(inches * dpi) for inches in PAGE_INCHES)
+    margin = round(MARGIN_INCHES * dpi)
+    font_px = max(dpi // 12, 8)
+    cell_w = (page_w - 2 * margin) // columns
+    layout = _Layout(cell_w - 2 * max(font_px // 2, 4), font_px)
+    header_h = layout.line_h * 2
+    rows = max((page_h - 2 * margin - header_h) // layout.cell_h, 1)
+    row_pitch = (page_h - 2 * margin - header_h) // rows  # Restplatz gleichmäßig verteilen
+    per_page = rows * columns
+
+    total, up_to_id = db.count_evaluations(min_rating)
+    n_pages = max(-(-total // per_page), 1)
+    writer = PdfWriter(fp, dpi)
+    stamp = time.strftime("%d.%m.%Y")
+
+    def new_page():
+        page = Image.new("RGB", (page_w, page_h), BACKGROUND)
+        draw = ImageDraw.Draw(page)
+        draw.text((margin, margin), f"{title} · {total} Einträge · Stand {stamp}",
+                  font=layout.font, fill=TEXT_COLOR)
+        draw.text((page_w - margin - layout.font.getlength(f"Seite {len(writer.pages) + 1}/{n_pages}"), margin),
+                  f"Seite {len(writer.pages) + 1}/{n_pages}", font=layout.font, fill=MUTED_COLOR)
+        return page, draw
+
+    page, draw = new_page()
+    count = 0
+    for row, tile in iter_tiles(layout.tile, min_rating, up_to_id, processes):
+        slot = count % per_page
+        if slot == 0 and count:
+            writer.add_page(page)
+            page, draw = new_page()
+        x = margin + (slot % columns) * cell_w
+        y = margin + header_h + (slot // columns) * row_pitch
+        layout.draw_cell(page, draw, x, y, row, tile)
+        count += 1
+    writer.add_page(page)
+    writer.close()
+    return {"entries": count, "pages": len(writer.pages)}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PNG
+# ─────────────────────────────────────────────────────────────────────────────
+
+def write_png(
+    fp: BinaryIO,
+    columns: int = 10,
+    tile_px: int = 200,
+    min_rating: Optional[int] = None,
+    processes: Optional[int] = None,
+) -> Dict[str, int]:
+    """Schreibt den Kontaktbogen als ein Kachel-PNG; liefert Anzahl Einträge und Bildgröße."""
+    import numpy as np
+    from png_stream import PNGWriter
+
+    layout = _Layout(tile_px, max(tile_px // 14, 9))
+    total, up_to_id = db.count_evaluations(min_rating)
+    n_rows = max(-(-total // columns), 1)
+    width, height = columns * layout.cell_w, n_rows * layout.cell_h
+    writer = PNGWriter(fp, width, height)
+
+    band = draw = None
+    count = 0
+    for row, tile in iter_tiles(tile_px, min_rating, up_to_id, processes):
+        if count >= n_rows * columns:
+            break  # nach dem Zählen gespeicherte Einträge liegen über up_to_id, gelöschte fehlen nur
+        slot = count % columns
+        if slot == 0:
+            if band is not None:
+                writer.add_rows(np.asarray(band))
+            band = Image.new("RGB", (width, layout.cell_h), BACKGROUND)
+            draw = ImageDraw.Draw(band)
+        layout.draw_cell(band, draw, slot * layout.cell_w, 0, row, tile)
+        count += 1
+    if band is not None:
+        writer.add_rows(np.asarray(band))
+    writer.close(fill=BACKGROUND)
+    return {"entries": count, "width": width, "height": height}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kontaktbogen des Archivs als PDF oder Kachel-PNG")
+    parser.add_argument("out", help="Zieldatei (.pdf oder .png)")
+    parser.add_argument("--format", choices=FORMATS, help="Standard: aus der Dateiendung")
+    parser.add_argument("--columns", type=int, help="Spalten (PDF: 4, PNG: 10)")
+    parser.add_argument("--tile", type=int, default=200, help="Kachelgröße in Pixeln (nur PNG)")
+    parser.add_argument("--dpi", type=int, default=150, help="Auflösung der PDF-Seiten")
+    parser.add_argument("--min-rating", type=int, help="Nur Einträge mit mindestens dieser Bewertung")
+    parser.add_argument("--processes", type=int, default=None, help="Worker-Prozesse (Standard: CPU-Kerne)")
+    args = parser.parse_args()
+
+    fmt = args.format or os.path.splitext(args.out)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        parser.error(f"Unbekanntes Format '{fmt}' (erlaubt: {', '.join(FORMATS)})")
+
+    start = time.perf_counter()
+    with open(args.out, "wb") as f:
+        if fmt == "pdf":
+            result = write_pdf(f, args.columns or 4, args.dpi, args.min_rating, args.processes)
+            detail = f"{result['pages']} Seiten"
+        else:
+            result = write_png(f, args.columns or 10, args.tile, args.min_rating, args.processes)
+            detail = f"{result['width']}×{result['height']} px"
+    print(f"[contact_sheet] {result['entries']} Einträge → {args.out} ({detail}, "
+          f"{time.perf_counter() - start:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
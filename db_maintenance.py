@@ -0,0 +1,246 @@
+"""
+Wartung der Bewertungs-Datenbank: Vacuum, Statistiken, WAL-Checkpoints, Integritätsprüfung.
+
+Alle Schritte sind so gewählt, dass Leser nicht blockiert werden (WAL-Modus,
+inkrementelles Vacuum in kleinen Transaktionen, passive Checkpoints).
+Nur ``enable_incremental_vacuum`` führt einmalig ein vollständiges VACUUM aus.
+
+Verwendung:
+    python db_maintenance.py stats
+    python db_maintenance.py run [--full-check]
+    python db_maintenance.py enable-incremental
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import expert_db as db
+
+
+# Intervall der Hintergrund-Wartung in Sekunden (Standard: alle 6 Stunden)
+MAINTENANCE_INTERVAL = float(os.environ.get("WINE_DB_MAINTENANCE_INTERVAL", 6 * 3600))
+
+# Seiten pro Vacuum-Schritt; jeder Schritt ist eine kurze eigene Transaktion
+VACUUM_STEP_PAGES = 256
+
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+
+def _connect() -> sqlite3.Connection:
+    db.ensure_db()
+    conn = sqlite3.connect(db.DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    return conn
+
+
+def collect_stats(conn: Optional[sqlite3.Connection] = None) -> Dict[str, Any]:
+    """
+    Ermittelt Seiten- und Fragmentierungsstatistiken der Datenbank.
+
+    Returns:
+        Dict mit page_size, page_count, freelist_count, file_bytes, free_bytes,
+        fragmentation (Anteil freier Seiten), wal_bytes, auto_vacuum und – falls
+        SQLite mit dbstat gebaut ist – belegtem/ungenutztem Platz pro Tabelle
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect()
+
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+    wal_path = f"{db.DB_PATH}-wal"
+    stats = {
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_count": freelist_count,
+        "file_bytes": page_size * page_count,
+        "free_bytes": page_size * freelist_count,
+        "fragmentation": round(freelist_count / page_count, 4) if page_count else 0.0,
+        "wal_bytes": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        "auto_vacuum": AUTO_VACUUM_MODES.get(auto_vacuum, str(auto_vacuum)),
+    }
+
+    try:
+        rows = conn.execute(
+            """SELECT name, COUNT(*), SUM(pgsize), SUM(unused)
+               FROM dbstat GROUP BY name ORDER BY SUM(pgsize) DESC"""
+        ).fetchall()
+        stats["tables"] = {
+            name: {"pages": pages, "bytes": size, "unused_bytes": unused}
+            for name, pages, size, unused in rows
+        }
+    except sqlite3.OperationalError:
+        pass  # dbstat nicht verfügbar
+
+    if own_conn:
+        conn.close()
+    return stats
+
+
+def run_maintenance(
+    max_vacuum_pages: Optional[int] = None,
+    full_check: bool = False,
+    checkpoint_mode: str = "PASSIVE",
+) -> Dict[str, Any]:
+    """
+    Führt einen Wartungslauf durch.
+
+    Schritte: inkrementelles Vacuum in kleinen Schritten, ``PRAGMA optimize``
+    (aktualisiert bei Bedarf die ANALYZE-Statistiken), WAL-Checkpoint und
+    Integritätsprüfung.
+
+    Args:
+        max_vacuum_pages: Höchstens so viele freie Seiten zurückgeben (None = alle)
+        full_check: ``integrity_check`` statt des schnelleren ``quick_check``
+        checkpoint_mode: "PASSIVE" (blockiert nie) oder "TRUNCATE" (kürzt die WAL-Datei)
+
+    Returns:
+        Bericht mit Statistiken vorher/nachher und den Ergebnissen der Schritte
+    """
+    started = time.perf_counter()
+    conn = _connect()
+    before = collect_stats(conn)
+    report: Dict[str, Any] = {"started_at": datetime.now().isoformat(), "before": before}
+
+    # Inkrementelles Vacuum
+    vacuumed = 0
+    if before["auto_vacuum"] == "incremental":
+        remaining = before["freelist_count"]
+        if max_vacuum_pages is not None:
+            remaining = min(remaining, max_vacuum_pages)
+        while remaining > 0:
+            step = min(VACUUM_STEP_PAGES, remaining)
+            # executescript statt execute: execute führt das Pragma nur einen Schritt
+            # (= eine Seite) weit aus
+            conn.executescript(f"PRAGMA incremental_vacuum({step});")
+            remaining -= step
+        vacuumed = before["freelist_count"] - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    report["vacuumed_pages"] = vacuumed
+
+    conn.execute("PRAGMA optimize")
+
+    busy, wal_pages, checkpointed = conn.execute(
+        f"PRAGMA wal_checkpoint({checkpoint_mode})"
+    ).fetchone()
+    report["checkpoint"] = {"busy": bool(busy), "wal_pages": wal_pages, "checkpointed": checkpointed}
+
+    check = "integrity_check" if full_check else "quick_check"
+    problems = [row[0] for row in conn.execute(f"PRAGMA {check}").fetchall()]
+    report["integrity"] = {"check": check, "ok": problems == ["ok"], "messages": problems[:20]}
+
+    report["after"] = collect_stats(conn)
+    conn.close()
+    report["duration_s"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def enable_incremental_vacuum() -> bool:
+    """
+    Stellt eine bestehende Datenbank auf ``auto_vacuum = INCREMENTAL`` um.
+
+    Erfordert einmalig ein vollständiges VACUUM, das die Datenbank für die
+    Dauer sperrt – daher nicht automatisch, sondern nur per CLI.
+
+    Returns:
+        True wenn umgestellt wurde, False wenn bereits aktiv
+    """
+    db.flush_writes()
+    conn = _connect()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        conn.close()
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    conn.close()
+    return True
+
+
+class MaintenanceScheduler:
+    """Führt run_maintenance periodisch in einem Hintergrund-Thread aus."""
+
+    def __init__(self, interval: float = MAINTENANCE_INTERVAL):
+        self.interval = interval
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.last_report = run_maintenance()
+            except sqlite3.Error as e:
+                print(f"[db_maintenance] Wartung fehlgeschlagen: {e}")
+
+
+_scheduler: Optional[MaintenanceScheduler] = None
+
+
+def start_background_maintenance(interval: float = MAINTENANCE_INTERVAL) -> MaintenanceScheduler:
+    """Startet die Hintergrund-Wartung (einmal pro Prozess)."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = MaintenanceScheduler(interval)
+        _scheduler.start()
+    return _scheduler
+
+
+def _format_stats(stats: Dict[str, Any]) -> str:
+    return (
+        f"{stats['page_count']} Seiten à {stats['page_size']} B "
+        f"({stats['file_bytes'] / 1e6:.1f} MB), "
+        f"{stats['freelist_count']} frei ({stats['fragmentation']:.1%}), "
+        f"WAL {stats['wal_bytes'] / 1e6:.1f} MB, auto_vacuum={stats['auto_vacuum']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wartung der Bewertungs-Datenbank")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Seiten- und Fragmentierungsstatistik anzeigen")
+    p_run = sub.add_parser("run", help="Wartungslauf ausführen")
+    p_run.add_argument("--full-check", action="store_true", help="integrity_check statt quick_check")
+    p_run.add_argument("--truncate-wal", action="store_true", help="WAL-Datei nach dem Checkpoint kürzen")
+    sub.add_parser("enable-incremental", help="Bestehende DB auf inkrementelles Vacuum umstellen (sperrt kurz)")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        stats = collect_stats()
+        print(_format_stats(stats))
+        for name, t in stats.get("tables", {}).items():
+            print(f"  {name:<36} {t['pages']:>7} Seiten  {t['bytes'] / 1e6:8.2f} MB  "
+                  f"ungenutzt {t['unused_bytes'] / 1e6:6.2f} MB")
+    elif args.command == "run":
+        report = run_maintenance(
+            full_check=args.full_check,
+            checkpoint_mode="TRUNCATE" if args.truncate_wal else "PASSIVE",
+        )
+        print(f"vorher:  {_format_stats(report['before'])}")
+        print(f"nachher: {_format_stats(report['after'])}")
+        print(f"vacuum: {report['vacuumed_pages']} Seiten, "
+              f"checkpoint: {report['checkpoint']['checkpointed']}/{report['checkpoint']['wal_pages']}, "
+              f"{report['integrity']['check']}: {'ok' if report['integrity']['ok'] else report['integrity']['messages']}, "
+              f"{report['duration_s']} s")
+    else:
+        changed = enable_incremental_vacuum()
+        print("auto_vacuum=incremental aktiviert" if changed else "auto_vacuum=incremental war bereits aktiv")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,48 @@
 """
 SQLite-Datenbank für Experten-Bewertungen der Wein-Visualisierungen.
 """
+import atexit
+import io
+import os
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Iterable, Iterator, Tuple
+
+import perf
 
 
 DB_PATH = Path(__file__).parent / "evaluations.db"
 
+# Durability-Modus für Schreibzugriffe:
+#   "sync"  – jede Operation committet sofort im aufrufenden Thread
+#   "batch" – Write-Behind: ein Writer-Thread bündelt Operationen in Transaktionen
+#   "fast"  – wie "batch", aber ohne fsync (PRAGMA synchronous=OFF)
+# Write-Behind reserviert IDs blockweise über sqlite_sequence, andere Prozesse
+# dürfen daher gleichzeitig schreiben (siehe _WriteBehindQueue).
+DURABILITY_MODES = ("sync", "batch", "fast")
+DURABILITY = os.environ.get("WINE_DB_DURABILITY", "batch")
+
+# IDs, die sich der Write-Behind-Writer auf einmal reserviert (siehe _WriteBehindQueue.allocate_id)
+ID_BLOCK = 64
+
+# Vorschaubilder für die Galerie (längste Seite in Pixeln, WebP-Qualität)
+THUMBNAIL_SIZE = 128
+THUMBNAIL_QUALITY = 75
+
 
 def init_db():
     """Erstellt die Datenbank-Tabellen falls sie nicht existieren."""
+    global _initialized_path
     conn = sqlite3.connect(DB_PATH)
+    # Neue Datenbanken direkt mit inkrementellem Vacuum anlegen (wirkt nur auf leere Dateien,
+    # bestehende stellt db_maintenance.enable_incremental_vacuum um)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # WAL: Leser blockieren weder den Writer-Thread noch die Wartung
+    conn.execute("PRAGMA journal_mode = WAL")
     conn.execute("""
         CREATE TABLE IF NOT EXISTS evaluations (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -20,40 +50,694 @@ def init_db():
             wine_description TEXT NOT NULL,
             viz_params TEXT NOT NULL,
             image_blob BLOB NOT NULL,
+            image_format TEXT NOT NULL DEFAULT 'png',
+            phash INTEGER,
+            renderer_version INTEGER,
+            render_fingerprint TEXT,
             rating INTEGER CHECK(rating >= 1 AND rating <= 5),
             comment TEXT,
             evaluated_at TEXT
         )
     """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS transfer_progress (
+            source TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS thumbnails (
+            evaluation_id INTEGER PRIMARY KEY,
+            thumb_blob BLOB NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS thumbnails_ad AFTER DELETE ON evaluations BEGIN
+            DELETE FROM thumbnails WHERE evaluation_id = old.id;
+        END
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_evaluations_rating ON evaluations (rating)")
+    _migrate_columns(conn)
+    _init_change_counter(conn)
+    _init_phash_index(conn)
+    _init_search_index(conn)
     conn.commit()
     conn.close()
+    _initialized_path = DB_PATH
+
+
+# Pfad, für den init_db() zuletzt gelaufen ist (None = noch nie)
+_initialized_path: Optional[Path] = None
+_init_lock = threading.Lock()
+
+
+def ensure_db():
+    """Führt init_db() beim ersten Zugriff aus (statt schon beim Import)."""
+    if _initialized_path != DB_PATH:
+        with _init_lock:
+            if _initialized_path != DB_PATH:
+                init_db()
+
+
+def _connect() -> sqlite3.Connection:
+    """Öffnet eine Verbindung zur (bei Bedarf frisch angelegten) Datenbank."""
+    ensure_db()
+    return sqlite3.connect(DB_PATH)
+
+
+def _migrate_columns(conn: sqlite3.Connection):
+    """Ergänzt Spalten, die ältere Datenbanken noch nicht haben."""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(evaluations)")}
+    if "image_format" not in existing:
+        # Alle bisherigen Bilder sind PNG
+        conn.execute("ALTER TABLE evaluations ADD COLUMN image_format TEXT NOT NULL DEFAULT 'png'")
+        print("[expert_db] Spalte image_format ergänzt")
+    if "phash" not in existing:
+        # Wird für neue Einträge beim Speichern berechnet, ältere über backfill_phashes
+        conn.execute("ALTER TABLE evaluations ADD COLUMN phash INTEGER")
+        print("[expert_db] Spalte phash ergänzt")
+    if "renderer_version" not in existing:
+        # NULL = Herkunft unbekannt (ältere Einträge, externe API, Import); siehe rerender.py
+        conn.execute("ALTER TABLE evaluations ADD COLUMN renderer_version INTEGER")
+        conn.execute("ALTER TABLE evaluations ADD COLUMN render_fingerprint TEXT")
+        print("[expert_db] Spalten renderer_version/render_fingerprint ergänzt")
+
+
+def _init_change_counter(conn: sqlite3.Connection):
+    """
+    Zähler, den Trigger bei jeder Änderung an ``evaluations`` erhöhen – auch
+    durch andere Prozesse (siehe check_external_changes).
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS change_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            seq INTEGER NOT NULL
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO change_counter (id, seq) VALUES (1, 0)")
+    for name, action in (("ai", "INSERT"), ("ad", "DELETE"), ("au", "UPDATE")):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS change_counter_{name} AFTER {action} ON evaluations BEGIN
+                UPDATE change_counter SET seq = seq + 1 WHERE id = 1;
+            END
+        """)
+
+
+def _init_phash_index(conn: sqlite3.Connection):
+    """Index auf dem Perceptual Hash plus ein Ausdrucks-Index je Teil (Multi-Index-Hashing, siehe phash.py)."""
+    import phash
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_evaluations_phash ON evaluations (phash)")
+    for i in range(phash.CHUNKS):
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_evaluations_phash_{i} ON evaluations ({phash.chunk_expression(i)})"
+        )
+
+
+def _init_search_index(conn: sqlite3.Connection):
+    """
+    Legt den FTS5-Suchindex über Beschreibung und Kommentar an.
+    
+    Der Index ist eine External-Content-Tabelle auf ``evaluations`` und wird
+    über Trigger synchron gehalten. Beim ersten Anlegen wird er aus den
+    bestehenden Einträgen aufgebaut.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'evaluations_fts'"
+    ).fetchone()
+    if exists:
+        return
+    
+    conn.executescript("""
+        CREATE VIRTUAL TABLE evaluations_fts USING fts5(
+            wine_description, comment,
+            content='evaluations', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        
+        CREATE TRIGGER IF NOT EXISTS evaluations_fts_ai AFTER INSERT ON evaluations BEGIN
+            INSERT INTO evaluations_fts (rowid, wine_description, comment)
+            VALUES (new.id, new.wine_description, new.comment);
+        END;
+        
+        CREATE TRIGGER IF NOT EXISTS evaluations_fts_ad AFTER DELETE ON evaluations BEGIN
+            INSERT INTO evaluations_fts (evaluations_fts, rowid, wine_description, comment)
+            VALUES ('delete', old.id, old.wine_description, old.comment);
+        END;
+        
+        CREATE TRIGGER IF NOT EXISTS evaluations_fts_au
+        AFTER UPDATE OF wine_description, comment ON evaluations BEGIN
+            INSERT INTO evaluations_fts (evaluations_fts, rowid, wine_description, comment)
+            VALUES ('delete', old.id, old.wine_description, old.comment);
+            INSERT INTO evaluations_fts (rowid, wine_description, comment)
+            VALUES (new.id, new.wine_description, new.comment);
+        END;
+        
+        INSERT INTO evaluations_fts (evaluations_fts) VALUES ('rebuild');
+    """)
 
 
-def save_visualization(description: str, params: Dict[str, Any], image_bytes: bytes) -> int:
+# Listener für Datenänderungen: callback(event, evaluation_id)
+# event ist "save", "rating", "delete", "import", "thumbnails", "phashes",
+# "rerender" oder "external" (die letzten fünf betreffen mehrere Einträge,
+# evaluation_id ist dann None; "external" meldet check_external_changes).
+# Aufruf erst nach dem Commit – im Write-Behind-Modus aus dem Writer-Thread.
+_change_listeners: List[Callable[[str, Optional[int]], None]] = []
+
+
+def add_change_listener(callback: Callable[[str, Optional[int]], None]):
+    """Registriert einen Listener, der nach jeder committeten Änderung aufgerufen wird."""
+    if callback not in _change_listeners:
+        _change_listeners.append(callback)
+
+
+def remove_change_listener(callback: Callable[[str, Optional[int]], None]):
+    """Entfernt einen mit add_change_listener registrierten Listener."""
+    if callback in _change_listeners:
+        _change_listeners.remove(callback)
+
+
+def _notify(event: str, evaluation_id: Optional[int]):
+    if event != "external":
+        # Eigene Änderung: nicht noch einmal als fremde melden
+        _watcher.mark_seen()
+    for callback in list(_change_listeners):
+        try:
+            callback(event, evaluation_id)
+        except Exception as e:
+            print(f"[expert_db] Listener-Fehler ({event}): {e}")
+
+
+class _ChangeWatcher:
+    """
+    Erkennt Änderungen anderer Prozesse an ``evaluations``.
+
+    ``PRAGMA data_version`` auf einer eigenen Verbindung ändert sich nach
+    jedem fremden Commit (billig, ohne Tabellenzugriff); erst dann wird der
+    Trigger-Zähler aus ``change_counter`` gelesen, damit Commits auf anderen
+    Tabellen (Job-Queue, Fortschritt) keine Invalidierung auslösen.
+
+    Eigene Änderungen übernimmt _notify als gesehen. Committet ein anderer
+    Prozess genau zwischen einem eigenen Commit und dessen Meldung, gilt
+    seine Änderung ebenfalls als gesehen und wird erst mit der nächsten
+    fremden Änderung erkannt.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._path: Optional[Path] = None
+        self._data_version: Optional[int] = None
+        self._seq: Optional[int] = None
+
+    def _read(self) -> Tuple[int, int]:
+        """(data_version, Zählerstand); aufrufen mit gehaltenem Lock."""
+        if self._conn is None or self._path != DB_PATH:
+            if self._conn is not None:
+                self._conn.close()
+            ensure_db()
+            self._conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+            self._conn.execute("PRAGMA busy_timeout = 30000")
+            self._path = DB_PATH
+            self._data_version = self._seq = None
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return data_version, self._seq
+        row = self._conn.execute("SELECT seq FROM change_counter WHERE id = 1").fetchone()
+        return data_version, row[0] if row else 0
+
+    def mark_seen(self):
+        with self._lock:
+            if self._conn is None or self._path != DB_PATH:
+                return  # noch nicht beobachtet: der erste check setzt den Stand
+            self._data_version, self._seq = self._read()
+
+    def changed(self) -> bool:
+        with self._lock:
+            previous = self._seq
+            self._data_version, self._seq = self._read()
+            return previous is not None and self._seq != previous
+
+
+_watcher = _ChangeWatcher()
+
+
+def check_external_changes() -> bool:
+    """
+    Prüft, ob andere Prozesse seit dem letzten Aufruf Einträge geändert
+    haben, und meldet das den Listenern als Ereignis "external".
+
+    Vor dem Ausliefern gecachter Daten aufrufen (z.B. am Anfang jedes
+    App-Durchlaufs). Der erste Aufruf legt nur den Ausgangsstand fest.
+    """
+    if not _watcher.changed():
+        return False
+    print("[expert_db] Änderungen eines anderen Prozesses erkannt")
+    _notify("external", None)
+    return True
+
+
+class WriteError(Exception):
+    """Eine verzögerte Schreiboperation für eine bereits vergebene ID ist fehlgeschlagen."""
+
+
+class _WriteBehindQueue:
+    """
+    Hintergrund-Writer für die Modi "batch" und "fast".
+    
+    IDs werden beim Einreihen vergeben, damit der Aufrufer nicht auf den
+    Commit warten muss. Der Writer-Thread fasst alle Operationen, die innerhalb
+    von ``max_delay`` Sekunden anfallen, zu einer Transaktion zusammen.
+    
+    Die IDs reserviert der Writer blockweise über ``sqlite_sequence``: Da
+    ``evaluations`` AUTOINCREMENT nutzt, vergibt SQLite in allen anderen
+    Prozessen (Sync-Modus, job_queue, Import, weitere Write-Behind-Writer) nur
+    noch IDs oberhalb des Blocks. Nicht genutzte IDs eines Blocks bleiben frei.
+    """
+    
+    def __init__(self, max_batch: int = 256, max_delay: float = 0.05):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._pending_ids: Dict[int, int] = {}
+        self._failed: Dict[int, str] = {}
+        self._next_id: Optional[int] = None
+        self._block_end = 0
+        self._block_path: Optional[Path] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    def allocate_id(self) -> int:
+        """Vergibt die nächste ID aus dem reservierten Block (reserviert bei Bedarf einen neuen)."""
+        with self._lock:
+            if self._next_id is None or self._next_id > self._block_end or self._block_path != DB_PATH:
+                self._next_id, self._block_end = self._reserve_block()
+                self._block_path = DB_PATH
+            new_id = self._next_id
+            self._next_id += 1
+            return new_id
+    
+    @staticmethod
+    def _reserve_block() -> tuple[int, int]:
+        """Setzt ``sqlite_sequence`` in einer eigenen Transaktion um ID_BLOCK weiter; liefert (erste, letzte) ID."""
+        conn = _connect()
+        conn.execute("PRAGMA busy_timeout = 30000")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            max_id = conn.execute("SELECT MAX(id) FROM evaluations").fetchone()[0] or 0
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'evaluations'").fetchone()
+            first = max(max_id, row[0] if row else 0) + 1
+            last = first + ID_BLOCK - 1
+            if row:
+                conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'evaluations'", (last,))
+            else:
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('evaluations', ?)", (last,))
+            conn.commit()
+        finally:
+            conn.close()
+        return first, last
+    
+    def reset_ids(self):
+        """Verwirft den Rest des reservierten ID-Blocks."""
+        with self._lock:
+            self._next_id = None
+    
+    def check(self, evaluation_id: int):
+        """Wirft WriteError, falls eine Schreiboperation für ``evaluation_id`` fehlgeschlagen ist."""
+        error = self._failed.get(evaluation_id)
+        if error is not None:
+            raise WriteError(f"Eintrag {evaluation_id} wurde nicht gespeichert: {error}")
+    
+    def submit(self, sql, params: tuple, evaluation_id: Optional[int] = None,
+               event: Optional[str] = None):
+        """
+        Reiht eine Schreiboperation ein; ``event`` wird nach dem Commit gemeldet.
+
+        ``sql`` ist eine Anweisung oder eine Funktion ``(conn, *params)``, die im
+        Writer-Thread läuft (für Arbeit, die den Aufrufer nicht bremsen soll).
+        """
+        with self._lock:
+            if evaluation_id is not None:
+                self._pending_ids[evaluation_id] = self._pending_ids.get(evaluation_id, 0) + 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="expert_db-writer", daemon=True
+                )
+                self._thread.start()
+        self._queue.put((sql, params, evaluation_id, event))
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wartet, bis alle bisher eingereihten Operationen committet sind."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+    
+    def wait_for(self, evaluation_id: int, timeout: Optional[float] = None) -> bool:
+        """
+        Wartet, bis keine Operation für ``evaluation_id`` mehr aussteht.
+        
+        Raises:
+            WriteError: wenn eine dieser Operationen fehlgeschlagen ist
+        """
+        with self._done:
+            done = self._done.wait_for(
+                lambda: evaluation_id not in self._pending_ids, timeout
+            )
+        self.check(evaluation_id)
+        return done
+    
+    def _collect(self) -> list:
+        items = [self._queue.get()]
+        while len(items) < self.max_batch and not isinstance(items[-1], threading.Event):
+            try:
+                items.append(self._queue.get(timeout=self.max_delay))
+            except queue.Empty:
+                break
+        return items
+    
+    @staticmethod
+    def _apply(conn: sqlite3.Connection, sql, params: tuple):
+        if callable(sql):
+            sql(conn, *params)
+        else:
+            conn.execute(sql, params)
+    
+    def _execute(self, conn: sqlite3.Connection, ops: list):
+        try:
+            with conn:
+                for sql, params, _, _ in ops:
+                    self._apply(conn, sql, params)
+        except sqlite3.Error:
+            # Fehlerhafte Operation isolieren, damit der Rest des Batches erhalten bleibt;
+            # die ID ist schon beim Aufrufer, der Fehler wird daher für sie vermerkt (siehe check)
+            for sql, params, evaluation_id, _ in ops:
+                try:
+                    with conn:
+                        self._apply(conn, sql, params)
+                except sqlite3.Error as e:
+                    name = sql.__name__ if callable(sql) else sql.split()[0]
+                    print(f"[expert_db] Schreibfehler: {e} ({name} {evaluation_id!r})")
+                    if evaluation_id is not None:
+                        with self._lock:
+                            self._failed.setdefault(evaluation_id, str(e))
+    
+    def _run(self):
+        conn = _connect()
+        # Andere Prozesse (job_queue, Import, rerender) schreiben zeitweise in dieselbe Datei
+        conn.execute("PRAGMA busy_timeout = 30000")
+        while True:
+            items = self._collect()
+            ops = [item for item in items if not isinstance(item, threading.Event)]
+            if ops:
+                conn.execute(f"PRAGMA synchronous = {'OFF' if DURABILITY == 'fast' else 'NORMAL'}")
+                with perf.span("db.write_batch"):
+                    self._execute(conn, ops)
+                perf.count("db.writes", len(ops))
+                with self._done:
+                    for _, _, evaluation_id, _ in ops:
+                        if evaluation_id is None:
+                            continue
+                        self._pending_ids[evaluation_id] -= 1
+                        if self._pending_ids[evaluation_id] <= 0:
+                            del self._pending_ids[evaluation_id]
+                    self._done.notify_all()
+                for _, _, evaluation_id, event in ops:
+                    if event is not None:
+                        _notify(event, evaluation_id)
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+
+_writer = _WriteBehindQueue()
+atexit.register(_writer.flush)
+
+
+def set_durability(mode: str):
+    """
+    Wechselt den Durability-Modus zur Laufzeit.
+    
+    Ausstehende Schreibzugriffe werden vorher committet.
+    
+    Args:
+        mode: "sync", "batch" oder "fast"
+    """
+    global DURABILITY
+    if mode not in DURABILITY_MODES:
+        raise ValueError(f"Unbekannter Durability-Modus: {mode}")
+    _writer.flush()
+    _writer.reset_ids()
+    DURABILITY = mode
+
+
+def flush_writes(timeout: Optional[float] = None) -> bool:
+    """Wartet, bis alle ausstehenden Schreibzugriffe committet sind."""
+    return _writer.flush(timeout)
+
+
+def _write(sql: str, params: tuple, evaluation_id: Optional[int] = None, event: Optional[str] = None):
+    """Führt eine Schreiboperation je nach Durability-Modus sofort oder verzögert aus."""
+    if DURABILITY == "sync":
+        conn = _connect()
+        conn.execute("PRAGMA busy_timeout = 30000")
+        conn.execute(sql, params)
+        conn.commit()
+        conn.close()
+        if event is not None:
+            _notify(event, evaluation_id)
+    else:
+        if evaluation_id is not None:
+            _writer.check(evaluation_id)
+        _writer.submit(sql, params, evaluation_id, event)
+
+
+def make_thumbnail(image_bytes: bytes) -> tuple[bytes, int, int]:
+    """
+    Erstellt ein kleines WebP-Vorschaubild.
+    
+    Args:
+        image_bytes: Das Originalbild (PNG o.ä.)
+        
+    Returns:
+        (WebP-Bytes, Breite, Höhe)
+    """
+    import io
+    from PIL import Image
+    
+    img = Image.open(io.BytesIO(image_bytes))
+    img.draft("RGB", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    return _thumbnail(img.convert("RGB"))
+
+
+def _thumbnail(img) -> tuple[bytes, int, int]:
+    from PIL import Image
+    
+    img = img.copy()
+    img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+    
+    buffer = io.BytesIO()
+    img.save(buffer, format="WEBP", quality=THUMBNAIL_QUALITY, method=4)
+    return buffer.getvalue(), img.width, img.height
+
+
+def _try_make_thumbnail(image_bytes: bytes) -> Optional[tuple[bytes, int, int]]:
+    """Wie make_thumbnail, liefert aber None für nicht lesbare Bilddaten."""
+    try:
+        return make_thumbnail(image_bytes)
+    except Exception as e:
+        print(f"[expert_db] Kein Vorschaubild möglich: {e}")
+        return None
+
+
+def image_derivatives(img) -> tuple[tuple[bytes, int, int], int]:
+    """Vorschaubild und Perceptual Hash eines PIL-Bildes (z.B. direkt nach dem Rendern, ohne Dekodieren)."""
+    import phash
+    img = img.convert("RGB")
+    return _thumbnail(img), phash.image_hash(img)
+
+
+def _try_image_derivatives(image_bytes: bytes) -> tuple[Optional[tuple[bytes, int, int]], Optional[int]]:
+    """Vorschaubild und Perceptual Hash aus einem einzigen Dekodieren; (None, None) für nicht lesbare Daten."""
+    from PIL import Image
+    try:
+        return image_derivatives(Image.open(io.BytesIO(image_bytes)))
+    except Exception as e:
+        print(f"[expert_db] Kein Vorschaubild/Hash möglich: {e}")
+        return None, None
+
+
+_INSERT_THUMBNAIL = """INSERT OR REPLACE INTO thumbnails (evaluation_id, thumb_blob, width, height)
+                       VALUES (?, ?, ?, ?)"""
+
+
+@perf.timed("db.save_visualization")
+def save_visualization(
+    description: str,
+    params: Dict[str, Any],
+    image_bytes: bytes,
+    image_format: str = "png",
+    render_info: Optional[tuple] = None,
+    derivatives: Optional[tuple] = None,
+) -> int:
     """
     Speichert eine generierte Visualisierung in der Datenbank.
     
     Args:
         description: Die Weinbeschreibung
         params: Die extrahierten Visualisierungs-Parameter als Dict
-        image_bytes: Das Bild als PNG-Bytes
+        image_bytes: Das kodierte Bild
+        image_format: Format der Bytes (png, webp, avif, jpeg; siehe image_encoding)
+        render_info: (Renderer-Version, Fingerprint) aus imagegen.render_info, wenn das
+            Bild vom lokalen Renderer stammt (sonst None)
+        derivatives: Ergebnis von image_derivatives, falls schon vorhanden; sonst
+            wird das Bild dekodiert – im Write-Behind-Modus erst im Writer-Thread
         
+    Returns:
+        Die ID des neuen Eintrags (im Write-Behind-Modus bereits vor dem Commit)
+    """
+    import json
+    if DURABILITY == "sync":
+        conn = _connect()
+        with conn:
+            new_id = insert_visualization(conn, description, params, image_bytes, image_format,
+                                          derivatives=derivatives, render_info=render_info)
+        conn.close()
+        _notify("save", new_id)
+        return new_id
+    
+    thumbnail, image_hash = derivatives or (None, None)
+    values = (datetime.now().isoformat(), description, json.dumps(params, ensure_ascii=False),
+              image_bytes, image_format, image_hash) + (render_info or (None, None))
+    new_id = _writer.allocate_id()
+    _writer.submit(
+        """INSERT INTO evaluations (id, created_at, wine_description, viz_params, image_blob, image_format, phash,
+                                    renderer_version, render_fingerprint)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (new_id,) + values,
+        evaluation_id=new_id,
+        event=None if thumbnail or not derivatives else "save"
+    )
+    if thumbnail:
+        _writer.submit(_INSERT_THUMBNAIL, (new_id,) + thumbnail, evaluation_id=new_id, event="save")
+    elif not derivatives:
+        _writer.submit(_store_derivatives, (new_id, image_bytes), evaluation_id=new_id, event="save")
+    return new_id
+
+
+def _store_derivatives(conn: sqlite3.Connection, evaluation_id: int, image_bytes: bytes):
+    """Writer-Thread: Vorschaubild und Hash eines eben eingereihten Eintrags nachtragen."""
+    thumbnail, image_hash = _try_image_derivatives(image_bytes)
+    if image_hash is not None:
+        conn.execute("UPDATE evaluations SET phash = ? WHERE id = ?", (image_hash, evaluation_id))
+    if thumbnail:
+        conn.execute(_INSERT_THUMBNAIL, (evaluation_id,) + thumbnail)
+
+
+def insert_visualization(
+    conn: sqlite3.Connection,
+    description: str,
+    params: Dict[str, Any],
+    image_bytes: bytes,
+    image_format: str = "png",
+    derivatives: Optional[tuple] = None,
+    render_info: Optional[tuple] = None,
+) -> int:
+    """
+    Legt eine Visualisierung samt Vorschaubild und Hash in einer offenen Transaktion an.
+    
+    Für Schreibzugriffe am Writer vorbei (siehe write_transaction); committet nicht
+    und meldet nichts an die Listener. ``derivatives`` ist das Ergebnis von
+    image_derivatives, falls schon vorhanden (sonst wird das Bild hier dekodiert);
+    ``render_info`` wie bei save_visualization.
+    
     Returns:
         Die ID des neuen Eintrags
     """
     import json
-    conn = sqlite3.connect(DB_PATH)
+    thumbnail, image_hash = derivatives or _try_image_derivatives(image_bytes)
     cursor = conn.execute(
-        """INSERT INTO evaluations (created_at, wine_description, viz_params, image_blob)
-           VALUES (?, ?, ?, ?)""",
-        (datetime.now().isoformat(), description, json.dumps(params, ensure_ascii=False), image_bytes)
+        """INSERT INTO evaluations (created_at, wine_description, viz_params, image_blob, image_format, phash,
+                                    renderer_version, render_fingerprint)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        (datetime.now().isoformat(), description, json.dumps(params, ensure_ascii=False),
+         image_bytes, image_format, image_hash) + (render_info or (None, None))
     )
-    new_id = cursor.lastrowid
-    conn.commit()
+    if thumbnail:
+        conn.execute(_INSERT_THUMBNAIL, (cursor.lastrowid,) + thumbnail)
+    return cursor.lastrowid
+
+
+def replace_image(conn: sqlite3.Connection, evaluation_id: int, image_bytes: bytes, image_format: str,
+                  derivatives: Optional[tuple] = None, render_info: Optional[tuple] = None) -> bool:
+    """
+    Ersetzt das Bild eines Eintrags (inkl. Vorschaubild, Hash und Renderer-Version) in einer offenen Transaktion.
+    
+    Returns:
+        False, falls der Eintrag nicht (mehr) existiert
+    """
+    thumbnail, image_hash = derivatives or _try_image_derivatives(image_bytes)
+    cursor = conn.execute(
+        """UPDATE evaluations SET image_blob = ?, image_format = ?, phash = ?,
+                  renderer_version = ?, render_fingerprint = ? WHERE id = ?""",
+        (image_bytes, image_format, image_hash) + (render_info or (None, None)) + (evaluation_id,)
+    )
+    if cursor.rowcount == 0:
+        return False
+    if thumbnail:
+        conn.execute(_INSERT_THUMBNAIL, (evaluation_id,) + thumbnail)
+    return True
+
+
+def set_render_info(conn: sqlite3.Connection, evaluation_id: int, render_info: tuple):
+    """Vermerkt (Renderer-Version, Fingerprint) für ein unverändertes Bild in einer offenen Transaktion."""
+    conn.execute(
+        "UPDATE evaluations SET renderer_version = ?, render_fingerprint = ? WHERE id = ?",
+        tuple(render_info) + (evaluation_id,)
+    )
+
+
+@contextmanager
+def write_transaction(event: Optional[str] = "import") -> Iterator[sqlite3.Connection]:
+    """
+    Eigene Transaktion am Write-Behind-Writer vorbei (z.B. für job_queue).
+    
+    Ausstehende Schreibzugriffe werden vorher committet. Neue Einträge erhalten
+    ihre ID von SQLite (AUTOINCREMENT), also nie eine vom Writer reservierte.
+    Bei einer Exception wird zurückgerollt,
+    sonst nach dem Commit ``event`` (ohne ID) an die Listener gemeldet.
+    """
+    _writer.flush()
+    conn = _connect()
+    conn.execute("PRAGMA busy_timeout = 30000")
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+    if event is not None:
+        _notify(event, None)
+
+
+def find_exact_duplicate(description: str, image_bytes: bytes, image_hash: int) -> Optional[int]:
+    """ID eines bereits committeten Eintrags mit gleicher Beschreibung und byte-gleichem Bild (sonst None)."""
+    conn = _connect()
+    row = conn.execute(
+        """SELECT id FROM evaluations
+           WHERE phash = ? AND wine_description = ? AND image_blob = ?
+           ORDER BY id LIMIT 1""",
+        (image_hash, description, image_bytes)
+    ).fetchone()
     conn.close()
-    return new_id
+    return row[0] if row else None
 
 
+@perf.timed("db.save_rating")
 def save_rating(evaluation_id: int, rating: int, comment: Optional[str] = None):
     """
     Speichert eine Bewertung für eine bestehende Visualisierung.
@@ -63,21 +747,22 @@ def save_rating(evaluation_id: int, rating: int, comment: Optional[str] = None):
         rating: Bewertung 1-5 Sterne
         comment: Optionaler Kommentar
     """
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute(
+    if not 1 <= rating <= 5:
+        raise ValueError(f"Bewertung muss zwischen 1 und 5 liegen: {rating}")
+    _write(
         """UPDATE evaluations 
            SET rating = ?, comment = ?, evaluated_at = ?
            WHERE id = ?""",
-        (rating, comment, datetime.now().isoformat(), evaluation_id)
+        (rating, comment, datetime.now().isoformat(), evaluation_id),
+        evaluation_id,
+        "rating"
     )
-    conn.commit()
-    conn.close()
 
 
 def get_all_evaluations() -> List[Dict[str, Any]]:
     """Gibt alle Bewertungen zurück (ohne Bild-Blobs für Performance)."""
     import json
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     conn.row_factory = sqlite3.Row
     rows = conn.execute(
         """SELECT id, created_at, wine_description, viz_params, rating, comment, evaluated_at
@@ -99,10 +784,12 @@ def get_all_evaluations() -> List[Dict[str, Any]]:
     return result
 
 
+@perf.timed("db.get_evaluation")
 def get_evaluation_with_image(evaluation_id: int) -> Optional[Dict[str, Any]]:
     """Gibt eine einzelne Bewertung inkl. Bild zurück."""
     import json
-    conn = sqlite3.connect(DB_PATH)
+    _writer.wait_for(evaluation_id)
+    conn = _connect()
     conn.row_factory = sqlite3.Row
     row = conn.execute(
         """SELECT * FROM evaluations WHERE id = ?""",
@@ -119,15 +806,332 @@ def get_evaluation_with_image(evaluation_id: int) -> Optional[Dict[str, Any]]:
         "wine_description": row["wine_description"],
         "viz_params": json.loads(row["viz_params"]),
         "image_blob": row["image_blob"],
+        "image_format": row["image_format"],
         "rating": row["rating"],
         "comment": row["comment"],
         "evaluated_at": row["evaluated_at"],
     }
 
 
+def evaluation_exists(evaluation_id: int) -> bool:
+    """Prüft, ob ein Eintrag existiert (ohne das Bild zu laden)."""
+    _writer.wait_for(evaluation_id)
+    conn = _connect()
+    row = conn.execute("SELECT 1 FROM evaluations WHERE id = ?", (evaluation_id,)).fetchone()
+    conn.close()
+    return row is not None
+
+
+def _fts_query(query: str) -> str:
+    """Wandelt Freitext in eine FTS5-Abfrage um (alle Wörter als Präfix, UND-verknüpft)."""
+    import re
+    terms = re.findall(r"\w+", query.lower())
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+@perf.timed("db.search")
+def search_evaluations(query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+    """
+    Volltextsuche über Weinbeschreibungen und Kommentare.
+    
+    Treffer werden nach Relevanz (BM25) sortiert; Treffer in der Beschreibung
+    zählen stärker als im Kommentar.
+    
+    Args:
+        query: Suchbegriffe (z.B. "riesling schiefer"), Wortanfänge genügen
+        limit: Maximale Anzahl Treffer (Seitengröße)
+        offset: Anzahl zu überspringender Treffer (für Pagination)
+        
+    Returns:
+        Liste von Dicts wie bei get_all_evaluations, zusätzlich mit "snippet"
+    """
+    import json
+    match = _fts_query(query)
+    if not match:
+        return []
+    
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(
+        """SELECT e.id, e.created_at, e.wine_description, e.viz_params, e.rating,
+                  e.comment, e.evaluated_at,
+                  snippet(evaluations_fts, -1, '**', '**', ' … ', 16) AS snippet
+           FROM evaluations_fts
+           JOIN evaluations e ON e.id = evaluations_fts.rowid
+           WHERE evaluations_fts MATCH ?
+           ORDER BY bm25(evaluations_fts, 1.0, 0.5)
+           LIMIT ? OFFSET ?""",
+        (match, limit, offset)
+    ).fetchall()
+    conn.close()
+    
+    return [
+        {
+            "id": row["id"],
+            "created_at": row["created_at"],
+            "wine_description": row["wine_description"],
+            "viz_params": json.loads(row["viz_params"]),
+            "rating": row["rating"],
+            "comment": row["comment"],
+            "evaluated_at": row["evaluated_at"],
+            "snippet": row["snippet"],
+        }
+        for row in rows
+    ]
+
+
+def count_search_results(query: str) -> int:
+    """Gibt die Gesamtzahl der Treffer einer Volltextsuche zurück."""
+    match = _fts_query(query)
+    if not match:
+        return 0
+    conn = _connect()
+    count = conn.execute(
+        "SELECT COUNT(*) FROM evaluations_fts WHERE evaluations_fts MATCH ?",
+        (match,)
+    ).fetchone()[0]
+    conn.close()
+    return count
+
+
+def get_thumbnails(limit: int = 200, offset: int = 0) -> List[Dict[str, Any]]:
+    """
+    Gibt Vorschaubilder für die Galerie zurück (eine Abfrage, ohne Original-Blobs).
+    
+    Args:
+        limit: Maximale Anzahl Einträge (Seitengröße)
+        offset: Anzahl zu überspringender Einträge
+        
+    Returns:
+        Liste von Dicts mit id, created_at, rating und thumb_blob (WebP),
+        sortiert wie get_all_evaluations
+    """
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(
+        """SELECT e.id, e.created_at, e.rating, t.thumb_blob, t.width, t.height
+           FROM evaluations e
+           JOIN thumbnails t ON t.evaluation_id = e.id
+           ORDER BY e.created_at DESC
+           LIMIT ? OFFSET ?""",
+        (limit, offset)
+    ).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def get_thumbnails_for(evaluation_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Gibt Vorschaubilder für bestimmte Einträge zurück (z.B. ähnliche Weine).
+    
+    Returns:
+        Dict ID → Dict mit id, rating und thumb_blob (WebP); Einträge ohne
+        Vorschaubild fehlen
+    """
+    if not evaluation_ids:
+        return {}
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(
+        f"""SELECT e.id, e.rating, t.thumb_blob, t.width, t.height
+            FROM evaluations e
+            JOIN thumbnails t ON t.evaluation_id = e.id
+            WHERE e.id IN ({", ".join("?" * len(evaluation_ids))})""",
+        list(evaluation_ids)
+    ).fetchall()
+    conn.close()
+    return {row["id"]: dict(row) for row in rows}
+
+
+def count_missing_thumbnails() -> int:
+    """Gibt die Anzahl der Einträge ohne Vorschaubild zurück."""
+    conn = _connect()
+    count = conn.execute(
+        """SELECT COUNT(*) FROM evaluations e
+           LEFT JOIN thumbnails t ON t.evaluation_id = e.id
+           WHERE t.evaluation_id IS NULL"""
+    ).fetchone()[0]
+    conn.close()
+    return count
+
+
+def backfill_thumbnails(batch_size: int = 100) -> int:
+    """
+    Erzeugt fehlende Vorschaubilder (z.B. für importierte oder alte Einträge).
+    
+    Returns:
+        Anzahl neu erzeugter Vorschaubilder
+    """
+    _writer.flush()
+    total = 0
+    last_id = 0
+    while True:
+        conn = _connect()
+        rows = conn.execute(
+            """SELECT e.id, e.image_blob FROM evaluations e
+               LEFT JOIN thumbnails t ON t.evaluation_id = e.id
+               WHERE t.evaluation_id IS NULL AND e.id > ?
+               ORDER BY e.id LIMIT ?""",
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            conn.close()
+            return total
+        values = []
+        for evaluation_id, blob in rows:
+            thumbnail = _try_make_thumbnail(blob)
+            if thumbnail:
+                values.append((evaluation_id,) + thumbnail)
+        with conn:
+            conn.executemany(_INSERT_THUMBNAIL, values)
+        conn.close()
+        total += len(values)
+        last_id = rows[-1][0]
+        _notify("thumbnails", None)
+
+
+def find_similar_images(
+    image_hash: int,
+    max_distance: Optional[int] = None,
+    rated_only: bool = False,
+    exclude_id: Optional[int] = None,
+    limit: int = 20,
+) -> List[Dict[str, Any]]:
+    """
+    Sucht Einträge, deren Perceptual Hash höchstens ``max_distance`` Bit abweicht.
+    
+    Bis phash.CHUNKS - 1 Bit Abstand reicht eine OR-Abfrage über die
+    Teil-Indizes (jeder Treffer stimmt in mindestens einem Teil überein),
+    danach wird der genaue Hamming-Abstand geprüft. Größere Abstände
+    durchsuchen alle Hashes.
+    
+    Returns:
+        Liste von Dicts mit id, distance, rating und comment, nächste zuerst
+    """
+    import phash
+    if max_distance is None:
+        max_distance = phash.MAX_DISTANCE
+    where = "phash IS NOT NULL"
+    params: list = []
+    if max_distance < phash.CHUNKS:
+        where = " OR ".join(f"{phash.chunk_expression(i)} = ?" for i in range(phash.CHUNKS))
+        params = phash.chunks(image_hash)
+    if rated_only:
+        where = f"({where}) AND rating IS NOT NULL"
+    conn = _connect()
+    rows = conn.execute(
+        f"SELECT id, phash, rating, comment FROM evaluations WHERE {where}", params
+    ).fetchall()
+    conn.close()
+    
+    matches = []
+    for evaluation_id, other, rating, comment in rows:
+        distance = phash.hamming(image_hash, other)
+        if distance <= max_distance and evaluation_id != exclude_id:
+            matches.append({"id": evaluation_id, "distance": distance, "rating": rating, "comment": comment})
+    matches.sort(key=lambda m: (m["distance"], -m["id"]))
+    return matches[:limit]
+
+
+def find_duplicates_of(evaluation_id: int, max_distance: Optional[int] = None,
+                       rated_only: bool = True) -> List[Dict[str, Any]]:
+    """Beinahe-Duplikate eines gespeicherten Eintrags (leer, falls er keinen Hash hat)."""
+    _writer.wait_for(evaluation_id)
+    conn = _connect()
+    row = conn.execute("SELECT phash FROM evaluations WHERE id = ?", (evaluation_id,)).fetchone()
+    conn.close()
+    if row is None or row[0] is None:
+        return []
+    return find_similar_images(row[0], max_distance, rated_only=rated_only, exclude_id=evaluation_id)
+
+
+def get_phashes() -> Dict[int, int]:
+    """Alle vorhandenen Perceptual Hashes (ID → Hash), z.B. zum Gruppieren von Duplikaten."""
+    conn = _connect()
+    rows = conn.execute("SELECT id, phash FROM evaluations WHERE phash IS NOT NULL").fetchall()
+    conn.close()
+    return dict(rows)
+
+
+def count_missing_phashes() -> int:
+    """Gibt die Anzahl der Einträge ohne Perceptual Hash zurück."""
+    conn = _connect()
+    count = conn.execute("SELECT COUNT(*) FROM evaluations WHERE phash IS NULL").fetchone()[0]
+    conn.close()
+    return count
+
+
+def backfill_phashes(batch_size: int = 200) -> int:
+    """
+    Berechnet fehlende Perceptual Hashes (importierte oder ältere Einträge).
+    
+    Returns:
+        Anzahl neu berechneter Hashes
+    """
+    import phash
+    _writer.flush()
+    total = 0
+    last_id = 0
+    while True:
+        conn = _connect()
+        rows = conn.execute(
+            """SELECT id, image_blob FROM evaluations
+               WHERE phash IS NULL AND id > ? ORDER BY id LIMIT ?""",
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            conn.close()
+            return total
+        values = []
+        for evaluation_id, blob in rows:
+            try:
+                values.append((phash.hash_bytes(blob), evaluation_id))
+            except Exception as e:
+                print(f"[expert_db] Kein Hash für ID {evaluation_id}: {e}")
+        with conn:
+            conn.executemany("UPDATE evaluations SET phash = ? WHERE id = ?", values)
+        conn.close()
+        total += len(values)
+        last_id = rows[-1][0]
+        _notify("phashes", None)
+
+
+def get_viz_params(evaluation_ids: List[int]) -> List[Dict[str, Any]]:
+    """
+    Gibt Parameter und Bewertung für die angegebenen IDs zurück (ohne Texte und Bilder).
+    
+    Nicht (mehr) vorhandene IDs fehlen im Ergebnis.
+    """
+    import json
+    if not evaluation_ids:
+        return []
+    conn = _connect()
+    rows = conn.execute(
+        f"""SELECT id, viz_params, rating FROM evaluations
+            WHERE id IN ({", ".join("?" * len(evaluation_ids))})""",
+        list(evaluation_ids)
+    ).fetchall()
+    conn.close()
+    return [
+        {"id": evaluation_id, "viz_params": json.loads(params), "rating": rating}
+        for evaluation_id, params, rating in rows
+    ]
+
+
+def get_unevaluated_ids(limit: Optional[int] = None) -> List[int]:
+    """Gibt die IDs aller unbewerteten Visualisierungen in Erstellungsreihenfolge zurück."""
+    conn = _connect()
+    rows = conn.execute(
+        "SELECT id FROM evaluations WHERE rating IS NULL ORDER BY id LIMIT ?",
+        (limit if limit is not None else -1,)
+    ).fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+
 def get_unevaluated_count() -> int:
     """Gibt die Anzahl der noch nicht bewerteten Visualisierungen zurück."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     count = conn.execute(
         "SELECT COUNT(*) FROM evaluations WHERE rating IS NULL"
     ).fetchone()[0]
@@ -135,9 +1139,10 @@ def get_unevaluated_count() -> int:
     return count
 
 
+@perf.timed("db.statistics")
 def get_statistics() -> Dict[str, Any]:
     """Gibt Statistiken über alle Bewertungen zurück."""
-    conn = sqlite3.connect(DB_PATH)
+    conn = _connect()
     
     total = conn.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
     evaluated = conn.execute("SELECT COUNT(*) FROM evaluations WHERE rating IS NOT NULL").fetchone()[0]
@@ -159,13 +1164,220 @@ def get_statistics() -> Dict[str, Any]:
     }
 
 
-def delete_evaluation(evaluation_id: int):
-    """Löscht eine Bewertung."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("DELETE FROM evaluations WHERE id = ?", (evaluation_id,))
-    conn.commit()
+def _archive_filter(min_rating: Optional[int], up_to_id: Optional[int]) -> tuple[str, tuple]:
+    where, params = "", ()
+    if min_rating is not None:
+        where += " AND rating >= ?"
+        params += (min_rating,)
+    if up_to_id is not None:
+        where += " AND id <= ?"
+        params += (up_to_id,)
+    return where, params
+
+
+def count_evaluations(min_rating: Optional[int] = None, up_to_id: Optional[int] = None) -> tuple[int, int]:
+    """
+    Anzahl der Einträge mit denselben Filtern wie iter_evaluations.
+    
+    Returns:
+        (Anzahl, höchste ID) – die ID als ``up_to_id`` an iter_evaluations
+        übergeben, damit später gespeicherte Einträge nicht mitgezählt werden
+    """
+    flush_writes()
+    where, params = _archive_filter(min_rating, up_to_id)
+    conn = _connect()
+    count, max_id = conn.execute(
+        f"SELECT COUNT(*), COALESCE(MAX(id), 0) FROM evaluations WHERE 1{where}", params
+    ).fetchone()
     conn.close()
+    return count, max_id
 
 
-# Initialisiere DB beim Import
-init_db()
+def iter_evaluations(
+    batch_size: int = 500,
+    after_id: int = 0,
+    include_images: bool = False,
+    min_rating: Optional[int] = None,
+    up_to_id: Optional[int] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Liefert alle Bewertungen seitenweise in aufsteigender ID-Reihenfolge.
+    
+    Nutzt Keyset-Pagination (``WHERE id > ?``), damit der Speicherbedarf
+    unabhängig von der Datenbankgröße konstant bleibt.
+    
+    Args:
+        batch_size: Anzahl Zeilen pro Seite
+        after_id: Nur Einträge mit größerer ID liefern (zum Fortsetzen)
+        include_images: Bild-Blobs mitliefern
+        min_rating: Nur Einträge mit mindestens dieser Bewertung
+        up_to_id: Nur Einträge bis zu dieser ID (fester Stand, siehe count_evaluations)
+        
+    Yields:
+        Listen von Dicts im Format von get_all_evaluations (optional mit image_blob und image_format)
+    """
+    import json
+    columns = "id, created_at, wine_description, viz_params, rating, comment, evaluated_at"
+    if include_images:
+        columns += ", image_blob, image_format"
+    
+    where, params = _archive_filter(min_rating, up_to_id)
+    
+    last_id = after_id
+    while True:
+        conn = _connect()
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            f"SELECT {columns} FROM evaluations WHERE id > ?{where} ORDER BY id LIMIT ?",
+            (last_id, *params, batch_size)
+        ).fetchall()
+        conn.close()
+        
+        if not rows:
+            return
+        
+        batch = []
+        for row in rows:
+            item = {
+                "id": row["id"],
+                "created_at": row["created_at"],
+                "wine_description": row["wine_description"],
+                "viz_params": json.loads(row["viz_params"]),
+                "rating": row["rating"],
+                "comment": row["comment"],
+                "evaluated_at": row["evaluated_at"],
+            }
+            if include_images:
+                item["image_blob"] = row["image_blob"]
+                item["image_format"] = row["image_format"]
+            batch.append(item)
+        
+        last_id = rows[-1]["id"]
+        yield batch
+
+
+def iter_render_info(batch_size: int = 1000, up_to_id: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Parameter und gespeicherte Renderer-Version aller Einträge, seitenweise (ohne Bilder).
+
+    Yields:
+        Listen von Dicts mit id, viz_params, renderer_version, render_fingerprint
+    """
+    import json
+    flush_writes()
+    where, params = _archive_filter(None, up_to_id)
+    last_id = 0
+    while True:
+        conn = _connect()
+        rows = conn.execute(
+            f"""SELECT id, viz_params, renderer_version, render_fingerprint FROM evaluations
+                WHERE id > ?{where} ORDER BY id LIMIT ?""",
+            (last_id, *params, batch_size)
+        ).fetchall()
+        conn.close()
+        if not rows:
+            return
+        yield [{"id": row[0], "viz_params": json.loads(row[1]), "renderer_version": row[2],
+                "render_fingerprint": row[3]} for row in rows]
+        last_id = rows[-1][0]
+
+
+def get_images(evaluation_ids: List[int]) -> Dict[int, tuple[bytes, str]]:
+    """Bild-Blobs und Formate für einige IDs (fehlende IDs fehlen im Ergebnis)."""
+    if not evaluation_ids:
+        return {}
+    conn = _connect()
+    rows = conn.execute(
+        f"""SELECT id, image_blob, image_format FROM evaluations
+            WHERE id IN ({", ".join("?" * len(evaluation_ids))})""",
+        list(evaluation_ids)
+    ).fetchall()
+    conn.close()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+
+def import_evaluations(
+    rows: Iterable[Dict[str, Any]],
+    source: Optional[str] = None,
+    position: Optional[int] = None,
+) -> int:
+    """
+    Importiert mehrere Bewertungen in einer einzigen Transaktion.
+    
+    Die Einträge erhalten neue IDs, Perceptual Hash und Vorschaubild werden
+    (aus einem Dekodieren) gleich mit gespeichert. Wird ``source`` angegeben,
+    wird der Import-Fortschritt in derselben Transaktion gespeichert, sodass
+    ein abgebrochener Import ohne Duplikate fortgesetzt werden kann.
+    
+    Args:
+        rows: Dicts mit wine_description, viz_params und image_blob
+              (created_at, image_format, rating, comment, evaluated_at optional;
+              fehlt image_format, wird es aus den Bytes erkannt; render_info
+              wie bei save_visualization nur für hier neu gerenderte Bilder)
+        source: Kennung der Import-Quelle (z.B. Dateipfad)
+        position: Neuer Fortschritt für ``source`` nach diesem Batch
+        
+    Returns:
+        Anzahl der importierten Einträge
+    """
+    import json
+    from image_encoding import sniff_format
+    _writer.flush()
+    values = []
+    for row in rows:
+        params = row["viz_params"]
+        if not isinstance(params, str):
+            params = json.dumps(params, ensure_ascii=False)
+        thumbnail, image_hash = _try_image_derivatives(row["image_blob"])
+        values.append(((
+            row.get("created_at") or datetime.now().isoformat(),
+            row["wine_description"],
+            params,
+            row["image_blob"],
+            row.get("image_format") or sniff_format(row["image_blob"]),
+            image_hash,
+        ) + tuple(row.get("render_info") or (None, None)) + (
+            row.get("rating"),
+            row.get("comment"),
+            row.get("evaluated_at"),
+        ), thumbnail))
+    
+    conn = _connect()
+    conn.execute("PRAGMA busy_timeout = 30000")
+    with conn:
+        for value, thumbnail in values:
+            cursor = conn.execute(
+                """INSERT INTO evaluations
+                   (created_at, wine_description, viz_params, image_blob, image_format, phash,
+                    renderer_version, render_fingerprint, rating, comment, evaluated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                value
+            )
+            if thumbnail:
+                conn.execute(_INSERT_THUMBNAIL, (cursor.lastrowid,) + thumbnail)
+        if source is not None and position is not None:
+            conn.execute(
+                """INSERT INTO transfer_progress (source, position, updated_at)
+                   VALUES (?, ?, ?)
+                   ON CONFLICT(source) DO UPDATE SET
+                       position = excluded.position, updated_at = excluded.updated_at""",
+                (source, position, datetime.now().isoformat())
+            )
+    conn.close()
+    _notify("import", None)
+    return len(values)
+
+
+def get_transfer_progress(source: str) -> int:
+    """Gibt den gespeicherten Import-Fortschritt einer Quelle zurück (0 falls unbekannt)."""
+    conn = _connect()
+    row = conn.execute(
+        "SELECT position FROM transfer_progress WHERE source = ?", (source,)
+    ).fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+
+def delete_evaluation(evaluation_id: int):
+    """Löscht eine Bewertung."""
+    _write("DELETE FROM evaluations WHERE id = ?", (evaluation_id,), evaluation_id, "delete")
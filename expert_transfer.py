@@ -0,0 +1,321 @@
+"""
+Streaming Export/Import der Experten-Bewertungen (JSONL oder Parquet).
+
+Export schreibt die Datenbank in nummerierte Chunk-Dateien plus ``manifest.json``,
+Import liest sie batchweise zurück. Beide Richtungen arbeiten mit konstantem
+Speicherbedarf und lassen sich nach einem Abbruch fortsetzen.
+
+Verwendung:
+    python expert_transfer.py export export_dir --format parquet --with-images
+    python expert_transfer.py import export_dir
+"""
+import argparse
+import base64
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import expert_db as db
+
+
+MANIFEST_NAME = "manifest.json"
+FORMATS = ("jsonl", "parquet")
+
+# Zeilen pro Datenbankabfrage bzw. Import-Transaktion / Zeilen pro Chunk-Datei
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_CHUNK_SIZE = 10_000
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError(
+            "Parquet benötigt pyarrow: pip install pyarrow"
+        ) from e
+    return pyarrow
+
+
+def _parquet_schema(with_images: bool):
+    pa = _require_pyarrow()
+    fields = [
+        ("id", pa.int64()),
+        ("created_at", pa.string()),
+        ("wine_description", pa.string()),
+        ("viz_params", pa.string()),
+        ("rating", pa.int64()),
+        ("comment", pa.string()),
+        ("evaluated_at", pa.string()),
+    ]
+    if with_images:
+        fields.append(("image_blob", pa.binary()))
+        fields.append(("image_format", pa.string()))
+    return pa.schema(fields)
+
+
+def _load_manifest(out_dir: Path) -> Dict[str, Any]:
+    path = out_dir / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _write_manifest(out_dir: Path, manifest: Dict[str, Any]):
+    # Atomar ersetzen, damit ein Abbruch nie ein halbes Manifest hinterlässt
+    tmp = out_dir / (MANIFEST_NAME + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, out_dir / MANIFEST_NAME)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Export
+# ─────────────────────────────────────────────────────────────────────────────
+
+class _ChunkWriter:
+    """Schreibt einen Chunk zeilen- bzw. batchweise in eine temporäre Datei."""
+
+    def __init__(self, path: Path, fmt: str, with_images: bool):
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        self.fmt = fmt
+        self.with_images = with_images
+        self.rows = 0
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            self._schema = _parquet_schema(with_images)
+            self._writer = pq.ParquetWriter(str(self.tmp_path), self._schema, compression="zstd")
+        else:
+            self._file = open(self.tmp_path, "w", encoding="utf-8")
+
+    def write_batch(self, batch: List[Dict[str, Any]]):
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            columns = {
+                "id": [r["id"] for r in batch],
+                "created_at": [r["created_at"] for r in batch],
+                "wine_description": [r["wine_description"] for r in batch],
+                "viz_params": [json.dumps(r["viz_params"], ensure_ascii=False) for r in batch],
+                "rating": [r["rating"] for r in batch],
+                "comment": [r["comment"] for r in batch],
+                "evaluated_at": [r["evaluated_at"] for r in batch],
+            }
+            if self.with_images:
+                columns["image_blob"] = [r["image_blob"] for r in batch]
+                columns["image_format"] = [r["image_format"] for r in batch]
+            self._writer.write_table(pa.Table.from_pydict(columns, schema=self._schema))
+        else:
+            for r in batch:
+                record = {k: v for k, v in r.items() if k != "image_blob"}
+                if self.with_images:
+                    record["image_b64"] = base64.b64encode(r["image_blob"]).decode("ascii")
+                self._file.write(json.dumps(record, ensure_ascii=False))
+                self._file.write("\n")
+        self.rows += len(batch)
+
+    def close(self):
+        if self.fmt == "parquet":
+            self._writer.close()
+        else:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+
+def export_evaluations(
+    out_dir: str,
+    fmt: str = "jsonl",
+    with_images: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Dict[str, Any]:
+    """
+    Exportiert alle Bewertungen in Chunk-Dateien.
+
+    Fertige Chunks werden im Manifest vermerkt; ein erneuter Aufruf mit demselben
+    Verzeichnis setzt nach dem letzten vollständigen Chunk fort.
+
+    Args:
+        out_dir: Zielverzeichnis
+        fmt: "jsonl" oder "parquet"
+        with_images: Bild-Blobs mit exportieren
+        chunk_size: Maximale Zeilen pro Chunk-Datei
+        batch_size: Zeilen pro Datenbankabfrage
+
+    Returns:
+        Das Manifest (Format, Chunks, letzte exportierte ID)
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unbekanntes Format: {fmt}")
+    if fmt == "parquet":
+        _require_pyarrow()
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    manifest = _load_manifest(out)
+    if manifest and (manifest["format"] != fmt or manifest["with_images"] != with_images):
+        raise ValueError(
+            f"{out} enthält bereits einen Export mit anderen Einstellungen "
+            f"({manifest['format']}, with_images={manifest['with_images']})"
+        )
+    if not manifest:
+        manifest = {"format": fmt, "with_images": with_images, "last_id": 0, "chunks": []}
+
+    writer: Optional[_ChunkWriter] = None
+
+    def finish_chunk(last_id: int):
+        writer.close()
+        manifest["chunks"].append({"file": writer.path.name, "rows": writer.rows})
+        manifest["last_id"] = last_id
+        _write_manifest(out, manifest)
+
+    for batch in db.iter_evaluations(batch_size, manifest["last_id"], include_images=with_images):
+        # Batches an Chunk-Grenzen aufteilen
+        while batch:
+            if writer is None:
+                name = f"part-{len(manifest['chunks']):05d}.{fmt}"
+                writer = _ChunkWriter(out / name, fmt, with_images)
+            part, batch = batch[:chunk_size - writer.rows], batch[chunk_size - writer.rows:]
+            writer.write_batch(part)
+            if writer.rows >= chunk_size:
+                finish_chunk(part[-1]["id"])
+                writer = None
+            last_id = part[-1]["id"]
+
+    if writer is not None:
+        finish_chunk(last_id)
+
+    return manifest
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Import
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _iter_jsonl(path: Path, skip: int, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    seen = 0  # Datensätze, nicht Zeilen – die gespeicherte Position zählt Leerzeilen nicht mit
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            seen += 1
+            if seen <= skip:
+                continue
+            record = json.loads(line)
+            if "image_b64" in record:
+                record["image_blob"] = base64.b64decode(record.pop("image_b64"))
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _iter_parquet(path: Path, skip: int, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    _require_pyarrow()
+    import pyarrow.parquet as pq
+    pf = pq.ParquetFile(str(path))
+    seen = 0
+    for record_batch in pf.iter_batches(batch_size=batch_size):
+        n = record_batch.num_rows
+        if seen + n <= skip:
+            seen += n
+            continue
+        rows = record_batch.to_pylist()[max(0, skip - seen):]
+        seen += n
+        for row in rows:
+            row["viz_params"] = json.loads(row["viz_params"])
+        yield rows
+
+
+def _render_missing_images(batch: List[Dict[str, Any]]):
+    """Rendert Bilder für Einträge, die ohne Bild exportiert wurden (mit Renderer-Version)."""
+    missing = [r for r in batch if not r.get("image_blob")]
+    if not missing:
+        return
+    from image_encoding import IMAGE_FORMAT
+    from imagegen import generate_wine_image_bytes, render_info
+    for r in missing:
+        r["image_blob"] = generate_wine_image_bytes(r["viz_params"], size=350, fmt=IMAGE_FORMAT)
+        r["image_format"] = IMAGE_FORMAT
+        r["render_info"] = render_info(r["viz_params"], 350)
+
+
+def _chunk_files(in_path: Path) -> List[Path]:
+    if in_path.is_file():
+        return [in_path]
+    manifest = _load_manifest(in_path)
+    if manifest:
+        return [in_path / c["file"] for c in manifest["chunks"]]
+    files = sorted(in_path.glob("part-*.jsonl")) + sorted(in_path.glob("part-*.parquet"))
+    return files
+
+
+def import_evaluations(in_path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Importiert einen Export (Verzeichnis oder einzelne Chunk-Datei).
+
+    Der Fortschritt pro Chunk wird in derselben Transaktion wie die Daten
+    gespeichert. Ein abgebrochener Import kann daher einfach erneut
+    gestartet werden, ohne Einträge doppelt anzulegen.
+    Einträge ohne Bild werden beim Import neu gerendert. Vorschaubild und
+    Perceptual Hash entstehen beim Import; was dabei nicht lesbar war, wird
+    anschließend noch einmal versucht.
+
+    Args:
+        in_path: Export-Verzeichnis oder Chunk-Datei
+        batch_size: Zeilen pro Transaktion
+
+    Returns:
+        Anzahl neu importierter Einträge
+    """
+    total = 0
+    for path in _chunk_files(Path(in_path)):
+        source = str(path.resolve())
+        position = db.get_transfer_progress(source)
+        reader = _iter_parquet if path.suffix == ".parquet" else _iter_jsonl
+        for batch in reader(path, position, batch_size):
+            _render_missing_images(batch)
+            position += len(batch)
+            total += db.import_evaluations(batch, source=source, position=position)
+    if total:
+        db.backfill_thumbnails()
+        db.backfill_phashes()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export/Import der Experten-Bewertungen")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_export = sub.add_parser("export", help="Datenbank in Chunk-Dateien exportieren")
+    p_export.add_argument("out_dir")
+    p_export.add_argument("--format", choices=FORMATS, default="jsonl")
+    p_export.add_argument("--with-images", action="store_true")
+    p_export.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    p_export.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    p_import = sub.add_parser("import", help="Export in die Datenbank importieren")
+    p_import.add_argument("in_path")
+    p_import.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        manifest = export_evaluations(
+            args.out_dir, args.format, args.with_images, args.chunk_size, args.batch_size
+        )
+        rows = sum(c["rows"] for c in manifest["chunks"])
+        print(f"[export] {rows} Einträge in {len(manifest['chunks'])} Chunks → {args.out_dir}")
+    else:
+        count = import_evaluations(args.in_path, args.batch_size)
+        print(f"[import] {count} Einträge importiert")
+
+
+if __name__ == "__main__":
+    main()
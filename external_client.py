@@ -0,0 +1,452 @@
+"""
+HTTP-Client für die externe Bildgenerierung (Cloud Function).
+
+- persistente Keep-Alive-Verbindungen (Pool pro Host)
+- getrennte Connect-/Read-Timeouts und optionale Gesamt-Deadline
+- Retries mit exponentiellem Backoff (nur bei Netzwerkfehlern, 429 und 5xx)
+- Circuit Breaker, damit eine ausgefallene API nicht jeden Klick ausbremst
+- Base64-Antwort wird beim Lesen blockweise dekodiert
+- synchroner Client und asyncio-Variante mit derselben Logik
+
+Zum Testen ohne Cloud Function: ``python external_stub.py`` starten und
+``WINE_EXTERNAL_API_URL=http://127.0.0.1:5001`` setzen.
+"""
+import asyncio
+import binascii
+import http.client
+import io
+import random
+import ssl
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+
+# Status-Codes, bei denen ein erneuter Versuch sinnvoll ist
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class ExternalAPIError(Exception):
+    """Die externe API hat mit einem Fehler geantwortet."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class CircuitOpenError(ExternalAPIError):
+    """Der Circuit Breaker ist offen – die API wird vorübergehend nicht aufgerufen."""
+
+
+class CircuitBreaker:
+    """
+    Einfacher Circuit Breaker (closed → open → half-open).
+
+    Nach ``failure_threshold`` aufeinanderfolgenden Fehlern werden Aufrufe für
+    ``reset_timeout`` Sekunden sofort abgelehnt. Danach darf ein Probe-Aufruf
+    durch; gelingt er, schließt sich der Breaker wieder. Endet der Probe ohne
+    Ergebnis (Abbruch, unerwarteter Fehler), gibt release_probe ihn frei.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def before_call(self) -> bool:
+        """Wirft CircuitOpenError oder gibt zurück, ob dieser Aufruf der Probe ist."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probe_in_flight:
+                raise CircuitOpenError("Externe API vorübergehend deaktiviert (Circuit Breaker offen)")
+            self._probe_in_flight = True
+            return True
+
+    def release_probe(self):
+        """Gibt den Probe frei, ohne den Zustand zu ändern (der nächste Aufruf probt erneut)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class Base64StreamDecoder:
+    """Dekodiert Base64 blockweise, ohne die komplette Antwort zu puffern."""
+
+    def __init__(self):
+        self._rest = b""
+        self.buffer = io.BytesIO()
+
+    def feed(self, chunk: bytes):
+        data = self._rest + chunk.translate(None, b" \t\r\n")
+        usable = len(data) - len(data) % 4
+        if usable:
+            self.buffer.write(binascii.a2b_base64(data[:usable]))
+        self._rest = data[usable:]
+
+    def finish(self) -> bytes:
+        if self._rest:
+            # Fehlendes Padding tolerieren
+            self.buffer.write(binascii.a2b_base64(self._rest + b"=" * (-len(self._rest) % 4)))
+            self._rest = b""
+        return self.buffer.getvalue()
+
+
+class _RetryPolicy:
+    """Gemeinsame Retry-/Backoff-Logik für den synchronen und den async Client."""
+
+    def __init__(self, max_retries: int, backoff_base: float, backoff_max: float):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def delay(self, attempt: int) -> float:
+        # "Full jitter": zufällige Wartezeit bis zur exponentiellen Obergrenze
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def should_retry(self, attempt: int, error: Exception, deadline: Optional[float]) -> Optional[float]:
+        """Gibt die Wartezeit vor dem nächsten Versuch zurück oder None."""
+        if attempt >= self.max_retries or isinstance(error, CircuitOpenError):
+            return None
+        if isinstance(error, ExternalAPIError) and error.status not in RETRYABLE_STATUS:
+            return None
+        delay = self.delay(attempt)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+
+class ExternalImageClient:
+    """
+    Synchroner Client mit Verbindungspool.
+
+    Args:
+        endpoint: Vollständige URL der Funktion (ohne Query-String)
+        connect_timeout: Timeout für den Verbindungsaufbau (Sekunden)
+        read_timeout: Timeout pro Lesevorgang (Sekunden)
+        max_retries: Zusätzliche Versuche nach dem ersten Fehlschlag
+        backoff_base / backoff_max: Exponentieller Backoff (Sekunden)
+        pool_size: Maximal vorgehaltene Leerlauf-Verbindungen
+        breaker: Optionaler gemeinsamer Circuit Breaker
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        pool_size: int = 4,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        parts = urlsplit(endpoint)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.path = parts.path or "/"
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.retry = _RetryPolicy(max_retries, backoff_base, backoff_max)
+        self.breaker = breaker or CircuitBreaker()
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    # ── Verbindungspool ─────────────────────────────────────────────────────
+
+    def _acquire(self) -> http.client.HTTPConnection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.connect_timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+
+    def _release(self, conn: http.client.HTTPConnection):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """Schließt alle Leerlauf-Verbindungen."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    # ── Requests ────────────────────────────────────────────────────────────
+
+    def _request_once(self, body: bytes, query: str, read_timeout: float) -> bytes:
+        conn = self._acquire()
+        try:
+            if conn.sock is None:
+                conn.connect()
+            conn.sock.settimeout(read_timeout)
+            conn.request("POST", f"{self.path}?{query}", body=body, headers={
+                "Content-Type": "text/plain; charset=utf-8",
+                "Connection": "keep-alive",
+            })
+            response = conn.getresponse()
+            if response.status != 200:
+                response.read()
+                raise ExternalAPIError(f"HTTP {response.status} {response.reason}", response.status)
+
+            decoder = Base64StreamDecoder()
+            while True:
+                chunk = response.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                decoder.feed(chunk)
+            image = decoder.finish()
+        except BaseException:
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        return image
+
+    def generate(self, desc: str, cookie: str, timeout: Optional[float] = None) -> bytes:
+        """
+        Fordert eine Visualisierung an.
+
+        Args:
+            desc: Weinbeschreibung
+            cookie: Zugangs-Cookie der API
+            timeout: Gesamt-Deadline inkl. Retries (Sekunden), None = nur Einzel-Timeouts
+
+        Returns:
+            Das dekodierte Bild als Bytes
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        body = desc.encode("utf-8")
+        query = "cookie=" + quote(cookie, safe="")
+        attempt = 0
+        while True:
+            probe = self.breaker.before_call()
+            read_timeout = self.read_timeout
+            if deadline is not None:
+                read_timeout = max(0.01, min(read_timeout, deadline - time.monotonic()))
+            try:
+                image = self._request_once(body, query, read_timeout)
+            except (OSError, http.client.HTTPException, ExternalAPIError, binascii.Error) as e:
+                if not isinstance(e, ExternalAPIError) or e.status in RETRYABLE_STATUS:
+                    self.breaker.record_failure()
+                else:
+                    # Andere Status (4xx): API erreichbar, nur die Anfrage abgelehnt
+                    self.breaker.record_success()
+                delay = self.retry.should_retry(attempt, e, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            finally:
+                if probe:
+                    # Auch bei Abbruch (z.B. CancelledError) nicht dauerhaft offen bleiben
+                    self.breaker.release_probe()
+            self.breaker.record_success()
+            return image
+
+
+class AsyncExternalImageClient:
+    """
+    asyncio-Variante von ExternalImageClient (gleiche Parameter).
+
+    Spricht HTTP/1.1 direkt über asyncio-Streams (Content-Length und chunked),
+    hält Keep-Alive-Verbindungen vor und nutzt dieselbe Retry-/Breaker-Logik.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        pool_size: int = 4,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        parts = urlsplit(endpoint)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.path = parts.path or "/"
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.retry = _RetryPolicy(max_retries, backoff_base, backoff_max)
+        self.breaker = breaker or CircuitBreaker()
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def _acquire(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+            writer.close()
+        ssl_ctx = ssl.create_default_context() if self.scheme == "https" else None
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_ctx),
+            self.connect_timeout,
+        )
+
+    def _release(self, stream: Tuple[asyncio.StreamReader, asyncio.StreamWriter]):
+        if len(self._idle) < self.pool_size:
+            self._idle.append(stream)
+        else:
+            stream[1].close()
+
+    async def close(self):
+        """Schließt alle Leerlauf-Verbindungen."""
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    @staticmethod
+    async def _read_headers(reader: asyncio.StreamReader) -> Tuple[int, str, Dict[str, str]]:
+        status_line = (await reader.readline()).decode("latin-1").strip()
+        if not status_line:
+            raise ConnectionError("Verbindung vom Server geschlossen")
+        _, status, *reason = status_line.split(" ", 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return int(status), (reason[0] if reason else ""), headers
+
+    @staticmethod
+    async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str], decoder: Optional[Base64StreamDecoder]):
+        def consume(chunk: bytes):
+            if decoder is not None:
+                decoder.feed(chunk)
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip(), 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                while size > 0:
+                    chunk = await reader.read(min(size, READ_CHUNK_SIZE))
+                    if not chunk:
+                        raise ConnectionError("Antwort unvollständig")
+                    consume(chunk)
+                    size -= len(chunk)
+                await reader.readline()
+        elif "content-length" in headers:
+            remaining = int(headers["content-length"])
+            while remaining > 0:
+                chunk = await reader.read(min(remaining, READ_CHUNK_SIZE))
+                if not chunk:
+                    raise ConnectionError("Antwort unvollständig")
+                consume(chunk)
+                remaining -= len(chunk)
+        else:
+            while True:
+                chunk = await reader.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                consume(chunk)
+
+    async def _request_once(self, body: bytes, query: str, read_timeout: float) -> bytes:
+        reader, writer = await self._acquire()
+        try:
+            request = (
+                f"POST {self.path}?{query} HTTP/1.1\r\n"
+                f"Host: {self.host}\r\n"
+                "Content-Type: text/plain; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: keep-alive\r\n\r\n"
+            ).encode("latin-1") + body
+            writer.write(request)
+            await writer.drain()
+
+            status, reason, headers = await asyncio.wait_for(self._read_headers(reader), read_timeout)
+            decoder = Base64StreamDecoder() if status == 200 else None
+            await asyncio.wait_for(self._read_body(reader, headers, decoder), read_timeout)
+            if status != 200:
+                raise ExternalAPIError(f"HTTP {status} {reason}", status)
+            image = decoder.finish()
+        except BaseException:
+            writer.close()
+            raise
+        if headers.get("connection", "").lower() == "close" or (
+            "content-length" not in headers and headers.get("transfer-encoding", "").lower() != "chunked"
+        ):
+            writer.close()
+        else:
+            self._release((reader, writer))
+        return image
+
+    async def generate(self, desc: str, cookie: str, timeout: Optional[float] = None) -> bytes:
+        """Async-Gegenstück zu ExternalImageClient.generate."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        body = desc.encode("utf-8")
+        query = "cookie=" + quote(cookie, safe="")
+        attempt = 0
+        while True:
+            probe = self.breaker.before_call()
+            read_timeout = self.read_timeout
+            if deadline is not None:
+                read_timeout = max(0.01, min(read_timeout, deadline - time.monotonic()))
+            try:
+                image = await self._request_once(body, query, read_timeout)
+            except (OSError, asyncio.TimeoutError, ExternalAPIError, binascii.Error, ValueError) as e:
+                if not isinstance(e, ExternalAPIError) or e.status in RETRYABLE_STATUS:
+                    self.breaker.record_failure()
+                else:
+                    # Andere Status (4xx): API erreichbar, nur die Anfrage abgelehnt
+                    self.breaker.record_success()
+                delay = self.retry.should_retry(attempt, e, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            finally:
+                if probe:
+                    # Auch bei Abbruch (z.B. CancelledError) nicht dauerhaft offen bleiben
+                    self.breaker.release_probe()
+            self.breaker.record_success()
+            return image
@@ -0,0 +1,197 @@
+"""
+Lokaler Stub der Cloud Function ``expertGenerateImage`` zum Testen von external_client.
+
+Antwortet auf POST /expertGenerateImage mit einem Base64-kodierten PNG, das
+lokal aus der Beschreibung gerendert wird. Verzögerung, Fehlerquote und
+chunked Encoding lassen sich einstellen, um Timeouts, Retries und den
+Circuit Breaker gezielt auszulösen.
+
+Verwendung:
+    python external_stub.py --port 5001 --delay 0.5 --fail-rate 0.2
+    WINE_EXTERNAL_API_URL=http://127.0.0.1:5001 streamlit run app.py
+    python external_stub.py --check-breaker    # Circuit Breaker gegen den Stub prüfen
+"""
+import argparse
+import base64
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-Alive
+
+    delay = 0.0
+    fail_rate = 0.0
+    chunked = False
+    size = 350
+    # Vorgegebene Status-Codes für die nächsten Requests (danach normal)
+    statuses: List[int] = []
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        desc = self.rfile.read(length).decode("utf-8")
+
+        if not self.path.startswith("/expertGenerateImage"):
+            self._send_plain(404, b"not found")
+            return
+        if self.delay:
+            time.sleep(self.delay)
+        if self.statuses:
+            status = self.statuses.pop(0)
+            if status != 200:
+                self._send_plain(status, b"stub status")
+                return
+        elif random.random() < self.fail_rate:
+            self._send_plain(503, b"stub failure")
+            return
+
+        from text_analyzer import analyze_wine_description
+        from imagegen import generate_wine_png_bytes
+        payload = base64.b64encode(generate_wine_png_bytes(analyze_wine_description(desc), size=self.size))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        if self.chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(0, len(payload), 8192):
+                part = payload[i:i + 8192]
+                self.wfile.write(f"{len(part):x}\r\n".encode() + part + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    def _send_plain(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            pass  # Client hat wegen Timeout abgebrochen
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host: str = "127.0.0.1", port: int = 5001, delay: float = 0.0,
+                fail_rate: float = 0.0, chunked: bool = False,
+                statuses: Optional[List[int]] = None) -> ThreadingHTTPServer:
+    """
+    Erzeugt einen Stub-Server (z.B. für Tests in einem Hintergrund-Thread).
+
+    ``statuses`` gibt die Antworten der ersten Requests vor; die Liste bleibt
+    über ``server.RequestHandlerClass.statuses`` veränderbar.
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "delay": delay, "fail_rate": fail_rate, "chunked": chunked,
+        "statuses": list(statuses or []),
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def check_breaker() -> List[str]:
+    """
+    Prüft den Circuit Breaker beider Clients gegen einen Stub auf freiem Port:
+    zwei 500er öffnen ihn, ein 400er als Probe und ein abgebrochener Probe
+    (nur async) dürfen ihn nicht dauerhaft offen lassen. Liefert die Fehler.
+    """
+    import asyncio
+    from external_client import (
+        AsyncExternalImageClient, CircuitBreaker, CircuitOpenError, ExternalAPIError, ExternalImageClient,
+    )
+    server = make_server(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    handler = server.RequestHandlerClass
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}/expertGenerateImage"
+    reset_timeout = 0.2
+    failures = []
+
+    def expect(name: str, call, error=None):
+        try:
+            call()
+        except Exception as e:
+            if type(e) is not error:
+                failures.append(f"{name}: {type(e).__name__}: {e}")
+            return
+        if error is not None:
+            failures.append(f"{name}: kein {error.__name__}")
+
+    def scenario(label: str, generate, cancel_probe=None):
+        handler.statuses[:] = [500, 500, 400]
+        expect(f"{label} 500", generate, ExternalAPIError)
+        expect(f"{label} 500", generate, ExternalAPIError)
+        expect(f"{label} offen", generate, CircuitOpenError)
+        time.sleep(reset_timeout)
+        expect(f"{label} Probe 400", generate, ExternalAPIError)
+        expect(f"{label} nach 400", generate)
+        if cancel_probe is not None:
+            handler.statuses[:] = [500, 500]
+            expect(f"{label} 500", generate, ExternalAPIError)
+            expect(f"{label} 500", generate, ExternalAPIError)
+            time.sleep(reset_timeout)
+            cancel_probe()
+            expect(f"{label} nach Abbruch", generate)
+
+    try:
+        client = ExternalImageClient(endpoint, max_retries=0, breaker=CircuitBreaker(2, reset_timeout))
+        scenario("sync", lambda: client.generate("Riesling", "x"))
+        client.close()
+
+        async def run_async():
+            aclient = AsyncExternalImageClient(endpoint, max_retries=0, breaker=CircuitBreaker(2, reset_timeout))
+            loop = asyncio.get_running_loop()
+
+            def generate():
+                return asyncio.run_coroutine_threadsafe(aclient.generate("Riesling", "x"), loop).result()
+
+            def cancel_probe():
+                handler.delay = 1.0
+                future = asyncio.run_coroutine_threadsafe(aclient.generate("Riesling", "x"), loop)
+                time.sleep(0.2)
+                future.cancel()
+                time.sleep(0.1)
+                handler.delay = 0.0
+
+            await loop.run_in_executor(None, scenario, "async", generate, cancel_probe)
+            await aclient.close()
+
+        asyncio.run(run_async())
+    finally:
+        server.shutdown()
+        server.server_close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub der externen Bildgenerierung")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--delay", type=float, default=0.0, help="Verzögerung pro Request (Sekunden)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Anteil der Requests mit HTTP 503")
+    parser.add_argument("--chunked", action="store_true", help="Antwort mit Transfer-Encoding: chunked")
+    parser.add_argument("--check-breaker", action="store_true",
+                        help="Circuit Breaker beider Clients gegen einen Stub prüfen und beenden")
+    args = parser.parse_args()
+
+    if args.check_breaker:
+        failures = check_breaker()
+        print("[stub] Circuit Breaker ok" if not failures else "[stub] Fehler:\n  " + "\n  ".join(failures))
+        raise SystemExit(1 if failures else 0)
+
+    server = make_server(args.host, args.port, args.delay, args.fail_rate, args.chunked)
+    print(f"[stub] http://{args.host}:{args.port}/expertGenerateImage")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Kodierung der gerenderten Bilder (PNG, WebP, AVIF, JPEG).
+
+Standard bleibt PNG mit den bisherigen Einstellungen. Über Umgebungsvariablen
+lässt sich das Ausgabeformat für neu gerenderte Bilder umstellen:
+
+    WINE_IMAGE_FORMAT        png | webp | avif | jpeg         (Standard: png)
+    WINE_PNG_COMPRESS_LEVEL  0-9, niedriger = schneller, größer (Standard: 6)
+    WINE_PNG_STRATEGY        default | filtered | huffman | rle | fixed (zlib-Strategie)
+    WINE_IMAGE_QUALITY       1-100 für AVIF/JPEG (Standard: 85)
+    WINE_IMAGE_PALETTE       Farben für Paletten-Quantisierung bei PNG/WebP, 0 = aus
+
+WebP wird immer verlustfrei geschrieben. Das Format jedes Bildes steht in
+``evaluations.image_format``, damit die App es richtig ausliefert.
+
+Benchmark der Varianten:
+    python image_encoding.py bench --size 350
+"""
+import io
+import os
+from typing import Any, Dict, List, Optional
+
+
+FORMATS = ("png", "webp", "avif", "jpeg")
+
+MIME_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "avif": "image/avif",
+    "jpeg": "image/jpeg",
+}
+
+# zlib-Strategien (PIL: compress_type); -1 = Pillow-Standard, erzeugt exakt die bisherigen PNGs
+PNG_STRATEGIES = {"default": -1, "filtered": 1, "huffman": 2, "rle": 3, "fixed": 4}
+
+IMAGE_FORMAT = os.environ.get("WINE_IMAGE_FORMAT", "png").lower()
+PNG_COMPRESS_LEVEL = int(os.environ.get("WINE_PNG_COMPRESS_LEVEL", 6))
+PNG_STRATEGY = os.environ.get("WINE_PNG_STRATEGY", "default").lower()
+IMAGE_QUALITY = int(os.environ.get("WINE_IMAGE_QUALITY", 85))
+IMAGE_PALETTE = int(os.environ.get("WINE_IMAGE_PALETTE", 0))
+
+
+def _normalize(fmt: Optional[str]) -> str:
+    fmt = (fmt or IMAGE_FORMAT).lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in FORMATS:
+        raise ValueError(f"Unbekanntes Bildformat: {fmt} (erlaubt: {', '.join(FORMATS)})")
+    return fmt
+
+
+def is_available(fmt: str) -> bool:
+    """AVIF braucht ein Pillow mit libavif; die übrigen Formate sind immer da."""
+    if _normalize(fmt) != "avif":
+        return True
+    from PIL import features
+    try:
+        return bool(features.check("avif"))
+    except ValueError:  # ältere Pillow-Versionen kennen das Feature nicht
+        return False
+
+
+def available_formats() -> List[str]:
+    return [fmt for fmt in FORMATS if is_available(fmt)]
+
+
+def encode_image(
+    img,
+    fmt: Optional[str] = None,
+    compress_level: Optional[int] = None,
+    strategy: Optional[str] = None,
+    quality: Optional[int] = None,
+    palette: Optional[int] = None,
+) -> bytes:
+    """
+    Kodiert ein PIL-Bild.
+
+    Nicht angegebene Optionen kommen aus den WINE_*-Umgebungsvariablen.
+
+    Args:
+        img: PIL-Bild (RGB)
+        fmt: png, webp, avif oder jpeg
+        compress_level: PNG-Kompressionsstufe 0-9
+        strategy: zlib-Strategie für PNG (siehe PNG_STRATEGIES)
+        quality: Qualität 1-100 für AVIF/JPEG
+        palette: Anzahl Palettenfarben für PNG/WebP (0 = keine Quantisierung)
+
+    Returns:
+        Die kodierten Bytes
+    """
+    fmt = _normalize(fmt)
+    if not is_available(fmt):
+        raise ValueError(f"Bildformat {fmt} wird von dieser Pillow-Installation nicht unterstützt")
+    quality = IMAGE_QUALITY if quality is None else quality
+    palette = IMAGE_PALETTE if palette is None else palette
+
+    if palette and fmt in ("png", "webp"):
+        from PIL import Image
+        img = img.quantize(colors=palette, method=Image.Quantize.FASTOCTREE)
+
+    buffer = io.BytesIO()
+    if fmt == "png":
+        strategy = (strategy or PNG_STRATEGY).lower()
+        if strategy not in PNG_STRATEGIES:
+            raise ValueError(f"Unbekannte PNG-Strategie: {strategy}")
+        img.save(
+            buffer, format="PNG",
+            compress_level=PNG_COMPRESS_LEVEL if compress_level is None else compress_level,
+            compress_type=PNG_STRATEGIES[strategy],
+        )
+    elif fmt == "webp":
+        img.save(buffer, format="WEBP", lossless=True, quality=100, method=4)
+    elif fmt == "avif":
+        img.save(buffer, format="AVIF", quality=quality)
+    else:
+        img.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def sniff_format(data: bytes) -> str:
+    """Erkennt das Format an den ersten Bytes (z.B. für Bilder der externen API)."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[4:12] in (b"ftypavif", b"ftypavis"):
+        return "avif"
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    raise ValueError("Unbekanntes Bildformat")
+
+
+def mime_type(fmt: Optional[str]) -> str:
+    return MIME_TYPES[_normalize(fmt or "png")]
+
+
+def streamlit_format(fmt: Optional[str]) -> str:
+    """
+    output_format für st.image.
+
+    Streamlit liefert nur PNG/JPEG/GIF aus und würde alles andere als JPEG
+    neu kodieren; WebP/AVIF werden deshalb verlustfrei als PNG gezeigt.
+    """
+    return "JPEG" if (fmt or "png") == "jpeg" else "PNG"
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Benchmark: Kodierzeit gegen Dateigröße
+# ─────────────────────────────────────────────────────────────────────────────
+
+BENCH_VARIANTS: List[Dict[str, Any]] = (
+    [{"fmt": "png", "compress_level": level} for level in (1, 3, 6, 9)]
+    + [{"fmt": "png", "compress_level": 6, "strategy": s} for s in ("filtered", "rle")]
+    + [{"fmt": "png", "compress_level": 6, "palette": 256}]
+    + [{"fmt": "webp"}, {"fmt": "webp", "palette": 256}]
+    + [{"fmt": "avif", "quality": q} for q in (60, 85)]
+    + [{"fmt": "jpeg", "quality": q} for q in (85, 95)]
+)
+
+
+def bench(images: Dict[str, Any], repeat: int = 3) -> List[Dict[str, Any]]:
+    """Kodiert jedes Bild mit jeder Variante; Zeit = Median über ``repeat`` Läufe."""
+    import statistics
+    import time
+
+    results = []
+    for variant in BENCH_VARIANTS:
+        if not is_available(variant["fmt"]):
+            continue
+        for name, img in images.items():
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                data = encode_image(img, **variant)
+                times.append(time.perf_counter() - start)
+            results.append({
+                "image": name,
+                "variant": ", ".join(f"{k}={v}" for k, v in variant.items()),
+                "encode_ms": round(statistics.median(times) * 1000, 2),
+                "kb": round(len(data) / 1024, 1),
+            })
+    return results
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Bildkodierung: Benchmark der Formate")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_bench = sub.add_parser("bench", help="Kodierzeit und Größe je Format/Einstellung messen")
+    p_bench.add_argument("--size", type=int, default=350)
+    p_bench.add_argument("--repeat", type=int, default=3)
+    p_bench.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    from bench_render import PROFILES
+    from imagegen import render_wine_image
+
+    images = {name: render_wine_image(params, args.size) for name, params in PROFILES.items()}
+    results = bench(images, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    # Pro Variante über alle Profile mitteln
+    by_variant: Dict[str, List[Dict[str, Any]]] = {}
+    for r in results:
+        by_variant.setdefault(r["variant"], []).append(r)
+    print(f"{'Variante':<48} {'ms':>8} {'KB':>8}   (Mittel über {len(images)} Profile, {args.size} px)")
+    for variant, rows in by_variant.items():
+        ms = sum(r["encode_ms"] for r in rows) / len(rows)
+        kb = sum(r["kb"] for r in rows) / len(rows)
+        print(f"{variant:<48} {ms:>8.2f} {kb:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,143 @@
-from urllib.parse import urlencode
-from urllib.request import Request, urlopen
-import base64
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Optional
+
+from external_client import AsyncExternalImageClient, ExternalImageClient
+from perf import count, span
 
 
 #base_url = 'http://localhost:5001/colours-of-wine/us-central1'
-base_url = 'https://us-central1-colours-of-wine.cloudfunctions.net'
-url = base_url + '/expertGenerateImage?cookie='
-post_fields = {'foo': 'bar'}
-
-def generate_wine_external_api(desc, cookie):
-    request = Request(url + cookie, desc.encode('utf-8'))
-    with urlopen(request) as response:
-        return base64.b64decode(response.read())
+base_url = os.environ.get('WINE_EXTERNAL_API_URL', 'https://us-central1-colours-of-wine.cloudfunctions.net')
+url = base_url + '/expertGenerateImage'
+
+# Antwort-Cache: Gültigkeit in Sekunden und Obergrenze in MB
+CACHE_TTL = float(os.environ.get('WINE_EXTERNAL_CACHE_TTL', 24 * 3600))
+CACHE_MAX_MB = float(os.environ.get('WINE_EXTERNAL_CACHE_MB', 64))
+
+# Ein Client pro Prozess, damit Keep-Alive-Verbindungen wiederverwendet werden
+_client = ExternalImageClient(url)
+
+
+class ResponseCache:
+    """
+    Thread-sicherer LRU-Cache für Bild-Antworten mit TTL und Größenlimit in Bytes.
+    """
+
+    def __init__(self, ttl: float, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+
+_cache = ResponseCache(CACHE_TTL, int(CACHE_MAX_MB * 1024 * 1024))
+
+# Laufende Requests pro Cache-Key; identische gleichzeitige Anfragen teilen sich einen Aufruf
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def _cache_key(desc: str) -> str:
+    return hashlib.sha256(desc.strip().encode('utf-8')).hexdigest()
+
+
+def generate_wine_external_api(desc, cookie, timeout=None, use_cache=True):
+    if not use_cache:
+        with span("external.generate"):
+            return _client.generate(desc, cookie, timeout=timeout)
+
+    key = _cache_key(desc)
+    cached = _cache.get(key)
+    if cached is not None:
+        count("external.cache_hit")
+        return cached
+    count("external.cache_miss")
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not is_leader:
+        # Gleiche Beschreibung wird bereits angefragt: auf dasselbe Ergebnis warten
+        count("external.coalesced")
+        with span("external.wait_coalesced"):
+            return future.result(timeout=timeout)
+
+    try:
+        with span("external.generate"):
+            image = _client.generate(desc, cookie, timeout=timeout)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        _cache.put(key, image)
+        future.set_result(image)
+        return image
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+async def generate_wine_external_api_async(desc, cookie, timeout=None, client=None):
+    """Async-Variante; ``client`` sollte pro Event-Loop wiederverwendet werden."""
+    key = _cache_key(desc)
+    cached = _cache.get(key)
+    if cached is not None:
+        count("external.cache_hit")
+        return cached
+    count("external.cache_miss")
+
+    own_client = client is None
+    if own_client:
+        client = AsyncExternalImageClient(url, breaker=_client.breaker)
+    try:
+        # Span nur auf diesem Task: andere Tasks im selben Loop laufen dazwischen weiter
+        with span("external.generate_async"):
+            image = await client.generate(desc, cookie, timeout=timeout)
+    finally:
+        if own_client:
+            await client.close()
+    _cache.put(key, image)
+    return image
@@ -1,6 +1,12 @@
+import hashlib
+import os
+from functools import lru_cache
 from pathlib import Path
 import numpy as np
-from PIL import Image, ImageFilter, ImageDraw, ImageFont
+from PIL import Image, ImageFilter
+
+from overlays import Compositor, RingLabels, SugarBar
+from perf import span
 
 
 def hex_to_rgb(hex_str: str) -> tuple[int, int, int]:
@@ -15,6 +21,9 @@ def draw_residual_sugar_bar(img: Image.Image, residual_sugar: float, bar_width:
     """
     Zeichnet einen Restzucker-Balken am rechten Rand des Bildes.
     
+    Für bereits fertige Bilder; render_wine_image legt die Leinwand samt
+    Balken direkt an (siehe overlays.Compositor).
+    
     Args:
         img: Das Eingabebild (PIL Image)
         residual_sugar: Restzucker in g/L (typisch 0-500, kann aber höher sein)
@@ -27,202 +36,141 @@ def draw_residual_sugar_bar(img: Image.Image, residual_sugar: float, bar_width:
         return img
     
     w, h = img.size
-    if bar_width is None:
-        bar_width = max(int(w * 0.05), 30)  # 5% der Breite, mindestens 30px
-    
-    # Neues breiteres Bild erstellen
-    new_w = w + bar_width
-    new_img = Image.new("RGB", (new_w, h), (252, 252, 254))  # Hintergrundfarbe
-    new_img.paste(img, (0, 0))
-    
-    draw = ImageDraw.Draw(new_img)
-    
-    # Balkenhöhe berechnen (logarithmische Skala für bessere Verteilung)
-    # Skala: 0g → 0%, 9g → ~10%, 50g → ~50%, 500g → 100%
-    # Formel: log-basiert mit Minimum bei 1g
-    if residual_sugar <= 0:
-        bar_height_ratio = 0.0
-    else:
-        # Log-Skala: log(1) = 0, log(500) ≈ 2.7
-        import math
-        max_sugar = 500.0  # Obergrenze für 100%
-        min_sugar = 1.0    # Untergrenze
-        clamped = max(min_sugar, min(residual_sugar, max_sugar))
-        bar_height_ratio = math.log10(clamped) / math.log10(max_sugar)
-        bar_height_ratio = min(1.0, max(0.0, bar_height_ratio))
-    
-    # Balken von unten nach oben
-    bar_height = int(h * bar_height_ratio)
-    bar_x1 = w
-    bar_x2 = new_w
-    bar_y1 = h - bar_height  # Oberkante
-    bar_y2 = h               # Unterkante
-    
-    # Pinke/Magenta Farbe (wie im Beispielbild)
-    bar_color = (240, 62, 107)  # Pink/Magenta
-    
-    # Balken zeichnen
-    if bar_height > 0:
-        draw.rectangle([bar_x1, bar_y1, bar_x2, bar_y2], fill=bar_color)
-    
-    # Hintergrund über dem Balken (grau)
-    if bar_y1 > 0:
-        gray_color = (200, 200, 200)
-        draw.rectangle([bar_x1, 0, bar_x2, bar_y1], fill=gray_color)
-    
-    # Text mit Restzucker-Wert (vertikal, von unten nach oben)
-    # Wert als ganze Zahl anzeigen
-    sugar_text = f"{int(residual_sugar)} gr RZ"
-    
-    # Font laden (versuche System-Font, sonst Default)
-    font_size = max(int(bar_width * 0.5), 12)
-    font = None
-    
-    # Plattformspezifische Font-Pfade
-    import sys
-    font_candidates = []
-    if sys.platform == "darwin":  # macOS
-        font_candidates = [
-            "/System/Library/Fonts/Helvetica.ttc",
-            "/System/Library/Fonts/SFNSText.ttf",
-        ]
-    elif sys.platform == "win32":  # Windows
-        font_candidates = [
-            "C:/Windows/Fonts/arial.ttf",
-            "C:/Windows/Fonts/segoeui.ttf",
-            "C:/Windows/Fonts/tahoma.ttf",
-        ]
-    else:  # Linux und andere
-        font_candidates = [
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-            "/usr/share/fonts/TTF/DejaVuSans.ttf",
-        ]
-    
-    for font_path in font_candidates:
-        try:
-            font = ImageFont.truetype(font_path, font_size)
-            break
-        except (OSError, IOError):
-            continue
-    
-    if font is None:
-        font = ImageFont.load_default()
-    
-    # Text vertikal zeichnen (rotiert)
-    # Erstelle temporäres Bild für rotierten Text
-    text_bbox = draw.textbbox((0, 0), sugar_text, font=font)
-    text_w = text_bbox[2] - text_bbox[0]
-    text_h = text_bbox[3] - text_bbox[1]
-    
-    text_img = Image.new("RGBA", (text_w + 10, text_h + 10), (0, 0, 0, 0))
-    text_draw = ImageDraw.Draw(text_img)
-    text_draw.text((5, 5), sugar_text, font=font, fill=(255, 255, 255, 255))
-    
-    # 90° gegen Uhrzeigersinn drehen (Text von unten nach oben lesbar)
-    text_img = text_img.rotate(90, expand=True)
-    
-    # Text in der Mitte des Balkens positionieren
-    text_x = w + (bar_width - text_img.width) // 2
-    text_y = h - bar_height + (bar_height - text_img.height) // 2
-    
-    # Nur zeichnen wenn genug Platz
-    if bar_height > text_img.height + 10:
-        new_img.paste(text_img, (text_x, max(0, text_y)), text_img)
-    
-    return new_img
-
-
-def generate_wine_png(
-    viz: dict,
-    size: int = 1024,
-    out_path: str = "wine_test.png",
-):
-    """Weinvisualisierung mit 3-Schicht-System:
-    
-    Layer 1: Weinfarben-Basis mit radialem Gradient (wie bisher)
-    Layer 2: Charakteristische farbige Ringe (neu - zeigen Ausprägung)
-    Layer 3: Textur-Elemente wie Sterne für Spritzigkeit (neu)
-    """
-
-    # zentrale Weinfarbe
-    base_hex = viz.get("base_color_hex") or "#F6F2AF"
-    base_rgb = np.array(hex_to_rgb(base_hex), dtype=np.float32)
-
-    w = h = size
-    cx, cy = w / 2.0, h / 2.0
-    max_r = min(cx, cy) * 0.95
-
-    # Hintergrund
-    bg_color = np.array([252.0, 252.0, 254.0], dtype=np.float32)
-
-    yy, xx = np.mgrid[0:h, 0:w]
-    dx = xx - cx
-    dy = yy - cy
-    r = np.sqrt(dx * dx + dy * dy)
-    t = r / max_r  # 0=Zentrum, 1=Außenkante
-    angles = np.arctan2(dy, dx)
-
-    rng = np.random.default_rng(42)
-
-    # === Intensitäten aus Profil (0..1) ===
-    def _f(name: str, default: float = 0.0) -> float:
-        v = viz.get(name)
-        try:
-            return float(v) if v is not None else default
-        except (TypeError, ValueError):
-            return default
-
-    oak = _f("oak_intensity")
-    mineral = _f("mineral_intensity")
-    acidity = _f("acidity", 0.5)
-    herbs = _f("herbal_intensity")
-    spice = _f("spice_intensity")
-    fruit_citrus = _f("fruit_citrus")
-    fruit_stone = _f("fruit_stone")
-    fruit_tropical = _f("fruit_tropical")
-    fruit_red = _f("fruit_red")
-    fruit_dark = _f("fruit_dark")
-    body = _f("body", 0.5)
-    depth = _f("depth", 0.5)
-    
-    # Spritzigkeit für Layer 3
-    effervescence = _f("effervescence", 0.0)
-    
-    # Restzucker (g/L) für den Balken am rechten Rand
-    residual_sugar = _f("residual_sugar", 0.0)
-    
-    # Weintyp aus Profil (optional)
-    wine_type = viz.get("wine_type", "auto")  # "red", "white", "rose", "auto"
-
-    # ============================================================
-    # LAYER 1: Weinfarben-Basis mit radialem Gradient
-    # ============================================================
-    
-    base_brightness = np.mean(base_rgb) / 255.0
-    
-    # Weintyp bestimmen
-    if wine_type == "red":
-        is_red_wine = True
-        is_rose = False
-    elif wine_type == "rose":
-        is_red_wine = False
-        is_rose = True
-    elif wine_type == "white":
-        is_red_wine = False
-        is_rose = False
-    else:  # auto
-        is_red_wine = base_brightness < 0.5
-        # Rosé: Mittlere Helligkeit mit Rot-Dominanz UND wenig Grün
-        is_rose = (0.5 <= base_brightness < 0.7) and (base_rgb[0] > base_rgb[1] + 30) and (base_rgb[1] < 160)
-    
-    wine = np.ones((h, w, 3), dtype=np.float32) * base_rgb[None, None, :]
-
-    if is_red_wine:
+    canvas = Compositor(w, h, [SugarBar(residual_sugar, bar_width)])
+    canvas.disc[...] = np.asarray(img.convert("RGB"))
+    return canvas.finish()
+
+
+# Ringe von außen (1) nach innen (12):
+# (name, center, width, color_rgb, intensity_key, default)
+RING_DEFINITIONS = [
+    ("Holz/Fass",    0.78, 0.06, (140, 90, 50),   "oak_intensity",     0.0),  # Braun/Eiche
+    ("Mineralität",  0.72, 0.06, (130, 140, 150), "mineral_intensity", 0.0),  # Grau/Stein
+    ("Säure",        0.66, 0.06, (160, 200, 120), "acidity",           0.5),  # Hellgrün
+    ("Kräuter",      0.60, 0.06, (70, 120, 70),   "herbal_intensity",  0.0),  # Dunkelgrün
+    ("Würze",        0.54, 0.06, (170, 100, 45),  "spice_intensity",   0.0),  # Zimt/Orange
+    ("Zitrus",       0.48, 0.05, (240, 220, 70),  "fruit_citrus",      0.0),  # Gelb
+    ("Steinobst",    0.42, 0.05, (240, 170, 90),  "fruit_stone",       0.0),  # Aprikose
+    ("Tropisch",     0.36, 0.05, (240, 200, 55),  "fruit_tropical",    0.0),  # Mango
+    ("Rotfrucht",    0.30, 0.05, (200, 60, 60),   "fruit_red",         0.0),  # Rot
+    ("Dunkelfrucht", 0.24, 0.05, (80, 35, 80),    "fruit_dark",        0.0),  # Dunkel-Lila
+    ("Körper",       0.18, 0.06, (140, 70, 45),   "body",              0.5),  # Sienna
+    ("Tiefe",        0.12, 0.08, None,            "depth",             0.5),  # Weinfarbe dunkler
+]
+
+BG_COLOR = (252.0, 252.0, 254.0)
+
+# Rechengenauigkeit: "exact" (float32/float64 wie bisher), "float16" oder "fixed"
+# (uint16-Festkomma Q9.7). Die reduzierten Modi lesen alle Radius-Kurven aus
+# Tabellen und sparen vor allem Speicher; schneller sind sie erst bei größeren
+# Bildern (bei 128 px sind beide oft langsamer als exact, siehe README).
+PRECISIONS = ("exact", "float16", "fixed")
+DEFAULT_PRECISION = os.environ.get("WINE_RENDER_PRECISION", "exact")
+# Kleinere Bilder rechnen trotz WINE_RENDER_PRECISION exakt (explizites precision gilt immer)
+REDUCED_MIN_SIZE = 256
+# Stützstellen der Tabellen pro Einheit t (Radius relativ zu max_r)
+LUT_STEPS = 4096
+# Nachkommabits im Festkomma-Modus (Werte bis 511, Auflösung 1/128)
+FIXED_SHIFT = 7
+
+# Versionierung gespeicherter Bilder (siehe render_info und rerender.py).
+# Farbverläufe von Layer 1, Ringe und Kreismaske erfasst der Fingerprint selbst;
+# RENDERER_VERSION erhöhen bei Änderungen an Textur-Punkten, Blur, Weintyp-
+# Erkennung oder Szenengeometrie, die Einträge in COMPONENT_VERSIONS bei
+# Änderungen an Teilen, die nur manche Bilder haben.
+RENDERER_VERSION = 1
+COMPONENT_VERSIONS = {"bubbles": 1, "sugar_bar": 1}
+
+
+def _viz_float(viz: dict, name: str, default: float = 0.0) -> float:
+    """Intensität aus dem Profil (0..1), robust gegen fehlende/ungültige Werte."""
+    v = viz.get(name)
+    try:
+        return float(v) if v is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+class _Scene:
+    """Gemeinsame Eingaben aller Layer: Geometrie, Weinfarbe, Weintyp, Zufallsquelle."""
+
+    def __init__(self, viz: dict, size: int, precision: str = "exact"):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unbekannte Genauigkeit '{precision}' (erlaubt: {', '.join(PRECISIONS)})")
+        self.precision = precision
+        # Werte im Bild-Array sind um diesen Faktor skaliert (Festkomma)
+        self.scale = float(1 << FIXED_SHIFT) if precision == "fixed" else 1.0
+
+        # zentrale Weinfarbe
+        base_hex = viz.get("base_color_hex") or "#F6F2AF"
+        self.base_rgb = np.array(hex_to_rgb(base_hex), dtype=np.float32)
+
+        self.size = size
+        self.w = self.h = size
+        self.cx, self.cy = self.w / 2.0, self.h / 2.0
+        self.max_r = min(self.cx, self.cy) * 0.95
+
+        if precision == "exact":
+            yy, xx = np.mgrid[0:self.h, 0:self.w]
+            dx = xx - self.cx
+            dy = yy - self.cy
+            r = np.sqrt(dx * dx + dy * dy)
+            self.t = r / self.max_r  # 0=Zentrum, 1=Außenkante
+            self.angles = np.arctan2(dy, dx)
+            self.t_index = None
+        else:
+            # Nur ein uint16-Index pro Pixel; alle Funktionen von t kommen aus Tabellen über t_grid
+            dx, dy = self.offsets()
+            t = np.sqrt(dx * dx + dy * dy) / np.float32(self.max_r)
+            self.t_index = np.rint(t * LUT_STEPS).astype(np.uint16)
+            self.t_grid = np.arange(int(self.t_index.max()) + 1) / LUT_STEPS
+
+        self.rng = np.random.default_rng(42)
+
+        # Spritzigkeit für Layer 3, Restzucker (g/L) für den Balken am rechten Rand
+        self.effervescence = _viz_float(viz, "effervescence", 0.0)
+        self.residual_sugar = _viz_float(viz, "residual_sugar", 0.0)
+        self.intensities = [_viz_float(viz, key, default) for _, _, _, _, key, default in RING_DEFINITIONS]
+
+        # Weintyp aus Profil (optional): "red", "white", "rose", "auto"
+        wine_type = viz.get("wine_type", "auto")
+        base_brightness = np.mean(self.base_rgb) / 255.0
+        if wine_type == "red":
+            self.is_red_wine, self.is_rose = True, False
+        elif wine_type == "rose":
+            self.is_red_wine, self.is_rose = False, True
+        elif wine_type == "white":
+            self.is_red_wine, self.is_rose = False, False
+        else:  # auto
+            self.is_red_wine = base_brightness < 0.5
+            # Rosé: Mittlere Helligkeit mit Rot-Dominanz UND wenig Grün
+            self.is_rose = (0.5 <= base_brightness < 0.7) and (self.base_rgb[0] > self.base_rgb[1] + 30) and (self.base_rgb[1] < 160)
+
+    @property
+    def reduced(self) -> bool:
+        return self.t_index is not None
+
+    def offsets(self) -> tuple:
+        """Abstand zum Mittelpunkt als float32-Zeile/-Spalte (broadcastbar, statt voller Gitter)."""
+        dx = (np.arange(self.w, dtype=np.float32) - np.float32(self.cx))[None, :]
+        dy = (np.arange(self.h, dtype=np.float32) - np.float32(self.cy))[:, None]
+        return dx, dy
+
+    def lookup(self, table: np.ndarray, dtype) -> np.ndarray:
+        """Tabelle über t_grid (Form (n,)) pro Pixel nachschlagen."""
+        return table.astype(dtype)[self.t_index]
+
+
+def _base_profile(s: _Scene, t: np.ndarray) -> np.ndarray:
+    """Layer 1 ohne Textur: Weinfarbe als Funktion des Radius ``t`` (beliebige Form, dazu 3 Kanäle)."""
+    wine = np.ones(t.shape + (3,), dtype=np.float32) * s.base_rgb
+
+    if s.is_red_wine:
         brightness = 0.5 + 0.6 * (t ** 0.7)  # Weniger Aufhellung außen
         warmth = t ** 0.8
         wine[..., 0] = wine[..., 0] + warmth * 25
         wine[..., 1] = wine[..., 1] + warmth * 15
-    elif is_rose:
+    elif s.is_rose:
         # Rosé: Außen heller, Kern DEUTLICH dunkler
         brightness = 0.6 + 0.5 * (t ** 0.5) - 0.3 * (np.clip(1-t, 0, 1) ** 1.2)
         # Leichte Wärme außen
@@ -235,176 +183,300 @@ def generate_wine_png(
         center_weight = (1 - t) ** 1.8
         wine[..., 1] = wine[..., 1] - center_weight * 20  # Weniger Grün im Kern
         wine[..., 2] = wine[..., 2] - center_weight * 35  # Deutlich weniger Blau im Kern
-    
-    wine = wine * np.clip(brightness, 0.3, 1.5)[..., None]
+
+    return wine * np.clip(brightness, 0.3, 1.5)[..., None]
+
+
+def _layer_base(s: _Scene) -> np.ndarray:
+    """LAYER 1: Weinfarben-Basis mit radialem Gradient und feiner Textur."""
+    if s.reduced:
+        return _layer_base_lut(s)
+    t = s.t
+    wine = _base_profile(s, t)
 
     # Feine Textur auf Layer 1
-    radial_lines = np.sin(angles * 80 + t * 20) * 0.5 + 0.5
+    radial_lines = np.sin(s.angles * 80 + t * 20) * 0.5 + 0.5
     texture_strength = 0.03 * (1 - t * 0.5)
     wine = wine * (1 + (radial_lines - 0.5)[..., None] * texture_strength[..., None])
 
-    noise = rng.normal(0, 1, (h, w)).astype(np.float32)
+    noise = s.rng.normal(0, 1, (s.h, s.w)).astype(np.float32)
     noise = noise / (np.abs(noise).max() + 1e-6)
     wine = wine * (1 + noise[..., None] * 0.015)
+    return wine
 
-    # ============================================================
-    # LAYER 2: Charakteristische farbige Ringe
-    # ============================================================
-    # Ringe zeigen Ausprägungen von Eigenschaften/Geschmack/Fass etc.
-    # Reihenfolge: Außen (1) → Innen (12)
-    
-    RING_DEFINITIONS = [
-        # (name, center, width, color_rgb, intensity_key)
-        ("Holz/Fass",    0.78, 0.06, (140, 90, 50),   oak),           # Braun/Eiche
-        ("Mineralität",  0.72, 0.06, (130, 140, 150), mineral),       # Grau/Stein
-        ("Säure",        0.66, 0.06, (160, 200, 120), acidity),       # Hellgrün
-        ("Kräuter",      0.60, 0.06, (70, 120, 70),   herbs),         # Dunkelgrün
-        ("Würze",        0.54, 0.06, (170, 100, 45),  spice),         # Zimt/Orange
-        ("Zitrus",       0.48, 0.05, (240, 220, 70),  fruit_citrus),  # Gelb
-        ("Steinobst",    0.42, 0.05, (240, 170, 90),  fruit_stone),   # Aprikose
-        ("Tropisch",     0.36, 0.05, (240, 200, 55),  fruit_tropical),# Mango
-        ("Rotfrucht",    0.30, 0.05, (200, 60, 60),   fruit_red),     # Rot
-        ("Dunkelfrucht", 0.24, 0.05, (80, 35, 80),    fruit_dark),    # Dunkel-Lila
-        ("Körper",       0.18, 0.06, (140, 70, 45),   body),          # Sienna
-        ("Tiefe",        0.12, 0.08, None,            depth),         # Weinfarbe dunkler
-    ]
-    
-    for name, center, width, ring_color, intensity in RING_DEFINITIONS:
+
+def _layer_base_lut(s: _Scene) -> np.ndarray:
+    """
+    Layer 1 in reduzierter Genauigkeit: Farbverlauf aus der Tabelle, Textur als ein Faktor pro Pixel.
+
+    Weißwein hat außerhalb der Scheibe (t > 1) exakt NaN im Verlauf, das beim
+    Blur zu 0 wird; die Tabelle enthält dort direkt 0.
+    """
+    profile = np.nan_to_num(_base_profile(s, s.t_grid), nan=0.0)
+
+    dx, dy = s.offsets()
+    t = s.lookup(s.t_grid, np.float32)
+    radial_lines = np.sin(np.arctan2(dy, dx) * 80 + t * 20) * 0.5 + 0.5
+    factor = 1 + (radial_lines - 0.5) * (0.03 * (1 - t * 0.5))
+    del radial_lines, t
+    # Gleiche Zufallszahlen wie im exakten Modus, damit Punkte und Bläschen gleich liegen
+    noise = s.rng.normal(0, 1, (s.h, s.w)).astype(np.float32)
+    noise /= np.abs(noise).max() + 1e-6
+    factor *= 1 + noise * 0.015
+    del noise
+
+    if s.precision == "float16":
+        factor = factor.astype(np.float16)
+        wine = np.empty((s.h, s.w, 3), dtype=np.float16)
+        for c in range(3):
+            np.multiply(s.lookup(profile[:, c], np.float16), factor, out=wine[..., c])
+        return wine
+
+    # Festkomma: Verlauf in Q9.7, Faktor (≈ 1 ± 0.05) in Q1.15, Produkt in uint32. Negative Werte
+    # (Blau im Kern heller Weißweine) werden erst beim Blur zu 0; Ringe reichen kaum bis dorthin,
+    # daher hier schon auf 0 begrenzt
+    profile = np.clip(profile, 0, 0xFFFF / s.scale)
+    factor = np.rint(factor * (1 << 15)).astype(np.uint32)
+    wine = np.empty((s.h, s.w, 3), dtype=np.uint16)
+    for c in range(3):
+        channel = s.lookup(np.rint(profile[:, c] * s.scale), np.uint32) * factor
+        wine[..., c] = (channel + (1 << 14)) >> 15
+    return wine
+
+
+def _layer_rings(s: _Scene, wine: np.ndarray, t: np.ndarray = None) -> np.ndarray:
+    """
+    LAYER 2: Charakteristische farbige Ringe (Ausprägungen von Geschmack, Fass etc.).
+
+    ``t`` ersetzt die Radien der Szene (z.B. Stützstellen einer Tabelle).
+    """
+    if s.reduced and t is None:
+        return _layer_rings_lut(s, wine)
+    t = s.t if t is None else t
+    for (name, center, width, ring_color, _, _), intensity in zip(RING_DEFINITIONS, s.intensities):
         if intensity < 0.2:  # Nur Ringe mit merkbarer Intensität zeigen
             continue
-        
+
         # Ring-Maske mit weichen Kanten (Gauss)
         sigma = width * 0.5
         dist = np.abs(t - center)
         ring_weight = np.exp(-0.5 * (dist / sigma) ** 2)
-        
+
         # Ringe früh ausfaden (vor t=0.85) damit Blur nicht nach außen blutet
         ring_weight = ring_weight * np.clip((0.82 - t) / 0.10, 0, 1)
-        
+
         # Intensität bestimmt Sichtbarkeit: 0.2-1.0 → 0.08-0.35 Deckkraft (dezenter)
         ring_opacity = ring_weight * (0.08 + intensity * 0.27)
-        
+
         if ring_color is None:
             # "Tiefe" Ring: Weinfarbe dunkler machen
             wine = wine * (1 - ring_opacity[..., None] * 0.4)
         else:
             # Farbiger Ring - sanft mit Weinfarbe mischen
             color = np.array(ring_color, dtype=np.float32)
-            
+
             # Bei Rotwein: Farben aufhellen damit sichtbar
-            if is_red_wine:
+            if s.is_red_wine:
                 color = np.clip(color * 1.3 + 30, 0, 255)
             else:
                 # Bei Weißwein: Farben etwas satter
                 color = np.clip(color * 0.9, 0, 255)
-            
-            wine = wine * (1 - ring_opacity[..., None]) + color[None, None, :] * ring_opacity[..., None]
 
-    # ============================================================
-    # LAYER 3: Textur-Elemente (Sterne/Bläschen für Spritzigkeit)
-    # ============================================================
-    
-    # Kleine helle Punkte für allgemeine Textur
+            wine = wine * (1 - ring_opacity[..., None]) + color * ring_opacity[..., None]
+    return wine
+
+
+def _layer_rings_lut(s: _Scene, wine: np.ndarray) -> np.ndarray:
+    """
+    Layer 2 in reduzierter Genauigkeit, in-place.
+
+    Jede Ring-Mischung ist affin im Pixelwert mit Koeffizienten, die nur von t
+    abhängen; die ganze Kette ist also ``wine * P(t) + Q(t)`` und wird über
+    zwei Proben (0 und 1) auf den Stützstellen tabelliert.
+    """
+    if all(intensity < 0.2 for intensity in s.intensities):
+        return wine
+    n = len(s.t_grid)
+    offset = _layer_rings(s, np.zeros((n, 3)), s.t_grid)
+    gain = _layer_rings(s, np.ones((n, 3)), s.t_grid) - offset
+
+    for c in range(3):
+        channel = wine[..., c]
+        if s.precision == "float16":
+            channel *= s.lookup(gain[:, c], np.float16)
+            channel += s.lookup(offset[:, c], np.float16)
+        else:
+            # P in Q0.16, Q in Q9.7; Zwischenergebnis passt in uint32
+            mixed = channel.astype(np.uint32) * s.lookup(np.rint(gain[:, c] * (1 << 16)), np.uint32)
+            mixed = ((mixed + (1 << 15)) >> 16) + s.lookup(np.rint(offset[:, c] * s.scale), np.uint32)
+            channel[...] = np.minimum(mixed, 0xFFFF)
+    return wine
+
+
+STAR_COLOR = np.array([255, 255, 250], dtype=np.float32)
+HIGHLIGHT_COLOR = np.array([255, 255, 255], dtype=np.float32)
+
+
+def _texture_dots(s: _Scene, wine: np.ndarray) -> np.ndarray:
+    """Kleine helle Punkte für allgemeine Textur (statischer Teil von Layer 3), in-place."""
+    rng, w, h, cx, cy, max_r, size = s.rng, s.w, s.h, s.cx, s.cy, s.max_r, s.size
+
     n_dots = int(size * size * 0.0003)
     for _ in range(n_dots):
         angle = rng.uniform(0, 2 * np.pi)
         radius = rng.uniform(0.2, 0.85) * max_r
         x = int(cx + radius * np.cos(angle))
         y = int(cy + radius * np.sin(angle))
-        
+
         if 0 <= x < w and 0 <= y < h:
             current = wine[y, x]
-            if is_red_wine:
+            if s.is_red_wine:
                 dot_color = current * 1.2
             else:
-                dot_color = np.array([160, 195, 210], dtype=np.float32)
-            
+                dot_color = np.array([160, 195, 210], dtype=np.float32) * s.scale
+
             dot_size = rng.integers(1, 2)
             opacity = rng.uniform(0.1, 0.25)
-            
+
             for ddx in range(-dot_size, dot_size + 1):
                 for ddy in range(-dot_size, dot_size + 1):
                     if ddx*ddx + ddy*ddy <= dot_size*dot_size:
                         px, py = x + ddx, y + ddy
                         if 0 <= px < w and 0 <= py < h:
                             wine[py, px] = wine[py, px] * (1 - opacity) + dot_color * opacity
+    return wine
+
+
+def _draw_star(wine: np.ndarray, bx: int, by: int, arm_angles: list, arm_length: int, effervescence: float,
+               scale: float = 1.0):
+    """Funkelnde Perle: Strahlen plus helles Zentrum (Pixel überlappen, daher sequentiell)."""
+    h, w = wine.shape[:2]
+    star_color = STAR_COLOR * scale
+    center_color = np.array([255, 255, 252]) * scale
+    for arm_angle in arm_angles:
+        for d in range(arm_length):
+            px = int(bx + d * np.cos(arm_angle))
+            py = int(by + d * np.sin(arm_angle))
+            if 0 <= px < w and 0 <= py < h:
+                falloff = 1.0 - (d / arm_length) * 0.6
+                opacity = 0.8 * falloff * effervescence
+                wine[py, px] = wine[py, px] * (1 - opacity) + star_color * opacity
+
+    # Helles Zentrum - größer
+    for ddx in range(-2, 3):
+        for ddy in range(-2, 3):
+            if ddx*ddx + ddy*ddy <= 4:
+                px, py = bx + ddx, by + ddy
+                if 0 <= px < w and 0 <= py < h:
+                    wine[py, px] = wine[py, px] * 0.2 + center_color * 0.8
+
+
+def _draw_round_bubble(wine: np.ndarray, bx: int, by: int, bubble_size: int, effervescence: float,
+                       scale: float = 1.0):
+    """Rundes Bläschen mit Lichtreflex oben-links; jedes Pixel einmal, daher vektorisiert."""
+    h, w = wine.shape[:2]
+    reach = bubble_size + 2
+    y0, y1 = max(by - reach, 0), min(by + reach + 1, h)
+    x0, x1 = max(bx - reach, 0), min(bx + reach + 1, w)
+    if y0 >= y1 or x0 >= x1:
+        return
+    ddy = np.arange(y0, y1)[:, None] - by
+    ddx = np.arange(x0, x1)[None, :] - bx
+    dist_sq = ddx * ddx + ddy * ddy
+    inside = dist_sq <= reach ** 2
+    highlight = inside & (ddx < 0) & (ddy < 0) & (dist_sq > (bubble_size - 2) ** 2)
+    body = inside & ~highlight & (dist_sq <= bubble_size ** 2)
+
+    patch = wine[y0:y1, x0:x1]
+    opacity = 0.85 * effervescence
+    patch[highlight] = patch[highlight] * (1 - opacity) + HIGHLIGHT_COLOR * scale * opacity
+    opacity = 0.4 * effervescence
+    current = patch[body]
+    patch[body] = current * (1 - opacity) + np.clip(current * 1.3 + 30 * scale, 0, 255 * scale) * opacity
+
+
+def _texture_bubbles(s: _Scene, wine: np.ndarray) -> np.ndarray:
+    """Sterne/Sparkles/Bläschen für Spritzigkeit (bewegter Teil von Layer 3), in-place."""
+    rng, w, h, cx, cy, max_r, size = s.rng, s.w, s.h, s.cx, s.cy, s.max_r, s.size
+    effervescence = s.effervescence
+    if effervescence <= 0.1:
+        return wine
+
+    # VIEL mehr Bläschen für sichtbaren Effekt
+    n_bubbles = int(effervescence * 400 * (size / 512))  # Skaliert mit Bildgröße
+
+    for _ in range(n_bubbles):
+        angle = rng.uniform(0, 2 * np.pi)
+        radius = rng.beta(2, 1.5) * 0.85 * max_r
+        bx = int(cx + radius * np.cos(angle))
+        by = int(cy + radius * np.sin(angle))
 
-    # === Sterne/Sparkles/Bläschen für Spritzigkeit ===
-    if effervescence > 0.1:
-        # VIEL mehr Bläschen für sichtbaren Effekt
-        n_bubbles = int(effervescence * 400 * (size / 512))  # Skaliert mit Bildgröße
-        
-        for _ in range(n_bubbles):
-            angle = rng.uniform(0, 2 * np.pi)
-            radius = rng.beta(2, 1.5) * 0.85 * max_r
-            bx = int(cx + radius * np.cos(angle))
-            by = int(cy + radius * np.sin(angle))
-            
-            if not (0 <= bx < w and 0 <= by < h):
-                continue
-            
-            # Größere Bläschen/Sterne
-            base_size = int(3 + effervescence * 4)  # 3-7 Pixel
-            bubble_size = rng.integers(base_size - 2, base_size + 3)
-            
-            # 50% sind Sterne (funkelnde Perlen)
-            if rng.random() < 0.5:
-                n_arms = 4 if rng.random() < 0.6 else 6
-                arm_length = bubble_size + rng.integers(2, 6)
-                
-                for arm_i in range(n_arms):
-                    arm_angle = (2 * np.pi * arm_i / n_arms) + rng.uniform(-0.15, 0.15)
-                    for d in range(arm_length):
-                        px = int(bx + d * np.cos(arm_angle))
-                        py = int(by + d * np.sin(arm_angle))
-                        if 0 <= px < w and 0 <= py < h:
-                            falloff = 1.0 - (d / arm_length) * 0.6
-                            opacity = 0.8 * falloff * effervescence
-                            star_color = np.array([255, 255, 250], dtype=np.float32)
-                            wine[py, px] = wine[py, px] * (1 - opacity) + star_color * opacity
-                
-                # Helles Zentrum - größer
-                for ddx in range(-2, 3):
-                    for ddy in range(-2, 3):
-                        if ddx*ddx + ddy*ddy <= 4:
-                            px, py = bx + ddx, by + ddy
-                            if 0 <= px < w and 0 <= py < h:
-                                wine[py, px] = wine[py, px] * 0.2 + np.array([255, 255, 252]) * 0.8
-            else:
-                # Runde Bläschen - größer und heller
-                for ddx in range(-bubble_size-2, bubble_size+3):
-                    for ddy in range(-bubble_size-2, bubble_size+3):
-                        dist_sq = ddx*ddx + ddy*ddy
-                        if dist_sq <= (bubble_size+2)**2:
-                            px, py = bx + ddx, by + ddy
-                            if 0 <= px < w and 0 <= py < h:
-                                # Lichtreflex oben-links
-                                is_highlight = (ddx < 0 and ddy < 0 and dist_sq > (bubble_size-2)**2)
-                                if is_highlight:
-                                    opacity = 0.85 * effervescence
-                                    bubble_color = np.array([255, 255, 255], dtype=np.float32)
-                                elif dist_sq <= bubble_size**2:
-                                    opacity = 0.4 * effervescence
-                                    bubble_color = np.clip(wine[py, px] * 1.3 + 30, 0, 255)
-                                else:
-                                    continue
-                                wine[py, px] = wine[py, px] * (1 - opacity) + bubble_color * opacity
-
-    # === Blur - WENIGER bei Spritzigkeit damit Sterne sichtbar bleiben ===
-    blur_radius = size * 0.008 if effervescence < 0.3 else size * 0.004
+        if not (0 <= bx < w and 0 <= by < h):
+            continue
+
+        # Größere Bläschen/Sterne
+        base_size = int(3 + effervescence * 4)  # 3-7 Pixel
+        bubble_size = rng.integers(base_size - 2, base_size + 3)
+
+        # 50% sind Sterne (funkelnde Perlen)
+        if rng.random() < 0.5:
+            n_arms = 4 if rng.random() < 0.6 else 6
+            arm_length = bubble_size + rng.integers(2, 6)
+            arm_angles = [(2 * np.pi * arm_i / n_arms) + rng.uniform(-0.15, 0.15) for arm_i in range(n_arms)]
+            _draw_star(wine, bx, by, arm_angles, arm_length, effervescence, s.scale)
+        else:
+            _draw_round_bubble(wine, bx, by, bubble_size, effervescence, s.scale)
+    return wine
+
+
+def _layer_texture(s: _Scene, wine: np.ndarray) -> np.ndarray:
+    """LAYER 3: Textur-Elemente (Punkte, Sterne/Bläschen für Spritzigkeit), in-place."""
+    return _texture_bubbles(s, _texture_dots(s, wine))
+
+
+def _blur_radius(s: _Scene) -> float:
+    """Blur - WENIGER bei Spritzigkeit damit Sterne sichtbar bleiben."""
+    return s.size * 0.008 if s.effervescence < 0.3 else s.size * 0.004
+
+
+def _blur(wine: np.ndarray, radius: float, dtype=np.float32) -> np.ndarray:
     wine = np.clip(wine, 0, 255)
     wine_img = Image.fromarray(wine.astype(np.uint8), mode="RGB")
-    wine_img = wine_img.filter(ImageFilter.GaussianBlur(radius=blur_radius))
-    wine = np.asarray(wine_img, dtype=np.float32)
+    wine_img = wine_img.filter(ImageFilter.GaussianBlur(radius=radius))
+    return np.asarray(wine_img, dtype=dtype)
+
+
+def _apply_blur(s: _Scene, wine: np.ndarray) -> np.ndarray:
+    if not s.reduced:
+        return _blur(wine, _blur_radius(s))
+    if s.precision == "fixed":
+        wine >>= FIXED_SHIFT  # abschneiden wie astype(uint8) im exakten Modus
+    # Ergebnis bleibt uint8 (statt float32), die Kreismaske rechnet kanalweise
+    return _blur(wine, _blur_radius(s), dtype=np.uint8)
+
+
+def _apply_mask(s: _Scene, wine: np.ndarray, out: np.ndarray, region: tuple = None) -> None:
+    """
+    Äußeren Ring reparieren und Kreismaske über den Hintergrund legen (Ergebnis nach ``out``, uint8).
 
-    # === Äußeren Ring reparieren (Blur blutet Ringfarben nach außen) ===
-    # Bei t > 0.85 mit sauberer Basis-Farbe ersetzen, sanft überblenden
-    if not is_red_wine and not is_rose:
+    Mit ``region`` (Slices für y, x) sind ``wine`` und ``out`` nur dieser Ausschnitt.
+    """
+    if s.reduced:
+        _apply_mask_lut(s, wine, out)
+        return
+    out[...] = np.clip(_mask_blend(s, wine, s.t if region is None else s.t[region]), 0, 255)
+
+
+def _mask_blend(s: _Scene, wine: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """Äußerer Ring und Kreismaske für Radien ``t`` (ungeclippt)."""
+
+    # Blur blutet Ringfarben nach außen: bei t > 0.85 mit sauberer Basis-Farbe ersetzen, sanft überblenden
+    if not s.is_red_wine and not s.is_rose:
         # Berechne saubere Außenfarbe (Layer 1 ohne Ringe)
         outer_brightness = 1.05 + 0.02 * (np.clip(t, 0, 1) ** 0.5)
-        clean_outer = base_rgb[None, None, :] * outer_brightness[..., None]
+        clean_outer = s.base_rgb * outer_brightness[..., None]
         clean_outer = np.clip(clean_outer, 0, 255)
-        
+
         # Überblendung: ab t=0.85 sanft zur sauberen Farbe
         outer_blend = np.clip((t - 0.85) / 0.08, 0, 1)[..., None]
         wine = wine * (1 - outer_blend) + clean_outer * outer_blend
@@ -414,255 +486,208 @@ def generate_wine_png(
     edge_end = 1.08
     circle_alpha = np.clip((edge_end - t) / (edge_end - edge_start), 0, 1)
     circle_alpha = circle_alpha ** 0.6
-    
-    img = bg_color[None, None, :] * (1 - circle_alpha[..., None]) + wine * circle_alpha[..., None]
 
-    # Speichern
-    pil = Image.fromarray(np.clip(img, 0, 255).astype(np.uint8), mode="RGB")
+    bg_color = np.array(BG_COLOR, dtype=np.float32)
+    return bg_color * (1 - circle_alpha[..., None]) + wine * circle_alpha[..., None]
+
+
+def _apply_mask_lut(s: _Scene, wine: np.ndarray, out: np.ndarray) -> None:
+    """Kreismaske in reduzierter Genauigkeit: ebenfalls affin in ``wine``, Koeffizienten als Tabelle."""
+    n = len(s.t_grid)
+    offset = _mask_blend(s, np.zeros((n, 3)), s.t_grid)
+    gain = _mask_blend(s, np.full((n, 3), 255.0), s.t_grid) - offset
+    gain /= 255.0
+    for c in range(3):
+        if s.precision == "float16":
+            img = wine[..., c] * s.lookup(gain[:, c], np.float16) + s.lookup(offset[:, c], np.float16)
+            out[..., c] = np.clip(img, 0, 255)
+        else:
+            # Q0.16; wie beim Zuweisen an uint8 im exakten Modus wird abgeschnitten
+            img = wine[..., c].astype(np.uint32) * s.lookup(np.rint(gain[:, c] * (1 << 16)), np.uint32)
+            img += s.lookup(np.rint(offset[:, c] * (1 << 16)), np.uint32)
+            out[..., c] = np.minimum(img >> 16, 255)
+
+
+def _overlays(s: _Scene, ring_labels: bool) -> list:
+    overlays = []
+    if s.residual_sugar > 0:
+        overlays.append(SugarBar(s.residual_sugar))
+    if ring_labels:
+        visible = [
+            (name, center) for (name, center, *_), intensity in zip(RING_DEFINITIONS, s.intensities)
+            if intensity >= 0.2
+        ]
+        overlays.append(RingLabels(visible, s.max_r))
+    return overlays
+
+
+def effective_precision(size: int, precision: str = None) -> str:
+    """Genauigkeit, mit der render_wine_image in dieser Größe tatsächlich rechnet."""
+    if precision is not None:
+        return precision
+    return DEFAULT_PRECISION if size >= REDUCED_MIN_SIZE else "exact"
+
+
+def render_wine_image(viz: dict, size: int = 512, ring_labels: bool = False,
+                      precision: str = None) -> Image.Image:
+    """Weinvisualisierung mit 3-Schicht-System als PIL-Bild:
     
-    # Restzucker-Balken hinzufügen (rechter Rand)
-    if residual_sugar > 0:
-        pil = draw_residual_sugar_bar(pil, residual_sugar)
+    Layer 1: Weinfarben-Basis mit radialem Gradient
+    Layer 2: Charakteristische farbige Ringe (zeigen Ausprägung)
+    Layer 3: Textur-Elemente wie Sterne für Spritzigkeit
     
-    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    pil.save(out_path, format="PNG")
+    Danach Blur und Kreismaske, direkt in die Leinwand mit den Overlays
+    (Restzucker-Balken am rechten Rand, optional Ring-Beschriftung).
+
+    ``precision`` (Standard: WINE_RENDER_PRECISION ab REDUCED_MIN_SIZE, sonst
+    "exact") wählt die Rechengenauigkeit, siehe PRECISIONS und effective_precision.
+    """
+    with span("imagegen.setup"):
+        scene = _Scene(viz, size, effective_precision(size, precision))
+    with span("imagegen.base"):
+        wine = _layer_base(scene)
+    with span("imagegen.rings"):
+        wine = _layer_rings(scene, wine)
+    with span("imagegen.texture"):
+        wine = _layer_texture(scene, wine)
+    with span("imagegen.blur"):
+        wine = _apply_blur(scene, wine)
+    canvas = Compositor(scene.w, scene.h, _overlays(scene, ring_labels))
+    with span("imagegen.mask"):
+        _apply_mask(scene, wine, canvas.disc)
+    with span("imagegen.overlays"):
+        return canvas.finish()
+
+
+def generate_wine_png(
+    viz: dict,
+    size: int = 1024,
+    out_path: str = "wine_test.png",
+    precision: str = None,
+):
+    """Rendert die Weinvisualisierung und speichert sie als PNG-Datei."""
+    with span("imagegen.render"):
+        pil = render_wine_image(viz, size, precision=precision)
+        Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+        with span("imagegen.encode"):
+            pil.save(out_path, format="PNG")
     print(f"saved {out_path}")
 
 
 def generate_wine_png_bytes(
     viz: dict,
     size: int = 512,
+    precision: str = None,
 ) -> bytes:
     """Generiert ein PNG als Bytes (für API-Response)."""
-    import io
-    
-    # Temporärer Pfad nicht nötig - wir generieren direkt in Memory
-    # Kopiere die Logik von generate_wine_png, aber speichere in BytesIO
-    
-    # zentrale Weinfarbe
-    base_hex = viz.get("base_color_hex") or "#F6F2AF"
-    base_rgb = np.array(hex_to_rgb(base_hex), dtype=np.float32)
-
-    w = h = size
-    cx, cy = w / 2.0, h / 2.0
-    max_r = min(cx, cy) * 0.95
-
-    bg_color = np.array([252.0, 252.0, 254.0], dtype=np.float32)
-
-    yy, xx = np.mgrid[0:h, 0:w]
-    dx = xx - cx
-    dy = yy - cy
-    r = np.sqrt(dx * dx + dy * dy)
-    t = r / max_r
-    angles = np.arctan2(dy, dx)
-
-    rng = np.random.default_rng(42)
-
-    def _f(name: str, default: float = 0.0) -> float:
-        v = viz.get(name)
-        try:
-            return float(v) if v is not None else default
-        except (TypeError, ValueError):
-            return default
-
-    oak = _f("oak_intensity")
-    mineral = _f("mineral_intensity")
-    acidity = _f("acidity", 0.5)
-    herbs = _f("herbal_intensity")
-    spice = _f("spice_intensity")
-    fruit_citrus = _f("fruit_citrus")
-    fruit_stone = _f("fruit_stone")
-    fruit_tropical = _f("fruit_tropical")
-    fruit_red = _f("fruit_red")
-    fruit_dark = _f("fruit_dark")
-    body = _f("body", 0.5)
-    depth = _f("depth", 0.5)
-    effervescence = _f("effervescence", 0.0)
-    residual_sugar = _f("residual_sugar", 0.0)
-    wine_type = viz.get("wine_type", "auto")
-
-    # LAYER 1
-    base_brightness = np.mean(base_rgb) / 255.0
-    
-    if wine_type == "red":
-        is_red_wine = True
-        is_rose = False
-    elif wine_type == "rose":
-        is_red_wine = False
-        is_rose = True
-    elif wine_type == "white":
-        is_red_wine = False
-        is_rose = False
-    else:
-        is_red_wine = base_brightness < 0.5
-        is_rose = (0.5 <= base_brightness < 0.7) and (base_rgb[0] > base_rgb[1] + 30) and (base_rgb[1] < 160)
-    
-    wine = np.ones((h, w, 3), dtype=np.float32) * base_rgb[None, None, :]
+    return generate_wine_image_bytes(viz, size, fmt="png", precision=precision)
 
-    if is_red_wine:
-        brightness = 0.5 + 0.6 * (t ** 0.7)
-        warmth = t ** 0.8
-        wine[..., 0] = wine[..., 0] + warmth * 25
-        wine[..., 1] = wine[..., 1] + warmth * 15
-    elif is_rose:
-        brightness = 0.6 + 0.5 * (t ** 0.5) - 0.3 * (np.clip(1-t, 0, 1) ** 1.2)
-        warmth = t ** 0.9
-        wine[..., 0] = wine[..., 0] + warmth * 15
-    else:
-        brightness = 1.05 + 0.02 * (np.clip(t, 0, 1) ** 0.5) - 0.10 * (np.clip(1-t, 0, 1) ** 1.2)
-        center_weight = (1 - t) ** 1.8
-        wine[..., 1] = wine[..., 1] - center_weight * 20
-        wine[..., 2] = wine[..., 2] - center_weight * 35
-    
-    wine = wine * np.clip(brightness, 0.3, 1.5)[..., None]
 
-    radial_lines = np.sin(angles * 80 + t * 20) * 0.5 + 0.5
-    texture_strength = 0.03 * (1 - t * 0.5)
-    wine = wine * (1 + (radial_lines - 0.5)[..., None] * texture_strength[..., None])
+def generate_wine_image_bytes(
+    viz: dict,
+    size: int = 512,
+    fmt: str = None,
+    precision: str = None,
+    **options,
+) -> bytes:
+    """
+    Generiert das Bild im gewünschten Format (Standard: WINE_IMAGE_FORMAT).
 
-    noise = rng.normal(0, 1, (h, w)).astype(np.float32)
-    noise = noise / (np.abs(noise).max() + 1e-6)
-    wine = wine * (1 + noise[..., None] * 0.015)
+    ``precision`` siehe render_wine_image; ``options`` gehen an
+    image_encoding.encode_image (compress_level, strategy, quality, palette).
+    """
+    from image_encoding import encode_image
 
-    # LAYER 2: Ringe
-    RING_DEFINITIONS = [
-        ("Holz/Fass",    0.78, 0.06, (140, 90, 50),   oak),
-        ("Mineralität",  0.72, 0.06, (130, 140, 150), mineral),
-        ("Säure",        0.66, 0.06, (160, 200, 120), acidity),
-        ("Kräuter",      0.60, 0.06, (70, 120, 70),   herbs),
-        ("Würze",        0.54, 0.06, (170, 100, 45),  spice),
-        ("Zitrus",       0.48, 0.05, (240, 220, 70),  fruit_citrus),
-        ("Steinobst",    0.42, 0.05, (240, 170, 90),  fruit_stone),
-        ("Tropisch",     0.36, 0.05, (240, 200, 55),  fruit_tropical),
-        ("Rotfrucht",    0.30, 0.05, (200, 60, 60),   fruit_red),
-        ("Dunkelfrucht", 0.24, 0.05, (80, 35, 80),    fruit_dark),
-        ("Körper",       0.18, 0.06, (140, 70, 45),   body),
-        ("Tiefe",        0.12, 0.08, None,            depth),
-    ]
-    
-    for name, center, width, ring_color, intensity in RING_DEFINITIONS:
-        if intensity < 0.2:
-            continue
-        sigma = width * 0.5
-        dist = np.abs(t - center)
-        ring_weight = np.exp(-0.5 * (dist / sigma) ** 2)
-        ring_weight = ring_weight * np.clip((0.82 - t) / 0.10, 0, 1)
-        ring_opacity = ring_weight * (0.08 + intensity * 0.27)
-        
-        if ring_color is None:
-            wine = wine * (1 - ring_opacity[..., None] * 0.4)
-        else:
-            color = np.array(ring_color, dtype=np.float32)
-            if is_red_wine:
-                color = np.clip(color * 1.3 + 30, 0, 255)
-            else:
-                color = np.clip(color * 0.9, 0, 255)
-            wine = wine * (1 - ring_opacity[..., None]) + color[None, None, :] * ring_opacity[..., None]
+    with span("imagegen.render"):
+        pil = render_wine_image(viz, size, precision=precision)
+        with span("imagegen.encode"):
+            return encode_image(pil, fmt, **options)
 
-    # LAYER 3: Textur-Elemente
-    n_dots = int(size * size * 0.0003)
-    for _ in range(n_dots):
-        angle = rng.uniform(0, 2 * np.pi)
-        radius = rng.uniform(0.2, 0.85) * max_r
-        x = int(cx + radius * np.cos(angle))
-        y = int(cy + radius * np.sin(angle))
-        if 0 <= x < w and 0 <= y < h:
-            current = wine[y, x]
-            if is_red_wine:
-                dot_color = current * 1.2
-            else:
-                dot_color = np.array([160, 195, 210], dtype=np.float32)
-            dot_size = rng.integers(1, 2)
-            opacity = rng.uniform(0.1, 0.25)
-            for ddx in range(-dot_size, dot_size + 1):
-                for ddy in range(-dot_size, dot_size + 1):
-                    if ddx*ddx + ddy*ddy <= dot_size*dot_size:
-                        px, py = x + ddx, y + ddy
-                        if 0 <= px < w and 0 <= py < h:
-                            wine[py, px] = wine[py, px] * (1 - opacity) + dot_color * opacity
 
-    # Sparkles für Spritzigkeit
-    if effervescence > 0.1:
-        n_bubbles = int(effervescence * 400 * (size / 512))
-        for _ in range(n_bubbles):
-            angle = rng.uniform(0, 2 * np.pi)
-            radius = rng.beta(2, 1.5) * 0.85 * max_r
-            bx = int(cx + radius * np.cos(angle))
-            by = int(cy + radius * np.sin(angle))
-            if not (0 <= bx < w and 0 <= by < h):
-                continue
-            base_size = int(3 + effervescence * 4)
-            bubble_size = rng.integers(base_size - 2, base_size + 3)
-            if rng.random() < 0.5:
-                n_arms = 4 if rng.random() < 0.6 else 6
-                arm_length = bubble_size + rng.integers(2, 6)
-                for arm_i in range(n_arms):
-                    arm_angle = (2 * np.pi * arm_i / n_arms) + rng.uniform(-0.15, 0.15)
-                    for d in range(arm_length):
-                        px = int(bx + d * np.cos(arm_angle))
-                        py = int(by + d * np.sin(arm_angle))
-                        if 0 <= px < w and 0 <= py < h:
-                            falloff = 1.0 - (d / arm_length) * 0.6
-                            opacity = 0.8 * falloff * effervescence
-                            star_color = np.array([255, 255, 250], dtype=np.float32)
-                            wine[py, px] = wine[py, px] * (1 - opacity) + star_color * opacity
-                for ddx in range(-2, 3):
-                    for ddy in range(-2, 3):
-                        if ddx*ddx + ddy*ddy <= 4:
-                            px, py = bx + ddx, by + ddy
-                            if 0 <= px < w and 0 <= py < h:
-                                wine[py, px] = wine[py, px] * 0.2 + np.array([255, 255, 252]) * 0.8
-            else:
-                for ddx in range(-bubble_size-2, bubble_size+3):
-                    for ddy in range(-bubble_size-2, bubble_size+3):
-                        dist_sq = ddx*ddx + ddy*ddy
-                        if dist_sq <= (bubble_size+2)**2:
-                            px, py = bx + ddx, by + ddy
-                            if 0 <= px < w and 0 <= py < h:
-                                is_highlight = (ddx < 0 and ddy < 0 and dist_sq > (bubble_size-2)**2)
-                                if is_highlight:
-                                    opacity = 0.85 * effervescence
-                                    bubble_color = np.array([255, 255, 255], dtype=np.float32)
-                                elif dist_sq <= bubble_size**2:
-                                    opacity = 0.4 * effervescence
-                                    bubble_color = np.clip(wine[py, px] * 1.3 + 30, 0, 255)
-                                else:
-                                    continue
-                                wine[py, px] = wine[py, px] * (1 - opacity) + bubble_color * opacity
-
-    # Blur
-    blur_radius = size * 0.008 if effervescence < 0.3 else size * 0.004
-    wine = np.clip(wine, 0, 255)
-    wine_img = Image.fromarray(wine.astype(np.uint8), mode="RGB")
-    wine_img = wine_img.filter(ImageFilter.GaussianBlur(radius=blur_radius))
-    wine = np.asarray(wine_img, dtype=np.float32)
+# ─────────────────────────────────────────────────────────────────────────────
+# Versionierung
+# ─────────────────────────────────────────────────────────────────────────────
 
-    # Äußeren Ring bei Weißwein reparieren
-    if not is_red_wine and not is_rose:
-        outer_brightness = 1.05 + 0.02 * (np.clip(t, 0, 1) ** 0.5)
-        clean_outer = base_rgb[None, None, :] * outer_brightness[..., None]
-        clean_outer = np.clip(clean_outer, 0, 255)
-        outer_blend = np.clip((t - 0.85) / 0.08, 0, 1)[..., None]
-        wine = wine * (1 - outer_blend) + clean_outer * outer_blend
+# Stützstellen für die Signaturen, etwas über den Rand der Scheibe hinaus
+_SIGNATURE_T = np.linspace(0.0, 1.2, 1201)
 
-    # Kreismaske
-    edge_start = 0.90
-    edge_end = 1.08
-    circle_alpha = np.clip((edge_end - t) / (edge_end - edge_start), 0, 1)
-    circle_alpha = circle_alpha ** 0.6
-    
-    img = bg_color[None, None, :] * (1 - circle_alpha[..., None]) + wine * circle_alpha[..., None]
 
-    # In Bytes speichern
-    pil = Image.fromarray(np.clip(img, 0, 255).astype(np.uint8), mode="RGB")
-    
-    # Restzucker-Balken hinzufügen (rechter Rand)
-    if residual_sugar > 0:
-        pil = draw_residual_sugar_bar(pil, residual_sugar)
-    
-    buffer = io.BytesIO()
-    pil.save(buffer, format="PNG")
-    return buffer.getvalue()
+def _wine_branch(s: _Scene) -> str:
+    return "red" if s.is_red_wine else "rose" if s.is_rose else "white"
+
+
+def _signature(*arrays: np.ndarray) -> str:
+    # Gerundet, damit Rundungsunterschiede zwischen numpy-Versionen keine Neu-Renderings auslösen
+    digest = hashlib.sha1()
+    for a in arrays:
+        digest.update(np.round(np.nan_to_num(np.asarray(a, dtype=np.float64)), 3).tobytes())
+    return digest.hexdigest()[:12]
+
+
+@lru_cache(maxsize=None)
+def _branch_signature(branch: str) -> str:
+    """Layer-1-Verlauf und Kreismaske eines Weintyp-Zweigs, ausgewertet für Weinfarbe 0 und 255."""
+    n = len(_SIGNATURE_T)
+    probes = []
+    for hex_color in ("#000000", "#FFFFFF"):
+        s = _Scene({"base_color_hex": hex_color, "wine_type": branch}, 2)
+        with np.errstate(invalid="ignore"):  # Weißwein: NaN außerhalb der Scheibe
+            probes.append(_base_profile(s, _SIGNATURE_T))
+        probes.append(_mask_blend(s, np.zeros((n, 3)), _SIGNATURE_T))
+        probes.append(_mask_blend(s, np.full((n, 3), 255.0), _SIGNATURE_T))
+    return _signature(*probes)
+
+
+@lru_cache(maxsize=None)
+def _ring_signature(branch: str, index: int) -> str:
+    """Ein Ring allein (Definition und Mischung im Zweig), für die Intensitäten 0.2 und 1."""
+    n = len(_SIGNATURE_T)
+    key = RING_DEFINITIONS[index][4]
+    probes = []
+    for intensity in (0.2, 1.0):
+        viz = {k: 0.0 for *_, k, _ in RING_DEFINITIONS}
+        viz.update({key: intensity, "wine_type": branch})
+        s = _Scene(viz, 2)
+        offset = _layer_rings(s, np.zeros((n, 3)), _SIGNATURE_T)
+        probes += [offset, _layer_rings(s, np.full((n, 3), 255.0), _SIGNATURE_T) - offset]
+    return _signature(*probes)
+
+
+def render_fingerprint(viz: dict, precision: str = "exact") -> str:
+    """
+    Fingerprint der Renderer-Teile, von denen das Bild zu ``viz`` abhängt.
+
+    Enthält den Weintyp-Zweig mit seinem Layer-1-Verlauf und seiner Maske,
+    jeden sichtbaren Ring (Definition und Mischung) sowie die Versionen der
+    optionalen Teile (Bläschen, Restzucker-Balken). Ändert sich z.B. die
+    Farbe eines Rings, ändert sich der Fingerprint nur bei Profilen, in denen
+    dieser Ring sichtbar ist. Der Fingerprint ist unabhängig von der Bildgröße;
+    reduzierte Genauigkeiten (``precision``) ergeben einen anderen Fingerprint
+    als "exact".
+    """
+    s = _Scene(viz, 2)
+    branch = _wine_branch(s)
+    parts = [branch, _branch_signature(branch)]
+    for index, intensity in enumerate(s.intensities):
+        if intensity >= 0.2:
+            parts.append(f"{index}:{_ring_signature(branch, index)}")
+    if s.effervescence > 0.1:
+        parts.append(f"bubbles:{COMPONENT_VERSIONS['bubbles']}")
+    if s.residual_sugar > 0:
+        parts.append(f"sugar_bar:{COMPONENT_VERSIONS['sugar_bar']}")
+    if precision != "exact":
+        parts.append(f"precision:{precision}")
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def render_info(viz: dict, size: int, precision: str = None) -> tuple[int, str]:
+    """
+    (RENDERER_VERSION, render_fingerprint) – wird mit dem Bild gespeichert.
+
+    ``size`` und ``precision`` wie beim Rendern: der Fingerprint enthält die
+    dabei tatsächlich verwendete Genauigkeit (effective_precision).
+    """
+    return RENDERER_VERSION, render_fingerprint(viz, effective_precision(size, precision))
 
 
 def main():
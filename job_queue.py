@@ -0,0 +1,833 @@
+"""
+Verteilte Job-Queue für Rendering und Textanalyse (SQLite statt Message-Broker).
+
+Die Jobs liegen in der Tabelle ``render_jobs`` in ``evaluations.db``. Damit
+wird das Ergebnis eines Jobs in derselben Transaktion in ``evaluations``
+geschrieben, in der der Job als erledigt markiert wird – ein Job erzeugt
+höchstens einen Eintrag, auch wenn ein Worker abstürzt oder seine Lease
+verliert und der Job ein zweites Mal läuft.
+
+Ablauf:
+- ``enqueue_many`` legt Jobs an; ``job_key`` ist eindeutig, erneutes
+  Einreihen derselben Arbeit ist ein No-op
+- Worker holen Jobs per ``lease`` (BEGIN IMMEDIATE, also nie doppelt vergeben)
+  und verlängern die Lease per Heartbeat
+- läuft eine Lease ab (Worker tot), geht der Job zurück in die Queue; nach
+  MAX_ATTEMPTS Versuchen bzw. Fehlern mit exponentiellem Backoff wird er
+  als "failed" abgelegt
+- ``complete`` nimmt nur Ergebnisse mit gültiger Lease an
+
+Job-Arten:
+    render    {"description", "size", "format"}  → neuer Eintrag in evaluations
+    rerender  {"evaluation_id", "params", ...}   → ersetzt das Bild eines Eintrags
+    analyze   {"description"}                    → Parameter im Job-Ergebnis (Korpus-Analyse)
+
+Worker laufen direkt auf der Datenbank (gleicher Rechner) oder über die
+HTTP-API (``render_api.py``, Endpunkte unter /jobs) von beliebig vielen Knoten.
+
+Verwendung:
+    python job_queue.py enqueue beschreibungen.txt [--kind analyze]
+    python job_queue.py enqueue-rerender --all --tag 2024-05
+    python job_queue.py enqueue-rerender --stale --tag v2  # nur veraltete (siehe rerender.py)
+    python job_queue.py work [--url http://host:8600] [--processes 8]
+    python job_queue.py status [--watch 2]
+    python job_queue.py retry-failed
+    python job_queue.py results --kind analyze > parameter.jsonl
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import expert_db as db
+
+
+KINDS = ("render", "rerender", "analyze")
+
+# Lease-Dauer in Sekunden; Worker melden sich alle LEASE_SECONDS / 3
+LEASE_SECONDS = float(os.environ.get("WINE_JOB_LEASE", 60))
+HEARTBEAT_INTERVAL = LEASE_SECONDS / 3
+MAX_ATTEMPTS = int(os.environ.get("WINE_JOB_MAX_ATTEMPTS", 3))
+# Wartezeit vor dem nächsten Versuch: RETRY_BASE * 2^(Versuch-1), höchstens RETRY_MAX
+RETRY_BASE = 5.0
+RETRY_MAX = 300.0
+# Pause eines Workers, wenn die Queue leer ist
+POLL_INTERVAL = 1.0
+# Zeitfenster für die Durchsatz-Anzeige
+RATE_WINDOW = 60.0
+
+ENQUEUE_CHUNK = 1000
+_SQL_CHUNK = 500
+
+
+class LeaseLost(Exception):
+    """Die Lease eines Jobs ist abgelaufen oder wurde an einen anderen Worker vergeben."""
+
+
+def _init_tables(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS render_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_key TEXT NOT NULL UNIQUE,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            state TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            available_at REAL NOT NULL,
+            worker TEXT,
+            lease_token TEXT,
+            lease_expires REAL,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            finished_at REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS render_workers (
+            worker TEXT PRIMARY KEY,
+            started_at REAL NOT NULL,
+            heartbeat_at REAL NOT NULL,
+            busy INTEGER NOT NULL DEFAULT 0,
+            processed INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    # Nächster Job: in Index-Reihenfolge lesen statt die ganze Queue zu sortieren
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_render_jobs_next ON render_jobs (state, priority DESC, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_render_jobs_lease ON render_jobs (state, lease_expires)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_render_jobs_token ON render_jobs (lease_token)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_render_jobs_finished ON render_jobs (finished_at)")
+
+
+# Pfad, für den die Tabellen zuletzt angelegt wurden
+_initialized_path: Optional[Path] = None
+
+
+def _connect() -> sqlite3.Connection:
+    """Autocommit-Verbindung; Transaktionen werden explizit mit BEGIN IMMEDIATE geöffnet."""
+    global _initialized_path
+    db.ensure_db()
+    conn = sqlite3.connect(db.DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    if _initialized_path != db.DB_PATH:
+        _init_tables(conn)
+        _initialized_path = db.DB_PATH
+    return conn
+
+
+def job_key(kind: str, payload: Dict[str, Any], tag: str = "") -> str:
+    """Schlüssel aus Art, Inhalt und optionalem Tag (neuer Tag = dieselbe Arbeit erneut einreihen)."""
+    digest = hashlib.sha1(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return f"{kind}:{tag}:{digest[:24]}" if tag else f"{kind}:{digest[:24]}"
+
+
+def _chunks(items: List[Any], size: int = _SQL_CHUNK) -> Iterator[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _upsert_worker(conn: sqlite3.Connection, worker: str, now: float):
+    busy = conn.execute(
+        "SELECT COUNT(*) FROM render_jobs WHERE state = 'leased' AND worker = ?", (worker,)
+    ).fetchone()[0]
+    conn.execute(
+        """INSERT INTO render_workers (worker, started_at, heartbeat_at, busy) VALUES (?, ?, ?, ?)
+           ON CONFLICT(worker) DO UPDATE SET heartbeat_at = excluded.heartbeat_at, busy = excluded.busy""",
+        (worker, now, now, busy)
+    )
+
+
+class JobQueue:
+    """Direkter Zugriff auf die Queue in ``evaluations.db`` (Koordinator, Worker auf demselben Rechner)."""
+
+    def enqueue_many(self, jobs: Iterable[Dict[str, Any]]) -> int:
+        """
+        Reiht Jobs ein: Dicts mit kind, payload und optional job_key, priority, max_attempts.
+
+        Returns:
+            Anzahl neu angelegter Jobs (bereits bekannte job_keys werden übersprungen)
+        """
+        values = []
+        now = time.time()
+        for job in jobs:
+            if job["kind"] not in KINDS:
+                raise ValueError(f"Unbekannte Job-Art: {job['kind']}")
+            values.append((
+                job.get("job_key") or job_key(job["kind"], job["payload"]),
+                job["kind"],
+                json.dumps(job["payload"], ensure_ascii=False),
+                int(job.get("priority", 0)),
+                int(job.get("max_attempts", MAX_ATTEMPTS)),
+                now,
+                now,
+            ))
+        added = 0
+        conn = _connect()
+        for chunk in _chunks(values, ENQUEUE_CHUNK):
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.total_changes
+            conn.executemany(
+                """INSERT OR IGNORE INTO render_jobs
+                   (job_key, kind, payload, priority, max_attempts, available_at, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                chunk
+            )
+            added += conn.total_changes - before
+            conn.execute("COMMIT")
+        conn.close()
+        return added
+
+    def lease(self, worker: str, limit: int = 1, lease_seconds: float = LEASE_SECONDS) -> List[Dict[str, Any]]:
+        """
+        Vergibt bis zu ``limit`` Jobs an ``worker``.
+
+        Abgelaufene Leases werden dabei zurück in die Queue gestellt (bzw. nach
+        dem letzten Versuch als fehlgeschlagen markiert).
+
+        Returns:
+            Dicts mit id, kind, payload, token und attempt
+        """
+        now = time.time()
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                """UPDATE render_jobs SET
+                       state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                       finished_at = CASE WHEN attempts >= max_attempts THEN ? END,
+                       error = 'Lease abgelaufen (' || worker || ')',
+                       lease_token = NULL
+                   WHERE state = 'leased' AND lease_expires < ?""",
+                (now, now)
+            )
+            rows = conn.execute(
+                """SELECT id, kind, payload, attempts FROM render_jobs
+                   WHERE state = 'queued' AND available_at <= ?
+                   ORDER BY priority DESC, id LIMIT ?""",
+                (now, limit)
+            ).fetchall()
+            jobs = []
+            for job_id, kind, payload, attempts in rows:
+                token = uuid.uuid4().hex
+                conn.execute(
+                    """UPDATE render_jobs SET state = 'leased', worker = ?, lease_token = ?,
+                           lease_expires = ?, attempts = attempts + 1
+                       WHERE id = ?""",
+                    (worker, token, now + lease_seconds, job_id)
+                )
+                jobs.append({"id": job_id, "kind": kind, "payload": json.loads(payload),
+                             "token": token, "attempt": attempts + 1})
+            _upsert_worker(conn, worker, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return jobs
+
+    def heartbeat(self, worker: str, tokens: List[str], lease_seconds: float = LEASE_SECONDS) -> List[str]:
+        """
+        Verlängert die Leases von ``worker`` und meldet ihn als aktiv.
+
+        Returns:
+            Die Tokens, deren Lease noch gilt (alle anderen hat der Worker verloren)
+        """
+        now = time.time()
+        active = []
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for chunk in _chunks(tokens):
+                marks = ",".join("?" * len(chunk))
+                conn.execute(
+                    f"""UPDATE render_jobs SET lease_expires = ?
+                        WHERE lease_token IN ({marks}) AND state = 'leased'""",
+                    [now + lease_seconds] + chunk
+                )
+                active += [row[0] for row in conn.execute(
+                    f"SELECT lease_token FROM render_jobs WHERE lease_token IN ({marks}) AND state = 'leased'",
+                    chunk
+                )]
+            _upsert_worker(conn, worker, now)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return active
+
+    def complete(self, token: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Schreibt das Ergebnis eines Jobs und markiert ihn als erledigt (eine Transaktion).
+
+        Args:
+            token: Lease-Token aus ``lease``
+            result: Ergebnis von ``execute_job`` (params, image, format)
+
+        Returns:
+            Das gespeicherte Ergebnis (z.B. {"evaluation_id": 17})
+
+        Raises:
+            LeaseLost: Die Lease gilt nicht mehr; es wurde nichts geschrieben
+        """
+        conn = _connect()
+        row = conn.execute(
+            "SELECT kind FROM render_jobs WHERE lease_token = ? AND state = 'leased'", (token,)
+        ).fetchone()
+        conn.close()
+        if row is None:
+            raise LeaseLost(token)
+
+        with db.write_transaction(None if row[0] == "analyze" else "import") as conn:
+            # Zuerst den Job übernehmen: sperrt die Datenbank und prüft die Lease atomar
+            claimed = conn.execute(
+                """UPDATE render_jobs SET state = 'done', finished_at = ?, lease_token = NULL, error = NULL
+                   WHERE lease_token = ? AND state = 'leased'
+                   RETURNING id, kind, payload, worker""",
+                (time.time(), token)
+            ).fetchone()
+            if claimed is None:
+                raise LeaseLost(token)
+            job_id, kind, payload, worker = claimed
+            stored = _apply_result(conn, kind, json.loads(payload), result)
+            conn.execute("UPDATE render_jobs SET result = ? WHERE id = ?",
+                         (json.dumps(stored, ensure_ascii=False), job_id))
+            conn.execute("UPDATE render_workers SET processed = processed + 1 WHERE worker = ?", (worker,))
+        return stored
+
+    def fail(self, token: str, error: str) -> str:
+        """
+        Meldet einen fehlgeschlagenen Versuch.
+
+        Returns:
+            Neuer Zustand: "queued" (nächster Versuch nach Backoff) oder "failed"
+
+        Raises:
+            LeaseLost: Die Lease gilt nicht mehr
+        """
+        now = time.time()
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, attempts, max_attempts, worker FROM render_jobs WHERE lease_token = ? AND state = 'leased'",
+                (token,)
+            ).fetchone()
+            if row is None:
+                raise LeaseLost(token)
+            job_id, attempts, max_attempts, worker = row
+            if attempts >= max_attempts:
+                state = "failed"
+                conn.execute(
+                    """UPDATE render_jobs SET state = 'failed', error = ?, lease_token = NULL, finished_at = ?
+                       WHERE id = ?""",
+                    (error, now, job_id)
+                )
+            else:
+                state = "queued"
+                delay = min(RETRY_MAX, RETRY_BASE * 2 ** (attempts - 1))
+                conn.execute(
+                    """UPDATE render_jobs SET state = 'queued', error = ?, lease_token = NULL, available_at = ?
+                       WHERE id = ?""",
+                    (error, now + delay, job_id)
+                )
+            conn.execute("UPDATE render_workers SET failed = failed + 1 WHERE worker = ?", (worker,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return state
+
+    def release(self, tokens: List[str]) -> int:
+        """Gibt Jobs ohne Ergebnis zurück (z.B. beim Beenden eines Workers); zählt nicht als Versuch."""
+        released = 0
+        conn = _connect()
+        conn.execute("BEGIN IMMEDIATE")
+        for chunk in _chunks(tokens):
+            marks = ",".join("?" * len(chunk))
+            cursor = conn.execute(
+                f"""UPDATE render_jobs SET state = 'queued', lease_token = NULL, attempts = attempts - 1
+                    WHERE lease_token IN ({marks}) AND state = 'leased'""",
+                chunk
+            )
+            released += cursor.rowcount
+        conn.execute("COMMIT")
+        conn.close()
+        return released
+
+    def retry_failed(self, kind: Optional[str] = None) -> int:
+        """Stellt fehlgeschlagene Jobs mit frischen Versuchen zurück in die Queue."""
+        conn = _connect()
+        cursor = conn.execute(
+            """UPDATE render_jobs SET state = 'queued', attempts = 0, available_at = ?, finished_at = NULL
+               WHERE state = 'failed' AND (? IS NULL OR kind = ?)""",
+            (time.time(), kind, kind)
+        )
+        conn.close()
+        return cursor.rowcount
+
+    def purge(self, older_than: float = 7 * 24 * 3600) -> int:
+        """Löscht erledigte Jobs, die älter als ``older_than`` Sekunden sind."""
+        conn = _connect()
+        cursor = conn.execute(
+            "DELETE FROM render_jobs WHERE state = 'done' AND finished_at < ?", (time.time() - older_than,)
+        )
+        conn.close()
+        return cursor.rowcount
+
+    def results(self, kind: Optional[str] = None, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Ergebnisse erledigter Jobs in ID-Reihenfolge (Keyset-Pagination)."""
+        last_id = 0
+        while True:
+            conn = _connect()
+            rows = conn.execute(
+                """SELECT id, kind, payload, result FROM render_jobs
+                   WHERE id > ? AND state = 'done' AND (? IS NULL OR kind = ?)
+                   ORDER BY id LIMIT ?""",
+                (last_id, kind, kind, batch_size)
+            ).fetchall()
+            conn.close()
+            if not rows:
+                return
+            for job_id, job_kind, payload, result in rows:
+                yield {"id": job_id, "kind": job_kind, "payload": json.loads(payload),
+                       "result": json.loads(result) if result else None}
+            last_id = rows[-1][0]
+
+    def stats(self, window: float = RATE_WINDOW, timeline_minutes: int = 30) -> Dict[str, Any]:
+        """
+        Kennzahlen für das Dashboard.
+
+        Returns:
+            Dict mit Anzahl je Zustand, depth (offen + in Arbeit), oldest_queued_s,
+            rate (erledigte Jobs/s im Zeitfenster), eta_s, workers (je Worker Rate,
+            Zähler und ob er sich innerhalb einer Lease-Dauer gemeldet hat) und
+            timeline (erledigte Jobs pro Minute)
+        """
+        now = time.time()
+        conn = _connect()
+        counts = dict(conn.execute("SELECT state, COUNT(*) FROM render_jobs GROUP BY state").fetchall())
+        oldest = conn.execute("SELECT MIN(created_at) FROM render_jobs WHERE state = 'queued'").fetchone()[0]
+        recent = dict(conn.execute(
+            "SELECT worker, COUNT(*) FROM render_jobs WHERE finished_at >= ? AND state = 'done' GROUP BY worker",
+            (now - window,)
+        ).fetchall())
+        workers = conn.execute(
+            """SELECT worker, started_at, heartbeat_at, busy, processed, failed
+               FROM render_workers ORDER BY heartbeat_at DESC"""
+        ).fetchall()
+        timeline = conn.execute(
+            """SELECT CAST(finished_at / 60 AS INTEGER) AS minute, COUNT(*) FROM render_jobs
+               WHERE finished_at >= ? AND state = 'done' GROUP BY minute ORDER BY minute""",
+            (now - timeline_minutes * 60,)
+        ).fetchall()
+        conn.close()
+
+        depth = counts.get("queued", 0) + counts.get("leased", 0)
+        rate = sum(recent.values()) / window
+        return {
+            "queued": counts.get("queued", 0),
+            "leased": counts.get("leased", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "depth": depth,
+            "oldest_queued_s": round(now - oldest, 1) if oldest else None,
+            "rate": round(rate, 2),
+            "eta_s": round(depth / rate) if rate else None,
+            "workers": [
+                {
+                    "worker": worker,
+                    "alive": now - heartbeat_at < LEASE_SECONDS,
+                    "rate": round(recent.get(worker, 0) / window, 2),
+                    "busy": busy,
+                    "processed": processed,
+                    "failed": failed,
+                    "last_seen_s": round(now - heartbeat_at, 1),
+                    "started_at": datetime.fromtimestamp(started_at).isoformat(timespec="seconds"),
+                }
+                for worker, started_at, heartbeat_at, busy, processed, failed in workers
+            ],
+            "timeline": [
+                {"minute": datetime.fromtimestamp(minute * 60).strftime("%H:%M"), "done": done}
+                for minute, done in timeline
+            ],
+        }
+
+
+def _apply_result(conn: sqlite3.Connection, kind: str, payload: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    """Schreibt das Ergebnis in der Transaktion von ``complete``; liefert, was im Job gespeichert wird."""
+    derivatives = (tuple(result["thumbnail"]), result["phash"]) if result.get("thumbnail") else None
+    render_info = tuple(result["render_info"]) if result.get("render_info") else None
+    if kind == "render":
+        new_id = db.insert_visualization(conn, payload["description"], result["params"],
+                                         result["image"], result["format"], derivatives, render_info)
+        return {"evaluation_id": new_id}
+    if kind == "rerender":
+        evaluation_id = payload["evaluation_id"]
+        if not db.replace_image(conn, evaluation_id, result["image"], result["format"], derivatives, render_info):
+            # Eintrag inzwischen gelöscht: Job trotzdem erledigt, nichts zu schreiben
+            return {"evaluation_id": evaluation_id, "missing": True}
+        return {"evaluation_id": evaluation_id}
+    return {"params": result["params"]}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Jobs anlegen
+# ─────────────────────────────────────────────────────────────────────────────
+
+def description_jobs(descriptions: Iterable[str], kind: str = "render", size: Optional[int] = None,
+                     fmt: Optional[str] = None, tag: str = "", priority: int = 0) -> List[Dict[str, Any]]:
+    """Render- oder Analyse-Jobs für Weinbeschreibungen (Format/Größe werden beim Einreihen festgelegt)."""
+    from batch_queue import RENDER_SIZE
+    from image_encoding import IMAGE_FORMAT
+    jobs = []
+    for description in descriptions:
+        payload: Dict[str, Any] = {"description": description}
+        if kind == "render":
+            payload.update(size=size or RENDER_SIZE, format=fmt or IMAGE_FORMAT)
+        jobs.append({"kind": kind, "payload": payload, "job_key": job_key(kind, payload, tag), "priority": priority})
+    return jobs
+
+
+def rerender_jobs(evaluation_ids: Optional[List[int]] = None, size: Optional[int] = None,
+                  fmt: Optional[str] = None, tag: str = "", priority: int = 0,
+                  stale: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Jobs zum Neu-Rendern gespeicherter Einträge (None = alle).
+
+    Die Parameter kommen in den Job, damit Worker auf anderen Knoten die
+    Datenbank nicht lesen müssen. Der Schlüssel hängt nur an ID und Tag.
+    Mit ``stale`` nur Einträge, deren Renderer-Version oder Fingerprint nicht
+    mehr zum aktuellen Code passt (ohne Einträge ohne Version, siehe rerender.py).
+    """
+    from batch_queue import RENDER_SIZE
+    from image_encoding import IMAGE_FORMAT
+    if stale:
+        from rerender import plan
+        rows = plan(include_unversioned=False)
+    elif evaluation_ids is None:
+        rows = ({"id": ev["id"], "viz_params": ev["viz_params"]}
+                for batch in db.iter_evaluations() for ev in batch)
+    else:
+        rows = (row for chunk in _chunks(evaluation_ids) for row in db.get_viz_params(chunk))
+    for row in rows:
+        payload = {"evaluation_id": row["id"], "params": row["viz_params"],
+                   "size": size or RENDER_SIZE, "format": fmt or IMAGE_FORMAT}
+        key = job_key("rerender", {"evaluation_id": row["id"]}, tag)
+        yield {"kind": "rerender", "payload": payload, "job_key": key, "priority": priority}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Worker
+# ─────────────────────────────────────────────────────────────────────────────
+
+def execute_job(kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Läuft im Worker-Prozess: Textanalyse und/oder lokales Rendering, ohne Datenbankzugriff.
+
+    Vorschaubild und Perceptual Hash entstehen hier aus dem gerenderten Bild,
+    damit der Koordinator beim Speichern nichts mehr dekodieren muss.
+    """
+    if kind == "rerender":
+        params = payload["params"]
+    else:
+        from text_analyzer import analyze_wine_description
+        params = analyze_wine_description(payload["description"])
+    if kind == "analyze":
+        return {"params": params}
+    from image_encoding import encode_image
+    from imagegen import render_info, render_wine_image
+    # Archiv-Bilder werden exakt neu gerendert (wie rerender.py), sonst gilt WINE_RENDER_PRECISION
+    precision = "exact" if kind == "rerender" else None
+    img = render_wine_image(params, payload["size"], precision=precision)
+    thumbnail, image_hash = db.image_derivatives(img)
+    return {"params": params, "image": encode_image(img, payload["format"]), "format": payload["format"],
+            "thumbnail": thumbnail, "phash": image_hash,
+            "render_info": render_info(params, payload["size"], precision)}
+
+
+def encode_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Ergebnis für den Versand als JSON (Bilder base64)."""
+    result = dict(result)
+    if "image" in result:
+        result["image"] = base64.b64encode(result["image"]).decode("ascii")
+    if result.get("thumbnail"):
+        thumb, width, height = result["thumbnail"]
+        result["thumbnail"] = [base64.b64encode(thumb).decode("ascii"), width, height]
+    return result
+
+
+def decode_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Gegenstück zu encode_result (im Koordinator)."""
+    result = dict(result)
+    if "image" in result:
+        result["image"] = base64.b64decode(result["image"])
+    if result.get("thumbnail"):
+        thumb, width, height = result["thumbnail"]
+        result["thumbnail"] = (base64.b64decode(thumb), int(width), int(height))
+    return result
+
+
+class RemoteQueue:
+    """Queue über die HTTP-API eines Koordinators (render_api.py) – für Worker auf anderen Knoten."""
+
+    def __init__(self, url: str, timeout: float = 60.0):
+        from urllib.parse import urlsplit
+        parts = urlsplit(url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.timeout = timeout
+
+    def _call(self, method: str, path: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        import http.client
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        conn = cls(self.host, self.port, timeout=self.timeout)
+        try:
+            body = json.dumps(data).encode("utf-8") if data is not None else None
+            conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            payload = json.loads(response.read() or b"{}")
+        finally:
+            conn.close()
+        if response.status == 409:
+            raise LeaseLost(payload.get("error", ""))
+        if response.status >= 400:
+            raise RuntimeError(f"HTTP {response.status}: {payload.get('error')}")
+        return payload
+
+    def enqueue_many(self, jobs: Iterable[Dict[str, Any]]) -> int:
+        added = 0
+        jobs = list(jobs)
+        for chunk in _chunks(jobs, 100):
+            added += self._call("POST", "/jobs", {"jobs": chunk})["added"]
+        return added
+
+    def lease(self, worker: str, limit: int = 1, lease_seconds: float = LEASE_SECONDS) -> List[Dict[str, Any]]:
+        return self._call("POST", "/jobs/lease", {"worker": worker, "limit": limit})["jobs"]
+
+    def heartbeat(self, worker: str, tokens: List[str], lease_seconds: float = LEASE_SECONDS) -> List[str]:
+        return self._call("POST", "/jobs/heartbeat", {"worker": worker, "tokens": tokens})["active"]
+
+    def complete(self, token: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        return self._call("POST", "/jobs/complete", {"token": token, "result": encode_result(result)})["result"]
+
+    def fail(self, token: str, error: str) -> str:
+        return self._call("POST", "/jobs/fail", {"token": token, "error": error})["state"]
+
+    def release(self, tokens: List[str]) -> int:
+        return self._call("POST", "/jobs/release", {"tokens": tokens})["released"]
+
+    def stats(self) -> Dict[str, Any]:
+        return self._call("GET", "/jobs/stats")
+
+
+class Worker:
+    """
+    Holt Jobs aus der Queue und rechnet sie in einem Prozess-Pool.
+
+    Es werden höchstens so viele Jobs geleast, wie Prozesse frei sind; ein
+    Heartbeat-Thread verlängert die Leases. Verlorene Leases werden verworfen
+    (das Ergebnis würde ohnehin abgelehnt), beim Beenden gehen offene Jobs
+    zurück in die Queue.
+    """
+
+    def __init__(self, queue, name: Optional[str] = None, processes: Optional[int] = None):
+        self.queue = queue
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.processes = processes or max(1, (os.cpu_count() or 2) - 1)
+        self.completed = 0
+        self.failed = 0
+        self._held: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def _heartbeat(self):
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            with self._lock:
+                tokens = list(self._held)
+            try:
+                active = set(self.queue.heartbeat(self.name, tokens))
+            except Exception as e:
+                print(f"[job_queue] Heartbeat fehlgeschlagen: {e}")
+                continue
+            with self._lock:
+                for token in tokens:
+                    if token not in active and token in self._held:
+                        print(f"[job_queue] Lease verloren: {token[:8]}")
+                        self._held.pop(token).cancel()
+
+    def _finish(self, token: str, future: Future):
+        try:
+            result = future.result()
+        except Exception as e:
+            state = self.queue.fail(token, f"{type(e).__name__}: {e}")
+            self.failed += 1
+            print(f"[job_queue] Job fehlgeschlagen ({state}): {e}")
+            return
+        self.queue.complete(token, result)
+        self.completed += 1
+
+    def run(self, max_jobs: Optional[int] = None, exit_when_idle: bool = False):
+        """Arbeitet, bis ``stop`` aufgerufen wird (bzw. ``max_jobs`` erledigt oder die Queue leer ist)."""
+        pool = ProcessPoolExecutor(max_workers=self.processes)
+        heartbeat = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        heartbeat.start()
+        print(f"[job_queue] Worker {self.name} mit {self.processes} Prozessen gestartet")
+        try:
+            while not self._stop.is_set():
+                if max_jobs is not None and self.completed + self.failed >= max_jobs:
+                    break
+                with self._lock:
+                    free = self.processes - len(self._held)
+                if max_jobs is not None:
+                    free = min(free, max_jobs - self.completed - self.failed - len(self._held))
+                if free > 0:
+                    try:
+                        jobs = self.queue.lease(self.name, free)
+                    except Exception as e:
+                        print(f"[job_queue] Lease fehlgeschlagen: {e}")
+                        jobs = []
+                    with self._lock:
+                        for job in jobs:
+                            self._held[job["token"]] = pool.submit(execute_job, job["kind"], job["payload"])
+                with self._lock:
+                    held = dict(self._held)
+                if not held:
+                    if exit_when_idle:
+                        break
+                    self._stop.wait(POLL_INTERVAL)
+                    continue
+                done, _ = wait(held.values(), timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for token, future in held.items():
+                    if future not in done:
+                        continue
+                    with self._lock:
+                        if self._held.pop(token, None) is None:
+                            continue  # Lease inzwischen verloren
+                    try:
+                        self._finish(token, future)
+                    except LeaseLost:
+                        print(f"[job_queue] Ergebnis verworfen, Lease verloren: {token[:8]}")
+                    except Exception as e:
+                        print(f"[job_queue] Ergebnis nicht gespeichert: {e}")
+        finally:
+            self._stop.set()
+            with self._lock:
+                tokens = list(self._held)
+                self._held.clear()
+            if tokens:
+                try:
+                    self.queue.release(tokens)
+                except Exception as e:
+                    print(f"[job_queue] Freigeben fehlgeschlagen: {e}")
+            pool.shutdown(wait=False, cancel_futures=True)
+        print(f"[job_queue] Worker {self.name}: {self.completed} erledigt, {self.failed} fehlgeschlagen")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CLI
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _format_stats(stats: Dict[str, Any]) -> str:
+    eta = f", fertig in ~{stats['eta_s']} s" if stats["eta_s"] else ""
+    lines = [
+        f"Queue: {stats['queued']} offen, {stats['leased']} in Arbeit, {stats['done']} erledigt, "
+        f"{stats['failed']} fehlgeschlagen – {stats['rate']} Jobs/s{eta}"
+    ]
+    for w in stats["workers"]:
+        if w["alive"] or w["busy"]:
+            lines.append(f"  {w['worker']:<32} {w['rate']:>6} Jobs/s  {w['busy']:>3} aktiv  "
+                         f"{w['processed']:>7} erledigt  {w['failed']:>4} Fehler")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verteilte Render-Queue")
+    parser.add_argument("--url", default=None, help="Koordinator (render_api.py) statt direktem DB-Zugriff")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_enqueue = sub.add_parser("enqueue", help="Beschreibungen aus einer Datei einreihen (.txt/.csv/.jsonl)")
+    p_enqueue.add_argument("file")
+    p_enqueue.add_argument("--kind", choices=("render", "analyze"), default="render")
+    p_rerender = sub.add_parser("enqueue-rerender", help="Gespeicherte Einträge neu rendern")
+    p_rerender.add_argument("ids", nargs="*", type=int)
+    p_rerender.add_argument("--all", action="store_true")
+    p_rerender.add_argument("--stale", action="store_true", help="Nur Einträge mit veralteter Renderer-Version")
+    for p in (p_enqueue, p_rerender):
+        p.add_argument("--size", type=int, default=None)
+        p.add_argument("--format", default=None)
+        p.add_argument("--tag", default="", help="Neuer Tag = bereits erledigte Arbeit erneut einreihen")
+        p.add_argument("--priority", type=int, default=0)
+    p_work = sub.add_parser("work", help="Worker starten")
+    p_work.add_argument("--processes", type=int, default=None)
+    p_work.add_argument("--name", default=None)
+    p_work.add_argument("--max-jobs", type=int, default=None)
+    p_work.add_argument("--exit-when-idle", action="store_true")
+    p_status = sub.add_parser("status", help="Queue-Tiefe und Durchsatz je Worker")
+    p_status.add_argument("--watch", type=float, default=None, help="alle N Sekunden aktualisieren")
+    p_retry = sub.add_parser("retry-failed", help="Fehlgeschlagene Jobs erneut einreihen")
+    p_retry.add_argument("--kind", choices=KINDS, default=None)
+    p_purge = sub.add_parser("purge", help="Erledigte Jobs löschen")
+    p_purge.add_argument("--days", type=float, default=7)
+    p_results = sub.add_parser("results", help="Ergebnisse als JSONL ausgeben")
+    p_results.add_argument("--kind", choices=KINDS, default=None)
+    args = parser.parse_args()
+
+    queue = RemoteQueue(args.url) if args.url else JobQueue()
+
+    if args.command == "enqueue":
+        from batch_queue import parse_descriptions
+        descriptions = parse_descriptions(Path(args.file).read_bytes(), args.file)
+        jobs = description_jobs(descriptions, args.kind, args.size, args.format, args.tag, args.priority)
+        print(f"[job_queue] {queue.enqueue_many(jobs)} von {len(jobs)} Jobs eingereiht")
+    elif args.command == "enqueue-rerender":
+        if not args.all and not args.ids and not args.stale:
+            parser.error("IDs, --all oder --stale angeben")
+        jobs = list(rerender_jobs(None if args.all else args.ids, args.size, args.format, args.tag, args.priority,
+                                  args.stale))
+        print(f"[job_queue] {queue.enqueue_many(jobs)} von {len(jobs)} Jobs eingereiht")
+    elif args.command == "work":
+        worker = Worker(queue, args.name, args.processes)
+        try:
+            worker.run(args.max_jobs, args.exit_when_idle)
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "status":
+        while True:
+            print(_format_stats(queue.stats()))
+            if args.watch is None:
+                break
+            time.sleep(args.watch)
+    elif args.url:
+        parser.error(f"'{args.command}' nur mit direktem DB-Zugriff")
+    elif args.command == "retry-failed":
+        print(f"[job_queue] {queue.retry_failed(args.kind)} Jobs erneut eingereiht")
+    elif args.command == "purge":
+        print(f"[job_queue] {queue.purge(args.days * 24 * 3600)} erledigte Jobs gelöscht")
+    else:
+        for item in queue.results(args.kind):
+            print(json.dumps(item, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Lasttest für render_api.py.
+
+Mehrere Threads senden über je eine Keep-Alive-Verbindung Requests an die
+API und messen Durchsatz und Latenzen.
+
+Verwendung:
+    python render_api.py --port 8600 &
+    python loadtest_api.py --url http://127.0.0.1:8600 --concurrency 16 --requests 500
+    python loadtest_api.py --endpoint render --distinct       # (fast) jedes Bild neu rendern
+    python loadtest_api.py --endpoint render --revalidate     # If-None-Match → 304
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+
+DESCRIPTIONS = [
+    "Trockener Riesling, hellgelb, Zitrus, grüner Apfel, mineralisch, lebendige Säure.",
+    "Pinot Noir, rubinrot, Kirsche, Himbeere, feine Tannine, Eichenfass.",
+    "Rosé, lachsrosa, Erdbeere, frisch, leicht.",
+    "Trockenbeerenauslese, goldgelb, Honig, Aprikose, 180 g/l Restzucker.",
+    "Champagner, feine Perlage, Brioche, Zitrone, kreidig.",
+]
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class _Worker(threading.Thread):
+    def __init__(self, args, counter, lock):
+        super().__init__(daemon=True)
+        self.args = args
+        self.counter = counter
+        self.lock = lock
+        self.latencies: List[float] = []
+        self.statuses: Dict[int, int] = {}
+        self.errors = 0
+        self.bytes = 0
+        self._etags: Dict[str, str] = {}
+
+    def _next_index(self) -> Optional[int]:
+        with self.lock:
+            if self.counter[0] >= self.args.requests:
+                return None
+            self.counter[0] += 1
+            return self.counter[0]
+
+    def _request(self, index: int):
+        description = DESCRIPTIONS[index % len(DESCRIPTIONS)]
+        if self.args.distinct:
+            description += f" Probe {index}."
+        headers = {"Content-Type": "application/json"}
+        if self.args.endpoint == "analyze":
+            path, payload = "/analyze", {"description": description}
+        elif self.args.endpoint == "ratings":
+            path, payload = "/ratings", {"description": description, "rating": index % 5 + 1}
+        else:
+            path = "/render"
+            # Unterschiedliche Beschreibungen ergeben oft dieselben Parameter – erst die Größe macht jedes Bild neu
+            size = self.args.size + (index % 64 if self.args.distinct else 0)
+            payload = {"description": description, "size": size, "format": self.args.format}
+            if self.args.revalidate and description in self._etags:
+                headers["If-None-Match"] = self._etags[description]
+        return path, json.dumps(payload).encode("utf-8"), headers, description
+
+    def run(self):
+        parts = urlsplit(self.args.url)
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=self.args.timeout)
+        while True:
+            index = self._next_index()
+            if index is None:
+                break
+            path, body, headers, description = self._request(index)
+            start = time.perf_counter()
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                conn.close()
+                continue
+            self.latencies.append(time.perf_counter() - start)
+            self.statuses[response.status] = self.statuses.get(response.status, 0) + 1
+            self.bytes += len(data)
+            etag = response.getheader("ETag")
+            if etag:
+                self._etags[description] = etag
+        conn.close()
+
+
+def run_load_test(args) -> Dict[str, object]:
+    counter, lock = [0], threading.Lock()
+    workers = [_Worker(args, counter, lock) for _ in range(args.concurrency)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(l for w in workers for l in w.latencies)
+    statuses: Dict[int, int] = {}
+    for worker in workers:
+        for status, count in worker.statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    return {
+        "endpoint": args.endpoint,
+        "concurrency": args.concurrency,
+        "requests": len(latencies),
+        "errors": sum(w.errors for w in workers),
+        "status": statuses,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mb_received": round(sum(w.bytes for w in workers) / 1024 / 1024, 2),
+        "latency_ms": {
+            f"p{p}": round(_percentile(latencies, p) * 1000, 1) for p in (50, 90, 99)
+        } | {"max": round((latencies[-1] if latencies else 0.0) * 1000, 1)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lasttest für render_api.py")
+    parser.add_argument("--url", default="http://127.0.0.1:8600")
+    parser.add_argument("--endpoint", choices=["render", "analyze", "ratings"], default="render")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--size", type=int, default=350)
+    parser.add_argument("--format", choices=["png", "webp", "avif", "jpeg", "svg"], default="png")
+    parser.add_argument("--distinct", action="store_true", help="Beschreibung und Bildgröße pro Request variieren (umgeht Render-Cache)")
+    parser.add_argument("--revalidate", action="store_true", help="ETag zurücksenden (If-None-Match)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", action="store_true", help="Ergebnis als JSON ausgeben")
+    args = parser.parse_args()
+
+    result = run_load_test(args)
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"[loadtest] {result['requests']} Requests an /{args.endpoint} in {result['seconds']} s "
+          f"({result['rps']} req/s, {args.concurrency} parallel)")
+    print(f"[loadtest] Status: {result['status']}, Fehler: {result['errors']}, {result['mb_received']} MB")
+    print("[loadtest] Latenz (ms): " + ", ".join(f"{k}={v}" for k, v in result["latency_ms"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Overlays über der Weinscheibe (Restzucker-Balken, Ring-Beschriftung).
+
+Die Leinwand wird vorab in ihrer endgültigen Breite angelegt: Die Scheibe
+wird direkt in den linken Teil geschrieben, Overlays mit eigenem Rand
+(z.B. der Restzucker-Balken) bekommen rechts daneben ihren Streifen. So
+entsteht kein zweites, breiteres Bild, in das die Scheibe kopiert werden muss.
+
+Schriften und (gedrehte) Text-Sprites werden pro Größe bzw. (Text, Größe)
+zwischengespeichert; ein weiteres Overlay kostet nur seine eigene Fläche.
+"""
+import math
+import sys
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+
+BG_COLOR = (252, 252, 254)
+
+# Restzucker-Balken
+SUGAR_BAR_COLOR = (240, 62, 107)   # Pink/Magenta
+SUGAR_BAR_EMPTY = (200, 200, 200)  # Grau über dem Balken
+SUGAR_MIN = 1.0                    # Untergrenze der Log-Skala (g/L)
+SUGAR_MAX = 500.0                  # Obergrenze für 100 %
+
+# Plattformspezifische Font-Pfade
+if sys.platform == "darwin":  # macOS
+    FONT_CANDIDATES = (
+        "/System/Library/Fonts/Helvetica.ttc",
+        "/System/Library/Fonts/SFNSText.ttf",
+    )
+elif sys.platform == "win32":  # Windows
+    FONT_CANDIDATES = (
+        "C:/Windows/Fonts/arial.ttf",
+        "C:/Windows/Fonts/segoeui.ttf",
+        "C:/Windows/Fonts/tahoma.ttf",
+    )
+else:  # Linux und andere
+    FONT_CANDIDATES = (
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+        "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    )
+
+
+@lru_cache(maxsize=64)
+def load_font(size: int) -> ImageFont.ImageFont:
+    """System-Font in der gewünschten Größe, sonst der Pillow-Standardfont."""
+    for font_path in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(font_path, size)
+        except (OSError, IOError):
+            continue
+    return ImageFont.load_default()
+
+
+# Nur zum Ausmessen von Text (textbbox braucht ein Draw-Objekt)
+_MEASURE = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+
+
+@lru_cache(maxsize=256)
+def text_sprite(
+    text: str,
+    font_size: int,
+    fill: Tuple[int, int, int, int] = (255, 255, 255, 255),
+    angle: int = 0,
+) -> Image.Image:
+    """
+    Text als RGBA-Sprite mit 5 px Rand, optional gedreht (gegen den Uhrzeigersinn).
+
+    Das Ergebnis ist gecacht und darf nicht verändert werden.
+    """
+    font = load_font(font_size)
+    left, top, right, bottom = _MEASURE.textbbox((0, 0), text, font=font)
+    sprite = Image.new("RGBA", (right - left + 10, bottom - top + 10), (0, 0, 0, 0))
+    ImageDraw.Draw(sprite).text((5, 5), text, font=font, fill=fill)
+    if angle:
+        sprite = sprite.rotate(angle, expand=True)
+    return sprite
+
+
+class Overlay:
+    """
+    Basisklasse für Overlays.
+
+    ``margin`` reserviert einen Streifen rechts neben der Scheibe, ``paint``
+    füllt Flächen direkt im Pixel-Array (vor der Umwandlung in ein PIL-Bild),
+    ``draw`` setzt Sprites auf das fertige Bild.
+    """
+
+    def margin(self, w: int, h: int) -> int:
+        return 0
+
+    def paint(self, pixels: np.ndarray, x0: int, w: int, h: int):
+        pass
+
+    def draw(self, canvas: Image.Image, x0: int, w: int, h: int):
+        pass
+
+
+class SugarBar(Overlay):
+    """Restzucker-Balken am rechten Rand (logarithmische Skala, Wert als Text)."""
+
+    def __init__(self, residual_sugar: float, bar_width: Optional[int] = None):
+        self.residual_sugar = residual_sugar
+        self.bar_width = bar_width
+
+    def margin(self, w: int, h: int) -> int:
+        if self.bar_width is None:
+            return max(int(w * 0.05), 30)  # 5% der Breite, mindestens 30px
+        return self.bar_width
+
+    def bar_height(self, h: int) -> int:
+        # Skala: 0g → 0%, 9g → ~10%, 50g → ~50%, 500g → 100%
+        if self.residual_sugar <= 0:
+            return 0
+        clamped = max(SUGAR_MIN, min(self.residual_sugar, SUGAR_MAX))
+        ratio = math.log10(clamped) / math.log10(SUGAR_MAX)
+        return int(h * min(1.0, max(0.0, ratio)))
+
+    def paint(self, pixels: np.ndarray, x0: int, w: int, h: int):
+        bar = pixels[:, x0:x0 + self.margin(w, h)]
+        bar_top = h - self.bar_height(h)
+        if bar_top < h:
+            bar[bar_top:] = SUGAR_BAR_COLOR
+        # Grauer Hintergrund über dem Balken, einschließlich der Oberkante
+        if bar_top > 0:
+            bar[:bar_top + 1] = SUGAR_BAR_EMPTY
+
+    def draw(self, canvas: Image.Image, x0: int, w: int, h: int):
+        bar_width = self.margin(w, h)
+        bar_height = self.bar_height(h)
+        # Text vertikal (von unten nach oben lesbar), mittig im Balken
+        sprite = text_sprite(f"{int(self.residual_sugar)} gr RZ", max(int(bar_width * 0.5), 12), angle=90)
+        if bar_height > sprite.height + 10:  # Nur zeichnen wenn genug Platz
+            text_x = x0 + (bar_width - sprite.width) // 2
+            text_y = h - bar_height + (bar_height - sprite.height) // 2
+            canvas.paste(sprite, (text_x, max(0, text_y)), sprite)
+
+
+class RingLabels(Overlay):
+    """Beschriftet die sichtbaren Ringe entlang der senkrechten Achse über dem Zentrum."""
+
+    def __init__(self, rings: Sequence[Tuple[str, float]], max_r: float,
+                 fill: Tuple[int, int, int, int] = (40, 40, 40, 230)):
+        # rings: (Name, Mittelpunkt 0..1 relativ zu max_r)
+        self.rings = list(rings)
+        self.max_r = max_r
+        self.fill = fill
+
+    def draw(self, canvas: Image.Image, x0: int, w: int, h: int):
+        font_size = max(int(w * 0.022), 8)
+        for name, center in self.rings:
+            sprite = text_sprite(name, font_size, self.fill)
+            x = w // 2 - sprite.width // 2
+            y = int(h / 2 - center * self.max_r) - sprite.height // 2
+            canvas.paste(sprite, (x, y), sprite)
+
+
+class Compositor:
+    """
+    Leinwand in Endgröße: links die Scheibe (``disc``), rechts die Ränder der Overlays.
+
+        canvas = Compositor(w, h, [SugarBar(12.0)])
+        canvas.disc[...] = scheibe            # direkt hineinschreiben
+        bild = canvas.finish()
+    """
+
+    def __init__(self, w: int, h: int, overlays: Sequence[Overlay] = ()):
+        self.w, self.h = w, h
+        self.overlays: List[Overlay] = list(overlays)
+        self.offsets: List[int] = []
+        total_w = w
+        for overlay in self.overlays:
+            self.offsets.append(total_w)
+            total_w += overlay.margin(w, h)
+        self.pixels = np.empty((h, total_w, 3), dtype=np.uint8)
+        if total_w > w:
+            self.pixels[:, w:] = BG_COLOR
+
+    @property
+    def disc(self) -> np.ndarray:
+        """Beschreibbare Sicht auf den Bereich der Scheibe."""
+        return self.pixels[:, :self.w]
+
+    def finish(self) -> Image.Image:
+        for overlay, x0 in zip(self.overlays, self.offsets):
+            overlay.paint(self.pixels, x0, self.w, self.h)
+        canvas = Image.fromarray(self.pixels, mode="RGB")
+        for overlay, x0 in zip(self.overlays, self.offsets):
+            overlay.draw(canvas, x0, self.w, self.h)
+        return canvas
@@ -0,0 +1,314 @@
+"""
+Leichtgewichtige Zeitmessung und Tracing.
+
+Abschnitte werden mit ``span("name")`` (Context-Manager) oder ``@timed("name")``
+gemessen und in Histogrammen gesammelt. Verschachtelte Spans im selben Thread
+bilden einen Trace; die letzten Traces bleiben für Auswertungen im Speicher.
+
+Ausgeschaltet (Standard) kostet ein Span nur einen Funktionsaufruf und eine
+Abfrage eines Flags. Einschalten mit ``WINE_PERF=1`` oder ``perf.enable()``.
+
+Ausgabe:
+    perf.render_prometheus()          Prometheus-Textformat (z.B. GET /metrics in render_api)
+    python perf.py run "Beschreibung" Beispiel-Durchlauf mit Tabelle und Trace
+    WINE_PERF_DUMP=perf.json          Snapshot beim Beenden des Prozesses schreiben
+"""
+import atexit
+import bisect
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+
+# Obergrenzen der Histogramm-Buckets in Sekunden
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Anzahl vollständiger Traces, die behalten werden
+TRACE_BUFFER = 50
+
+_enabled = os.environ.get("WINE_PERF", "").lower() in ("1", "true", "yes", "on")
+
+
+class Histogram:
+    """Thread-sicheres Histogramm mit festen Buckets."""
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # letzter Eintrag: +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Schätzt ein Quantil (obere Bucket-Grenze, auf das Maximum begrenzt)."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            target = q * self.count
+            seen = 0
+            for bound, count in zip(self.buckets, self.counts):
+                seen += count
+                if seen >= target:
+                    return min(bound, self.max)
+            return self.max
+
+
+_histograms: Dict[str, Histogram] = {}
+_counters: Dict[str, int] = {}
+_registry_lock = threading.Lock()
+_traces: deque = deque(maxlen=TRACE_BUFFER)
+_current: contextvars.ContextVar = contextvars.ContextVar("perf_span", default=None)
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    """Verwirft alle gesammelten Messwerte."""
+    with _registry_lock:
+        _histograms.clear()
+        _counters.clear()
+        _traces.clear()
+
+
+def _histogram(name: str) -> Histogram:
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _registry_lock:
+            histogram = _histograms.setdefault(name, Histogram())
+    return histogram
+
+
+def observe(name: str, seconds: float):
+    """Trägt eine extern gemessene Dauer ein."""
+    if _enabled:
+        _histogram(name).observe(seconds)
+
+
+def count(name: str, amount: int = 1):
+    """Erhöht einen Zähler (z.B. Cache-Treffer)."""
+    if _enabled:
+        with _registry_lock:
+            _counters[name] = _counters.get(name, 0) + amount
+
+
+class _Span:
+    __slots__ = ("name", "start", "duration", "children", "_token")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.children: List["_Span"] = []
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is not None:
+            parent.children.append(self)
+        self._token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.duration = time.perf_counter() - self.start
+        _current.reset(self._token)
+        _histogram(self.name).observe(self.duration)
+        if _current.get() is None:
+            _traces.append(self)
+        return False
+
+    def to_dict(self, origin: Optional[float] = None) -> Dict[str, Any]:
+        origin = self.start if origin is None else origin
+        return {
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "children": [c.to_dict(origin) for c in self.children if hasattr(c, "duration")],
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str):
+    """Context-Manager, der die Dauer des Blocks unter ``name`` erfasst."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name)
+
+
+def timed(name: str) -> Callable:
+    """Decorator-Variante von span()."""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Auswertung
+# ─────────────────────────────────────────────────────────────────────────────
+
+def snapshot() -> Dict[str, Any]:
+    """Aktuelle Messwerte als Dict (Zeiten in Millisekunden)."""
+    with _registry_lock:
+        histograms = dict(_histograms)
+        counters = dict(_counters)
+    spans = {}
+    for name, h in sorted(histograms.items()):
+        spans[name] = {
+            "count": h.count,
+            "total_ms": round(h.sum * 1000, 3),
+            "mean_ms": round(h.sum / h.count * 1000, 3) if h.count else 0.0,
+            "p50_ms": round(h.quantile(0.5) * 1000, 3),
+            "p95_ms": round(h.quantile(0.95) * 1000, 3),
+            "max_ms": round(h.max * 1000, 3),
+        }
+    return {"spans": spans, "counters": counters}
+
+
+def recent_traces(limit: int = 10) -> List[Dict[str, Any]]:
+    """Die letzten abgeschlossenen Traces (neueste zuletzt)."""
+    return [s.to_dict() for s in list(_traces)[-limit:]]
+
+
+def flatten(trace: Dict[str, Any]) -> List[tuple]:
+    """Alle Spans eines Traces als (name, Sekunden)-Paare, z.B. zur Übergabe aus einem Worker-Prozess."""
+    pairs = [(trace["name"], trace["duration_ms"] / 1000)]
+    for child in trace["children"]:
+        pairs.extend(flatten(child))
+    return pairs
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render_prometheus(prefix: str = "wine") -> str:
+    """Messwerte im Prometheus-Textformat (Version 0.0.4)."""
+    with _registry_lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+    lines = [
+        f"# HELP {prefix}_span_seconds Dauer instrumentierter Abschnitte",
+        f"# TYPE {prefix}_span_seconds histogram",
+    ]
+    for name, h in histograms:
+        with h._lock:
+            counts, total, n = list(h.counts), h.sum, h.count
+        cumulative = 0
+        label = _label(name)
+        for bound, c in zip(h.buckets, counts):
+            cumulative += c
+            lines.append(f'{prefix}_span_seconds_bucket{{span="{label}",le="{bound}"}} {cumulative}')
+        lines.append(f'{prefix}_span_seconds_bucket{{span="{label}",le="+Inf"}} {n}')
+        lines.append(f'{prefix}_span_seconds_sum{{span="{label}"}} {total:.6f}')
+        lines.append(f'{prefix}_span_seconds_count{{span="{label}"}} {n}')
+    lines.append(f"# HELP {prefix}_events_total Zähler für Ereignisse")
+    lines.append(f"# TYPE {prefix}_events_total counter")
+    for name, value in counters:
+        lines.append(f'{prefix}_events_total{{event="{_label(name)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def format_table() -> str:
+    """Kompakte Tabelle für die Konsole."""
+    data = snapshot()
+    rows = [f"{'Span':<28} {'n':>6} {'mean ms':>10} {'p95 ms':>10} {'max ms':>10} {'total ms':>11}"]
+    for name, s in data["spans"].items():
+        rows.append(f"{name:<28} {s['count']:>6} {s['mean_ms']:>10.2f} {s['p95_ms']:>10.2f} "
+                    f"{s['max_ms']:>10.2f} {s['total_ms']:>11.2f}")
+    for name, value in data["counters"].items():
+        rows.append(f"{name:<28} {value:>6}")
+    return "\n".join(rows)
+
+
+def format_trace(trace: Dict[str, Any], indent: int = 0) -> str:
+    line = f"{'  ' * indent}{trace['name']:<{30 - 2 * indent}} +{trace['offset_ms']:>9.2f} ms {trace['duration_ms']:>9.2f} ms"
+    return "\n".join([line] + [format_trace(c, indent + 1) for c in trace["children"]])
+
+
+def _dump_at_exit():
+    path = os.environ.get("WINE_PERF_DUMP")
+    if path and _histograms:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(snapshot(), f, indent=2)
+
+
+atexit.register(_dump_at_exit)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Zeitmessung für Analyse und Rendering")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Beschreibung analysieren und rendern, Messwerte ausgeben")
+    run.add_argument("description", nargs="?", default="Trockener Riesling, Zitrus, mineralisch, lebendige Säure.")
+    run.add_argument("--size", type=int, default=350)
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--format", choices=["table", "json", "prometheus"], default="table")
+    args = parser.parse_args()
+
+    # Über den Modulnamen importieren: als Skript gestartet ist dieses Modul __main__,
+    # imagegen & Co. schreiben aber in "perf"
+    import perf
+    from text_analyzer import analyze_wine_description
+    from imagegen import generate_wine_png_bytes
+
+    perf.enable()
+    for _ in range(args.repeat):
+        with perf.span("generate"):
+            generate_wine_png_bytes(analyze_wine_description(args.description), size=args.size)
+
+    if args.format == "json":
+        print(json.dumps({**perf.snapshot(), "traces": perf.recent_traces(1)}, indent=2))
+    elif args.format == "prometheus":
+        print(perf.render_prometheus(), end="")
+    else:
+        print(perf.format_table())
+        print()
+        print(perf.format_trace(perf.recent_traces(1)[0]))
+
+
+if __name__ == "__main__":
+    main()
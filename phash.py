@@ -0,0 +1,173 @@
+"""
+Perceptual Hash der gerenderten Bilder zum Erkennen von (Beinahe-)Duplikaten.
+
+Ein gewöhnlicher dHash (Helligkeitsgefälle auf einem 9×8-Raster) taugt für
+die Weinscheiben nicht: alle Scheiben sind radialsymmetrisch und haben
+dasselbe Helligkeitsmuster, deutlich verschiedene Weine bekommen denselben
+Hash. Der Hash hier ist ein dHash in Polarkoordinaten auf den Farbkanälen:
+
+- die Scheibe wird in BANDS Ringe um den Mittelpunkt zerlegt, pro Ring die
+  mittlere Farbe in YCbCr
+- je Kanal ein Bit pro Nachbarring: wird es nach außen heller/farbiger
+  (mit Totzone EPSILON, damit flache Verläufe nicht flackern)
+- dazu die mittlere Helligkeit (LUMA_BITS) und die Füllhöhe des
+  Restzucker-Balkens (SUGAR_BITS), beide Gray-kodiert
+
+Zusammen HASH_BITS = 56 Bit; der Hash passt als positive Zahl in eine
+SQLite-INTEGER-Spalte. Für die Suche im Hamming-Radius wird er in CHUNKS
+gleich breite Teile zerlegt (Multi-Index-Hashing): Zwei Hashes mit Abstand
+≤ CHUNKS - 1 stimmen in mindestens einem Teil exakt überein, jeder Teil hat
+einen eigenen Ausdrucks-Index in ``evaluations``.
+
+Verwendung:
+    python phash.py backfill                  # Hash für ältere/importierte Einträge nachtragen
+    python phash.py duplicates                # Gruppen von Beinahe-Duplikaten
+    python phash.py compare a.png b.png
+"""
+import os
+from typing import Dict, List
+
+
+BANDS = 16
+CHANNELS = 3
+EPSILON = 2.0        # Totzone in 8-Bit-Farbwerten
+LUMA_BITS = 5
+SUGAR_BITS = 6
+HASH_BITS = (BANDS - 1) * CHANNELS + LUMA_BITS + SUGAR_BITS
+
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+# Standard-Radius für "Beinahe-Duplikat" (bis CHUNKS - 1 über die Indizes, darüber Vollscan)
+MAX_DISTANCE = int(os.environ.get("WINE_DUPLICATE_DISTANCE", CHUNKS - 1))
+
+# Auflösung, auf die das Bild vor dem Hashen verkleinert wird
+_GRID = 96
+# Cr-Wert, ab dem eine Zeile des Randstreifens zum (pinken) Restzucker-Balken zählt
+_SUGAR_CR = 160
+
+
+def _gray_code(value: int, bits: int) -> int:
+    value = max(0, min(int(value), (1 << bits) - 1))
+    return value ^ (value >> 1)
+
+
+def image_hash(img) -> int:
+    """Hash eines PIL-Bildes (Scheibe links, optional Restzucker-Balken rechts daneben)."""
+    import numpy as np
+    from PIL import Image
+
+    w, h = img.size
+    if w > h:
+        grid_w = max(_GRID + 1, round(_GRID * w / h))
+    else:
+        grid_w = _GRID
+    pixels = np.asarray(img.convert("RGB").resize((grid_w, _GRID), Image.BOX).convert("YCbCr"), dtype=np.float32)
+    disc, strip = pixels[:, :_GRID], pixels[:, _GRID:]
+
+    center = (_GRID - 1) / 2
+    yy, xx = np.mgrid[0:_GRID, 0:_GRID]
+    t = np.hypot(yy - center, xx - center) / (_GRID / 2)
+    # Ringe bis knapp an den Rand der Scheibe (dort verläuft die weiche Maske)
+    band = np.minimum((t * BANDS / 0.92).astype(np.int64), BANDS).ravel()
+    counts = np.bincount(band, minlength=BANDS + 1)[:BANDS]
+    sums = np.stack([
+        np.bincount(band, weights=disc[..., c].ravel(), minlength=BANDS + 1)[:BANDS]
+        for c in range(CHANNELS)
+    ], axis=1)
+    profile = sums / np.maximum(counts, 1)[:, None]
+
+    value = 0
+    for bit in (profile[1:] > profile[:-1] + EPSILON).T.ravel():
+        value = (value << 1) | int(bit)
+    value = (value << LUMA_BITS) | _gray_code(profile[:, 0].mean() / 256 * (1 << LUMA_BITS), LUMA_BITS)
+    fill = float((strip[..., 2].mean(axis=1) > _SUGAR_CR).mean()) if strip.shape[1] else 0.0
+    value = (value << SUGAR_BITS) | _gray_code(fill * (1 << SUGAR_BITS), SUGAR_BITS)
+    return value
+
+
+def hash_bytes(image_bytes: bytes) -> int:
+    """Hash kodierter Bilddaten (PNG, WebP, AVIF, JPEG)."""
+    import io
+    from PIL import Image
+    return image_hash(Image.open(io.BytesIO(image_bytes)))
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def chunk_expression(index: int, column: str = "phash") -> str:
+    """SQL-Ausdruck für Teil ``index`` (identisch in Index und Abfrage, sonst greift der Index nicht)."""
+    return f"(({column} >> {(CHUNKS - 1 - index) * CHUNK_BITS}) & {CHUNK_MASK})"
+
+
+def chunks(value: int) -> List[int]:
+    return [(value >> ((CHUNKS - 1 - i) * CHUNK_BITS)) & CHUNK_MASK for i in range(CHUNKS)]
+
+
+def group_duplicates(hashes: Dict[int, int], max_distance: int = MAX_DISTANCE) -> List[List[int]]:
+    """
+    Fasst IDs zu Gruppen zusammen, deren Hashes höchstens ``max_distance`` auseinanderliegen.
+
+    Kandidaten kommen aus denselben Teil-Buckets wie bei der Suche in der
+    Datenbank (exakt bis CHUNKS - 1); Gruppen sind transitiv (Union-Find).
+    """
+    parent = {evaluation_id: evaluation_id for evaluation_id in hashes}
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    buckets: List[Dict[int, List[int]]] = [{} for _ in range(CHUNKS)]
+    for evaluation_id, value in hashes.items():
+        for i, part in enumerate(chunks(value)):
+            buckets[i].setdefault(part, []).append(evaluation_id)
+
+    for bucket in buckets:
+        for ids in bucket.values():
+            for a_index, a in enumerate(ids):
+                for b in ids[a_index + 1:]:
+                    if find(a) != find(b) and hamming(hashes[a], hashes[b]) <= max_distance:
+                        parent[find(a)] = find(b)
+
+    groups: Dict[int, List[int]] = {}
+    for evaluation_id in hashes:
+        groups.setdefault(find(evaluation_id), []).append(evaluation_id)
+    return sorted((sorted(g) for g in groups.values() if len(g) > 1), key=len, reverse=True)
+
+
+def main():
+    import argparse
+    import expert_db as db
+
+    parser = argparse.ArgumentParser(description="Perceptual Hash: Duplikate erkennen")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_backfill = sub.add_parser("backfill", help="Fehlende Hashes nachtragen")
+    p_backfill.add_argument("--batch-size", type=int, default=200)
+    p_dupes = sub.add_parser("duplicates", help="Gruppen von Beinahe-Duplikaten anzeigen")
+    p_dupes.add_argument("--distance", type=int, default=MAX_DISTANCE)
+    p_dupes.add_argument("--limit", type=int, default=20)
+    p_compare = sub.add_parser("compare", help="Hamming-Abstand zweier Bilddateien")
+    p_compare.add_argument("files", nargs=2)
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        print(f"[phash] {db.backfill_phashes(args.batch_size)} Hashes nachgetragen")
+    elif args.command == "duplicates":
+        hashes = db.get_phashes()
+        groups = group_duplicates(hashes, args.distance)
+        extra = sum(len(g) - 1 for g in groups)
+        print(f"{len(hashes)} Bilder, {len(groups)} Gruppen mit Beinahe-Duplikaten ({extra} überzählige Bilder)")
+        for group in groups[:args.limit]:
+            print(f"  {len(group):>4} × IDs {', '.join(map(str, group[:12]))}{' …' if len(group) > 12 else ''}")
+    else:
+        a, b = (hash_bytes(open(path, "rb").read()) for path in args.files)
+        print(f"{a:014x}  {b:014x}  Abstand {hamming(a, b)} (Duplikat bis {MAX_DISTANCE})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Streamende PNG-/APNG-Writer.
+
+Frames werden einzeln übergeben und sofort gefiltert, komprimiert und
+geschrieben; im Speicher liegt nur der vorherige Frame (für den Vergleich).
+Ab dem zweiten Frame wird nur das Rechteck geschrieben, in dem sich Pixel
+geändert haben (APNG-Teilframes mit dispose_op NONE / blend_op SOURCE).
+
+    with open("perlage.png", "wb") as f:
+        writer = APNGWriter(f, width, height, num_frames=24, delay_ms=60)
+        for pixels in frames:          # uint8-Arrays (h, w, 3)
+            writer.add_frame(pixels)
+        writer.close()
+
+Für sehr große Einzelbilder (z.B. Kontaktbögen) schreibt PNGWriter ein
+gewöhnliches PNG Zeilenband für Zeilenband:
+
+    writer = PNGWriter(f, width, height)
+    for band in bands:                 # uint8-Arrays (n, w, 3)
+        writer.add_rows(band)
+    writer.close()
+"""
+import struct
+import zlib
+from typing import BinaryIO, Optional, Tuple
+
+import numpy as np
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Zeilenfilter der PNG-Spezifikation
+FILTER_NONE, FILTER_SUB, FILTER_UP, FILTER_AVERAGE, FILTER_PAETH = range(5)
+
+DISPOSE_NONE = 0
+BLEND_SOURCE = 0
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def filter_rows(pixels: np.ndarray) -> bytes:
+    """
+    Filtert ein RGB-Bild zeilenweise für PNG.
+
+    Alle fünf Filter werden vektorisiert berechnet; pro Zeile gewinnt der mit
+    der kleinsten Summe der Beträge (Heuristik aus der PNG-Spezifikation).
+    """
+    h, w, channels = pixels.shape
+    x = pixels.reshape(h, w * channels).astype(np.int16)
+    a = np.zeros_like(x)
+    a[:, channels:] = x[:, :-channels]          # links
+    b = np.zeros_like(x)
+    b[1:] = x[:-1]                              # oben
+    c = np.zeros_like(x)
+    c[1:, channels:] = x[:-1, :-channels]       # oben links
+
+    p = a + b - c
+    pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+    paeth = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+
+    candidates = np.stack([
+        x, x - a, x - b, x - ((a + b) >> 1), x - paeth,
+    ]).astype(np.uint8)                          # modulo 256
+    # Kosten: Beträge als vorzeichenbehaftete Bytes
+    costs = np.abs(candidates.view(np.int8).astype(np.int32)).sum(axis=2)
+    best = costs.argmin(axis=0)
+
+    out = np.empty((h, w * channels + 1), dtype=np.uint8)
+    out[:, 0] = best
+    out[:, 1:] = candidates[best, np.arange(h)]
+    return out.tobytes()
+
+
+class APNGWriter:
+    """Schreibt ein animiertes PNG Frame für Frame in ``fp``."""
+
+    def __init__(
+        self,
+        fp: BinaryIO,
+        width: int,
+        height: int,
+        num_frames: int,
+        delay_ms: int = 60,
+        loop: int = 0,
+        compress_level: int = 6,
+    ):
+        self.fp = fp
+        self.width, self.height = width, height
+        self.num_frames = num_frames
+        self.delay_ms = delay_ms
+        self.compress_level = compress_level
+        self.frames_written = 0
+        self._sequence = 0
+        self._previous: Optional[np.ndarray] = None
+
+        fp.write(PNG_SIGNATURE)
+        # 8 Bit, RGB, Standard-Kompression/-Filter, kein Interlacing
+        fp.write(_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        fp.write(_chunk(b"acTL", struct.pack(">II", num_frames, loop)))
+
+    def _next_sequence(self) -> int:
+        sequence = self._sequence
+        self._sequence += 1
+        return sequence
+
+    def _changed_box(self, pixels: np.ndarray) -> Tuple[int, int, int, int]:
+        """(x, y, Breite, Höhe) des Bereichs, der sich gegenüber dem vorherigen Frame geändert hat."""
+        changed = np.any(pixels != self._previous, axis=2)
+        rows = np.flatnonzero(changed.any(axis=1))
+        if rows.size == 0:
+            return 0, 0, 1, 1  # unverändert: minimaler Teilframe
+        cols = np.flatnonzero(changed.any(axis=0))
+        return int(cols[0]), int(rows[0]), int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1)
+
+    def add_frame(self, pixels: np.ndarray):
+        """Hängt einen Frame an (uint8, Form (Höhe, Breite, 3)); das Array wird nicht behalten."""
+        if self.frames_written >= self.num_frames:
+            raise ValueError(f"Bereits {self.num_frames} Frames geschrieben")
+        if pixels.shape != (self.height, self.width, 3) or pixels.dtype != np.uint8:
+            raise ValueError(f"Frame muss uint8 ({self.height}, {self.width}, 3) sein, nicht {pixels.dtype} {pixels.shape}")
+
+        if self._previous is None:
+            x, y, w, h = 0, 0, self.width, self.height
+            self._previous = pixels.copy()
+        else:
+            x, y, w, h = self._changed_box(pixels)
+            self._previous[y:y + h, x:x + w] = pixels[y:y + h, x:x + w]
+
+        self.fp.write(_chunk(b"fcTL", struct.pack(
+            ">IIIIIHHBB", self._next_sequence(), w, h, x, y,
+            self.delay_ms, 1000, DISPOSE_NONE, BLEND_SOURCE,
+        )))
+        data = zlib.compress(filter_rows(pixels[y:y + h, x:x + w]), self.compress_level)
+        if self.frames_written == 0:
+            self.fp.write(_chunk(b"IDAT", data))
+        else:
+            self.fp.write(_chunk(b"fdAT", struct.pack(">I", self._next_sequence()) + data))
+        self.frames_written += 1
+
+    def close(self):
+        if self.frames_written != self.num_frames:
+            raise ValueError(f"{self.frames_written} von {self.num_frames} Frames geschrieben")
+        self.fp.write(_chunk(b"IEND", b""))
+        self._previous = None
+
+
+class PNGWriter:
+    """
+    Schreibt ein PNG in Zeilenbändern; im Speicher liegen nur das aktuelle Band und die letzte Zeile.
+
+    Die Höhe muss vorab feststehen (IHDR); ``close`` füllt fehlende Zeilen mit
+    ``fill`` auf.
+    """
+
+    # Komprimierte Daten werden in IDAT-Chunks etwa dieser Größe geschrieben
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, fp: BinaryIO, width: int, height: int, compress_level: int = 6):
+        self.fp = fp
+        self.width, self.height = width, height
+        self.rows_written = 0
+        self._last_row: Optional[np.ndarray] = None
+        self._compressor = zlib.compressobj(compress_level)
+        self._pending = bytearray()
+
+        fp.write(PNG_SIGNATURE)
+        fp.write(_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+
+    def _flush(self, force: bool = False):
+        if self._pending and (force or len(self._pending) >= self.CHUNK_SIZE):
+            self.fp.write(_chunk(b"IDAT", bytes(self._pending)))
+            self._pending.clear()
+
+    def add_rows(self, pixels: np.ndarray):
+        """Hängt Zeilen an (uint8, Form (n, Breite, 3)); das Array wird nicht behalten."""
+        if pixels.ndim != 3 or pixels.shape[1:] != (self.width, 3) or pixels.dtype != np.uint8:
+            raise ValueError(f"Zeilen müssen uint8 (n, {self.width}, 3) sein, nicht {pixels.dtype} {pixels.shape}")
+        if self.rows_written + len(pixels) > self.height:
+            raise ValueError(f"Mehr als {self.height} Zeilen")
+        if not len(pixels):
+            return
+
+        if self._last_row is None:
+            filtered = filter_rows(pixels)
+        else:
+            # Filter "oben"/Average/Paeth brauchen die letzte Zeile des vorigen Bands
+            filtered = filter_rows(np.concatenate([self._last_row[None], pixels]))[self.width * 3 + 1:]
+        self._last_row = pixels[-1].copy()
+        self._pending += self._compressor.compress(filtered)
+        self._flush()
+        self.rows_written += len(pixels)
+
+    def close(self, fill: Tuple[int, int, int] = (255, 255, 255)):
+        missing = self.height - self.rows_written
+        if missing:
+            self.add_rows(np.broadcast_to(np.array(fill, dtype=np.uint8), (missing, self.width, 3)))
+        self._pending += self._compressor.flush()
+        self._flush(force=True)
+        self.fp.write(_chunk(b"IEND", b""))
+        self._last_row = None
@@ -0,0 +1,367 @@
+"""
+Schnelle Vorschau für den Parameter-Editor: Weinscheibe in reduzierter
+Auflösung, die bei jeder Slider-Änderung nur neu berechnet, was sich wirklich
+geändert hat.
+
+- Layer 1 (Basis) hängt nur von Weinfarbe und Weintyp ab und wird pro
+  (base_color_hex, wine_type) einmal berechnet.
+- Layer 2: Gewicht und Träger (Pixel mit merkbarem Gewicht) jedes Rings
+  liegen fertig vor. Ändert sich die Intensität eines Rings, wird die
+  Ringkette nur auf den Pixeln im Träger der geänderten Ringe neu gemischt.
+- Layer 3 ist pro Pixel (nahezu) affin im Ergebnis von Layer 2 und wird als
+  ``A * ringe + B`` gespeichert, neu berechnet nur bei anderer Basis oder
+  Spritzigkeit. Die Punkte sind exakt; bei den Bläschen wählt der aufhellende
+  Körper seinen Zweig (mit/ohne Sättigung bei 255) nach den Ringen zum
+  Zeitpunkt der Berechnung, direkt an der Sättigungsgrenze weicht die
+  Vorschau nach späteren Ring-Änderungen daher minimal ab.
+
+Danach laufen Blur, Kreismaske (als vorab berechnete affine Abbildung) und
+Overlays wie in imagegen über das Vorschau-Bild. Mit WINE_PREVIEW_SIZE lässt sich die Kantenlänge ändern.
+
+Verwendung:
+    python preview.py "Riesling, viel Säure, Zitrus" --updates 200
+    python preview.py "Champagner, feine Perlage" --compare   # Abweichung zu render_wine_image
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from imagegen import (
+    HIGHLIGHT_COLOR, RING_DEFINITIONS, STAR_COLOR, _Scene, _apply_mask, _blur,
+    _blur_radius, _layer_base, _overlays, _texture_dots, _viz_float,
+)
+from overlays import Compositor
+from perf import span
+
+
+PREVIEW_SIZE = int(os.environ.get("WINE_PREVIEW_SIZE", 256))
+
+# Ab dieser Intensität zeichnet imagegen einen Ring
+RING_VISIBLE = 0.2
+# Ringgewicht, unter dem ein Pixel nicht zum Träger zählt (Deckkraft < 0.04 %)
+SUPPORT_EPSILON = 1e-3
+# Ab dieser Spritzigkeit zeichnet imagegen Bläschen
+MIN_EFFERVESCENCE = 0.1
+
+CENTER_COLOR = np.array([255, 255, 252], dtype=np.float32)
+
+
+def _ring_colors(s: _Scene) -> List[Optional[np.ndarray]]:
+    """Ringfarben wie in imagegen._layer_rings (bei Rotwein aufgehellt)."""
+    colors = []
+    for _, _, _, ring_color, _, _ in RING_DEFINITIONS:
+        if ring_color is None:
+            colors.append(None)
+            continue
+        color = np.array(ring_color, dtype=np.float32)
+        colors.append(np.clip(color * 1.3 + 30, 0, 255) if s.is_red_wine else np.clip(color * 0.9, 0, 255))
+    return colors
+
+
+class _Overlay:
+    """Pro Pixel affine Abbildung ``x -> A * x + B`` (flach, Form (n, 3))."""
+
+    def __init__(self, n: int):
+        self.A = np.ones((n, 3), dtype=np.float32)
+        self.B = np.zeros((n, 3), dtype=np.float32)
+
+    def blend(self, idx: np.ndarray, opacity, color: np.ndarray):
+        """
+        Mischt mit fester Farbe: ``x * (1 - o) + c * o``.
+
+        Bei einem Array ``opacity`` dürfen Pixel mehrfach vorkommen: bei
+        gleicher Farbe ist die Reihenfolge egal, zusammen bleibt
+        ``1 - Π(1 - o)`` Deckkraft. Eine feste Deckkraft setzt verschiedene
+        Pixel voraus.
+        """
+        if np.ndim(opacity):
+            idx, where = np.unique(idx, return_inverse=True)
+            keep = np.ones(len(idx), dtype=np.float32)
+            np.multiply.at(keep, where, 1 - opacity)
+            keep = keep[:, None]
+        else:
+            keep = np.float32(1 - opacity)
+        self.A[idx] *= keep
+        self.B[idx] = self.B[idx] * keep + color * (1 - keep)
+
+    def brighten(self, idx: np.ndarray, opacity: float, ref: np.ndarray):
+        """
+        Aufhellen wie der Körper eines Bläschens: ``x * (1 - o) + clip(1.3 x + 30) * o``.
+
+        Der Zweig (ohne/mit Sättigung) wird je Kanal an der Eingabe ``ref``
+        entschieden, für die das Overlay berechnet wird.
+        """
+        A, B = self.A[idx], self.B[idx]
+        saturated = (A * ref[idx] + B) * 1.3 + 30 > 255
+        gain = np.where(saturated, 1 - opacity, 1 + 0.3 * opacity).astype(np.float32)
+        offset = np.where(saturated, 255 * opacity, 30 * opacity).astype(np.float32)
+        self.A[idx] = A * gain
+        self.B[idx] = B * gain + offset
+
+
+class PreviewRenderer:
+    """
+    Zustandsbehafteter Renderer für eine Editier-Sitzung.
+
+    ``render(viz)`` liefert das Vorschau-Bild (PIL, inkl. Restzucker-Balken);
+    ``timings`` enthält die Zeiten des letzten Aufrufs in ms.
+    """
+
+    def __init__(self, size: int = PREVIEW_SIZE):
+        self.size = size
+        self.scene: Optional[_Scene] = None
+        self.timings: Dict[str, float] = {}
+        self.updates = 0
+        self._base_key = None
+        self._texture_key = None
+        self._last = None
+        self._image: Optional[Image.Image] = None
+        self._weights: Optional[List[np.ndarray]] = None
+        self._supports: Optional[List[np.ndarray]] = None
+        self._base: Optional[np.ndarray] = None
+        self._rings: Optional[np.ndarray] = None
+        self._visible: Optional[List[float]] = None
+        self._texture: Optional[_Overlay] = None
+
+    # ── Layer 1 ──────────────────────────────────────────────────────────
+
+    def _set_base(self, viz: Dict[str, Any]):
+        s = self.scene = _Scene(viz, self.size)
+        if self._weights is None:
+            self._weights, self._supports = [], []
+            fade = np.clip((0.82 - s.t) / 0.10, 0, 1).ravel()
+            for _, center, width, _, _, _ in RING_DEFINITIONS:
+                sigma = width * 0.5
+                weight = (np.exp(-0.5 * ((np.abs(s.t.ravel() - center)) / sigma) ** 2) * fade).astype(np.float32)
+                self._weights.append(weight)
+                self._supports.append(np.flatnonzero(weight > SUPPORT_EPSILON))
+        self._base = _layer_base(s).reshape(-1, 3).astype(np.float32)
+        self._rng_state = s.rng.bit_generator.state
+        self._colors = _ring_colors(s)
+        self._rings = np.empty_like(self._base)
+        # Kreismaske ist affin im geblurrten Bild: zwei Proben statt imagegen._apply_mask pro Update
+        probes = []
+        for value in (0.0, 255.0):
+            probe = np.empty((s.h, s.w, 3), dtype=np.float32)
+            _apply_mask(s, np.full((s.h, s.w, 3), value, dtype=np.float32), probe)
+            probes.append(probe)
+        self._mask_gain = (probes[1] - probes[0]) / 255.0
+        self._mask_offset = probes[0]
+        self._visible = None
+        self._texture_key = None
+
+    # ── Layer 2 ──────────────────────────────────────────────────────────
+
+    def _composite(self, idx, visible: List[float]):
+        """Ringkette wie in imagegen._layer_rings, nur auf den Pixeln ``idx``."""
+        wine = self._base[idx]
+        for weight, color, intensity in zip(self._weights, self._colors, visible):
+            if intensity < RING_VISIBLE:
+                continue
+            opacity = weight[idx, None] * (0.08 + intensity * 0.27)
+            if color is None:
+                wine = wine * (1 - opacity * 0.4)
+            else:
+                wine = wine * (1 - opacity) + color * opacity
+        self._rings[idx] = wine
+
+    def _update_rings(self, intensities: List[float]):
+        visible = [i if i >= RING_VISIBLE else 0.0 for i in intensities]
+        if self._visible is None:
+            self._composite(slice(None), visible)
+        else:
+            changed = [j for j, (a, b) in enumerate(zip(visible, self._visible)) if a != b]
+            if changed:
+                mask = np.zeros(len(self._base), dtype=bool)
+                for j in changed:
+                    mask[self._supports[j]] = True
+                self._composite(np.flatnonzero(mask), visible)
+        self._visible = visible
+
+    # ── Layer 3 ──────────────────────────────────────────────────────────
+
+    def _dots(self) -> _Overlay:
+        """Punkte aus imagegen._texture_dots, über zwei konstante Proben als A, B."""
+        s, n = self.scene, len(self._base)
+        probes = []
+        for value in (0.0, 100.0):
+            s.rng.bit_generator.state = self._rng_state
+            probes.append(_texture_dots(s, np.full((s.h, s.w, 3), value, dtype=np.float32)).reshape(n, 3))
+        overlay = _Overlay(n)
+        overlay.A = (probes[1] - probes[0]) / 100.0
+        overlay.B = probes[0]
+        return overlay
+
+    def _bubbles(self, overlay: _Overlay):
+        """Sterne und Bläschen aus imagegen._texture_bubbles (gleiche Zufallsfolge)."""
+        s = self.scene
+        rng, w, h, size, effervescence = s.rng, s.w, s.h, s.size, s.effervescence
+        if effervescence <= MIN_EFFERVESCENCE:
+            return
+        ref = self._rings
+
+        def flat(px, py):
+            valid = (px >= 0) & (px < w) & (py >= 0) & (py < h)
+            return (py * w + px)[valid], valid
+
+        center_dy, center_dx = np.mgrid[-2:3, -2:3]
+        center = center_dx * center_dx + center_dy * center_dy <= 4
+        center_dy, center_dx = center_dy[center], center_dx[center]
+        shapes = {}
+
+        n_bubbles = int(effervescence * 400 * (size / 512))
+        for _ in range(n_bubbles):
+            angle = rng.uniform(0, 2 * np.pi)
+            radius = rng.beta(2, 1.5) * 0.85 * s.max_r
+            bx = int(s.cx + radius * np.cos(angle))
+            by = int(s.cy + radius * np.sin(angle))
+            if not (0 <= bx < w and 0 <= by < h):
+                continue
+
+            base_size = int(3 + effervescence * 4)
+            bubble_size = rng.integers(base_size - 2, base_size + 3)
+
+            if rng.random() < 0.5:
+                n_arms = 4 if rng.random() < 0.6 else 6
+                arm_length = bubble_size + rng.integers(2, 6)
+                arm_angles = [(2 * np.pi * arm_i / n_arms) + rng.uniform(-0.15, 0.15) for arm_i in range(n_arms)]
+                # Alle Strahlen haben dieselbe Farbe und lassen sich zusammen mischen;
+                # astype(int) schneidet wie int() in imagegen._draw_star Richtung null ab
+                d = np.arange(arm_length)
+                arms = np.array(arm_angles)[:, None]
+                px = (bx + d * np.cos(arms)).astype(int).ravel()
+                py = (by + d * np.sin(arms)).astype(int).ravel()
+                opacity = np.tile(0.8 * (1.0 - (d / arm_length) * 0.6) * effervescence, n_arms)
+                idx, valid = flat(px, py)
+                overlay.blend(idx, opacity[valid].astype(np.float32), STAR_COLOR)
+                idx, _ = flat(bx + center_dx, by + center_dy)
+                overlay.blend(idx, 0.8, CENTER_COLOR)
+            else:
+                if bubble_size not in shapes:
+                    reach = bubble_size + 2
+                    ddy, ddx = np.mgrid[-reach:reach + 1, -reach:reach + 1]
+                    dist_sq = ddx * ddx + ddy * ddy
+                    inside = dist_sq <= reach ** 2
+                    highlight = inside & (ddx < 0) & (ddy < 0) & (dist_sq > (bubble_size - 2) ** 2)
+                    body = inside & ~highlight & (dist_sq <= bubble_size ** 2)
+                    shapes[bubble_size] = (ddx[highlight], ddy[highlight], ddx[body], ddy[body])
+                hx, hy, body_x, body_y = shapes[bubble_size]
+                idx, _ = flat(bx + hx, by + hy)
+                overlay.blend(idx, 0.85 * effervescence, HIGHLIGHT_COLOR)
+                idx, _ = flat(bx + body_x, by + body_y)
+                overlay.brighten(idx, 0.4 * effervescence, ref)
+
+    def _update_texture(self, effervescence: float):
+        key = effervescence if effervescence > MIN_EFFERVESCENCE else None
+        if key == self._texture_key and self._texture is not None:
+            return
+        self.scene.effervescence = effervescence
+        overlay = self._dots()
+        self._bubbles(overlay)
+        self._texture = overlay
+        self._texture_key = key
+
+    # ── Gesamtbild ───────────────────────────────────────────────────────
+
+    def render(self, viz: Dict[str, Any]) -> Image.Image:
+        """Vorschau für ``viz``; unveränderte Parameter liefern das letzte Bild ohne Rechenaufwand."""
+        key = tuple(sorted((k, str(v)) for k, v in viz.items()))
+        if key == self._last and self._image is not None:
+            self.timings = {"total": 0.0}
+            return self._image
+
+        timings, start = {}, time.perf_counter()
+
+        def lap(name):
+            nonlocal start
+            now = time.perf_counter()
+            timings[name] = (now - start) * 1000
+            start = now
+
+        with span("preview.render"):
+            base_key = (viz.get("base_color_hex") or "#F6F2AF", viz.get("wine_type", "auto"))
+            if base_key != self._base_key:
+                self._set_base(viz)
+                self._base_key = base_key
+            lap("base")
+            s = self.scene
+            s.intensities = [_viz_float(viz, key, default) for _, _, _, _, key, default in RING_DEFINITIONS]
+            s.residual_sugar = _viz_float(viz, "residual_sugar", 0.0)
+            self._update_rings(s.intensities)
+            lap("rings")
+            self._update_texture(_viz_float(viz, "effervescence", 0.0))
+            wine = (self._rings * self._texture.A + self._texture.B).reshape(s.h, s.w, 3)
+            lap("texture")
+            wine = _blur(wine, _blur_radius(s))
+            lap("blur")
+            canvas = Compositor(s.w, s.h, _overlays(s, ring_labels=False))
+            canvas.disc[...] = np.clip(wine * self._mask_gain + self._mask_offset, 0, 255)
+            self._image = canvas.finish()
+            lap("mask")
+
+        timings["total"] = sum(timings.values())
+        self.timings = timings
+        self.updates += 1
+        self._last = key
+        return self._image
+
+
+def _walk(params: Dict[str, Any], steps: int, seed: int = 0):
+    """Zufällige Slider-Bewegungen: pro Schritt ändert sich ein Parameter."""
+    rng = np.random.default_rng(seed)
+    keys = [key for *_, key, _ in RING_DEFINITIONS] + ["effervescence", "residual_sugar"]
+    viz = dict(params)
+    for _ in range(steps):
+        key = keys[rng.integers(len(keys))]
+        if key == "residual_sugar":
+            viz[key] = float(rng.uniform(0, 60))
+        elif key == "effervescence" and rng.random() < 0.8:
+            continue  # Spritzigkeit wird selten verstellt
+        else:
+            viz[key] = round(float(rng.uniform(0, 1)), 2)
+        yield dict(viz)
+
+
+def main():
+    import argparse
+    from text_analyzer import analyze_wine_description
+    from imagegen import render_wine_image
+
+    parser = argparse.ArgumentParser(description="Vorschau für den Parameter-Editor messen")
+    parser.add_argument("description")
+    parser.add_argument("--size", type=int, default=PREVIEW_SIZE)
+    parser.add_argument("--updates", type=int, default=100)
+    parser.add_argument("--compare", action="store_true", help="Abweichung zu render_wine_image ausgeben")
+    args = parser.parse_args()
+
+    params = analyze_wine_description(args.description)
+    renderer = PreviewRenderer(args.size)
+    renderer.render(params)
+    print(f"[preview] erstes Bild: {renderer.timings['total']:.1f} ms")
+
+    times, stages = [], {}
+    for viz in _walk(params, args.updates):
+        renderer.render(viz)
+        times.append(renderer.timings["total"])
+        for name, ms in renderer.timings.items():
+            stages.setdefault(name, []).append(ms)
+    if times:
+        p50, p95, worst = np.percentile(times, [50, 95, 100])
+        print(f"[preview] {len(times)} Änderungen: Median {p50:.1f} ms, p95 {p95:.1f} ms, max {worst:.1f} ms")
+        print("[preview] Median je Schritt: " + ", ".join(
+            f"{name} {np.median(ms):.1f}" for name, ms in stages.items() if name != "total"))
+
+    if args.compare:
+        for viz in (params, *list(_walk(params, 5, seed=1))[-1:]):
+            fast = np.asarray(renderer.render(viz), dtype=np.int16)
+            full = np.asarray(render_wine_image(viz, args.size), dtype=np.int16)
+            diff = np.abs(fast - full)
+            print(f"[preview] Abweichung zu render_wine_image: mittel {diff.mean():.3f}, "
+                  f"max {diff.max()}, Pixel > 2: {(diff.max(axis=2) > 2).mean():.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,573 @@
+"""
+Headless HTTP-API für Analyse, Rendering und Bewertungen (ohne Streamlit).
+
+Endpunkte (JSON, außer den Bildern):
+    GET  /health                       Lebenszeichen
+    GET  /metrics                      Laufzeit-Metriken im Prometheus-Format (mit WINE_PERF=1)
+    POST /analyze                      {"description"} → Visualisierungs-Parameter
+    POST /render                       {"description" | "params", "size", "format"} → Bild
+    GET  /render?description=…&size=…&format=png|webp|avif|jpeg|svg
+    GET  /ratings?after_id=…&limit=…   Bewertungen seitenweise (Keyset)
+    GET  /ratings/<id>                 Einzelner Eintrag (ohne Bild)
+    POST /ratings                      {"evaluation_id", "rating", "comment"} bewertet einen Eintrag,
+                                       {"description", "rating", "comment"} legt einen neuen an
+    POST /jobs                         {"jobs": [...]} reiht Jobs ein (siehe job_queue.py)
+    POST /jobs/lease|heartbeat|complete|fail|release
+                                       Worker-Protokoll für Worker auf anderen Knoten
+    GET  /jobs/stats                   Queue-Tiefe und Durchsatz je Worker
+
+Das Rendering läuft in einem Prozess-Pool. Bilder bekommen ein ETag aus dem
+Hash von Parametern, Größe, Format und Renderer-Stand (Version, Genauigkeit);
+bei passendem If-None-Match antwortet der Server mit 304. Request-Header und -Body sind in der Größe begrenzt.
+
+Verwendung:
+    python render_api.py --port 8600 --workers 4
+    python loadtest_api.py --url http://127.0.0.1:8600 --concurrency 16
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import multiprocessing
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import image_encoding
+import perf
+
+
+# Grenzen für eingehende Requests
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = int(os.environ.get("WINE_API_MAX_BODY", 64 * 1024))
+# Job-Ergebnisse enthalten das gerenderte Bild (base64)
+MAX_JOB_BODY_BYTES = int(os.environ.get("WINE_API_MAX_JOB_BODY", 16 * 1024 * 1024))
+MAX_JOB_LEASE = 64
+MAX_DESCRIPTION_CHARS = 20_000
+MIN_RENDER_SIZE = 16
+MAX_RENDER_SIZE = int(os.environ.get("WINE_API_MAX_SIZE", 2048))
+DEFAULT_RENDER_SIZE = 512
+# Bildgröße für über /ratings neu angelegte Einträge (wie in der App)
+RATING_RENDER_SIZE = 350
+
+# Gerenderte Bilder ändern sich für gleiche Parameter nicht
+CACHE_MAX_AGE = int(os.environ.get("WINE_API_CACHE_MAX_AGE", 24 * 3600))
+RENDER_CACHE_MB = float(os.environ.get("WINE_API_RENDER_CACHE_MB", 64))
+
+KEEPALIVE_TIMEOUT = 15.0
+FORMATS = {**image_encoding.MIME_TYPES, "svg": "image/svg+xml"}
+
+
+class HTTPError(Exception):
+    """Wird in eine JSON-Fehlerantwort mit passendem Status umgewandelt."""
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class Request:
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path.rstrip("/") or "/"
+        self.query = dict(parse_qsl(parts.query))
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Dict[str, Any]:
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HTTPError(400, "Ungültiges JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "JSON-Objekt erwartet")
+        return data
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+
+class Response:
+    def __init__(self, status: int = 200, body: bytes = b"", content_type: str = "application/json",
+                 headers: Optional[Dict[str, str]] = None):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers or {}
+
+    @classmethod
+    def json(cls, data: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> "Response":
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        return cls(status, body, "application/json; charset=utf-8", headers)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Hilfsfunktionen (laufen teils im Worker-Prozess)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _render_image(
+    params: Dict[str, Any], size: int, fmt: str, collect_timings: bool = False
+) -> Tuple[bytes, List[tuple]]:
+    """Läuft im Worker-Prozess; liefert optional die Layer-Zeiten mit zurück."""
+    from imagegen import generate_wine_image_bytes
+    if not collect_timings:
+        return generate_wine_image_bytes(params, size=size, fmt=fmt), []
+    perf.enable()
+    image = generate_wine_image_bytes(params, size=size, fmt=fmt)
+    timings = [pair for trace in perf.recent_traces(1) for pair in perf.flatten(trace)]
+    perf.reset()
+    return image, timings
+
+
+def _analyze(description: str) -> Dict[str, Any]:
+    from text_analyzer import analyze_wine_description
+    return analyze_wine_description(description)
+
+
+def params_hash(params: Dict[str, Any], size: int, fmt: str) -> str:
+    """
+    Stabiler Hash über Parameter, Größe, Format und Renderer-Stand (Grundlage
+    für ETag und Cache).
+
+    Der Renderer-Stand ist imagegen.render_info: RENDERER_VERSION und der
+    Fingerprint inklusive der in dieser Größe verwendeten Genauigkeit. Nach
+    einem Renderer-Update oder einem anderen WINE_RENDER_PRECISION passen
+    alte ETags daher nicht mehr.
+    """
+    from imagegen import render_info
+    version, fingerprint = render_info(params, size)
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), default=float)
+    return hashlib.sha256(f"{canonical}|{size}|{fmt}|{version}|{fingerprint}".encode("utf-8")).hexdigest()
+
+
+def png_to_svg(png: bytes) -> bytes:
+    """Verpackt das gerasterte Bild in ein SVG (imagegen rendert nur Raster)."""
+    # Breite/Höhe aus dem IHDR-Chunk; mit Restzucker-Balken ist das Bild breiter als hoch
+    width, height = struct.unpack(">II", png[16:24])
+    data = base64.b64encode(png).decode("ascii")
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}">'
+        f'<image width="{width}" height="{height}" href="data:image/png;base64,{data}"/>'
+        f'</svg>'
+    ).encode("ascii")
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def _description(data: Dict[str, Any]) -> str:
+    description = data.get("description")
+    if not isinstance(description, str) or not description.strip():
+        raise HTTPError(400, "'description' fehlt")
+    if len(description) > MAX_DESCRIPTION_CHARS:
+        raise HTTPError(413, f"Beschreibung länger als {MAX_DESCRIPTION_CHARS} Zeichen")
+    return description
+
+
+def _int_arg(data: Dict[str, Any], name: str, default: int, low: int, high: int) -> int:
+    value = data.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"'{name}' muss eine ganze Zahl sein")
+    if not low <= value <= high:
+        status = 413 if value > high and name == "size" else 400
+        raise HTTPError(status, f"'{name}' muss zwischen {low} und {high} liegen")
+    return value
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Server
+# ─────────────────────────────────────────────────────────────────────────────
+
+class RenderAPI:
+    """
+    asyncio-HTTP/1.1-Server mit Keep-Alive.
+
+    Args:
+        workers: Anzahl Render-Prozesse
+        max_pending: Maximal gleichzeitig wartende Renderings, darüber 503
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_pending = max_pending or self.workers * 8
+        # spawn: keine geerbten Threads/SQLite-Handles im Worker
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        from imagefetch import ResponseCache
+        self.cache = ResponseCache(CACHE_MAX_AGE, int(RENDER_CACHE_MB * 1024 * 1024))
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._pending = 0
+        self._db = None
+        self._jobs = None
+
+    @property
+    def db(self):
+        # DB erst beim ersten Bewertungs-Request öffnen
+        if self._db is None:
+            import expert_db
+            self._db = expert_db
+        return self._db
+
+    @property
+    def jobs(self):
+        if self._jobs is None:
+            import job_queue
+            self._jobs = job_queue.JobQueue()
+        return self._jobs
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8600) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._handle_connection, host, port, limit=MAX_HEADER_BYTES)
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        if self._db is not None:
+            self._db.flush_writes(timeout=5)
+
+    # ── Verbindungen ─────────────────────────────────────────────────────────
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEPALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, ConnectionError):
+                    break
+                except HTTPError as e:
+                    # Request nicht vollständig gelesen: Verbindung danach schließen
+                    await self._send(writer, Response.json({"error": str(e)}, e.status, e.headers), False)
+                    break
+                if request is None:
+                    break
+                response = await self._dispatch(request)
+                await self._send(writer, response, request.keep_alive)
+                if not request.keep_alive:
+                    break
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Request]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if not e.partial.strip():
+                return None  # Client hat die Verbindung geschlossen
+            raise HTTPError(400, "Unvollständiger Request")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "Header zu groß")
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Ungültige Request-Zeile")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(411, "Content-Length erforderlich")
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "Ungültige Content-Length")
+        max_body = MAX_JOB_BODY_BYTES if target.startswith("/jobs") else MAX_BODY_BYTES
+        if length > max_body:
+            raise HTTPError(413, f"Body größer als {max_body} Bytes")
+        body = await reader.readexactly(length) if length else b""
+        return Request(method.upper(), target, headers, body)
+
+    async def _send(self, writer: asyncio.StreamWriter, response: Response, keep_alive: bool):
+        reason = HTTPStatus(response.status).phrase
+        headers = {"Content-Length": str(len(response.body)), "Connection": "keep-alive" if keep_alive else "close"}
+        if response.body or response.status != 304:
+            headers["Content-Type"] = response.content_type
+        headers.update(response.headers)
+        head = f"HTTP/1.1 {response.status} {reason}\r\n"
+        head += "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+        writer.write(head.encode("latin-1") + response.body)
+        await writer.drain()
+
+    async def _dispatch(self, request: Request) -> Response:
+        routes = {
+            ("GET", "/health"): self.health,
+            ("GET", "/metrics"): self.metrics,
+            ("POST", "/analyze"): self.analyze,
+            ("GET", "/render"): self.render,
+            ("POST", "/render"): self.render,
+            ("GET", "/ratings"): self.list_ratings,
+            ("POST", "/ratings"): self.create_rating,
+            ("POST", "/jobs"): self.enqueue_jobs,
+            ("POST", "/jobs/lease"): self.lease_jobs,
+            ("POST", "/jobs/heartbeat"): self.heartbeat_jobs,
+            ("POST", "/jobs/complete"): self.complete_job,
+            ("POST", "/jobs/fail"): self.fail_job,
+            ("POST", "/jobs/release"): self.release_jobs,
+            ("GET", "/jobs/stats"): self.job_stats,
+        }
+        handler = routes.get((request.method, request.path))
+        if handler is None and request.method == "GET" and request.path.startswith("/ratings/"):
+            handler = self.get_rating
+        try:
+            if handler is None:
+                known = {path for _, path in routes}
+                if request.path in known:
+                    raise HTTPError(405, "Methode nicht erlaubt")
+                raise HTTPError(404, "Nicht gefunden")
+            with perf.span(f"api.{handler.__name__}"):
+                return await handler(request)
+        except HTTPError as e:
+            return Response.json({"error": str(e)}, e.status, e.headers)
+        except ValueError as e:
+            return Response.json({"error": str(e)}, 400)
+        except Exception as e:
+            print(f"[render_api] Fehler bei {request.method} {request.path}: {e}")
+            return Response.json({"error": "Interner Fehler"}, 500)
+
+    # ── Rendering ────────────────────────────────────────────────────────────
+
+    async def _render_cached(self, params: Dict[str, Any], size: int, fmt: str) -> bytes:
+        """Rendert im Prozess-Pool; identische gleichzeitige Anfragen teilen sich ein Ergebnis."""
+        key = params_hash(params, size, fmt)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        if self._pending >= self.max_pending:
+            raise HTTPError(503, "Server ausgelastet", {"Retry-After": "1"})
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inflight[key] = future
+        self._pending += 1
+        try:
+            image, timings = await loop.run_in_executor(
+                self.pool, _render_image, params, size, fmt, perf.is_enabled()
+            )
+            for name, seconds in timings:
+                perf.observe(name, seconds)
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # als abgerufen markieren, falls niemand wartet
+            raise
+        else:
+            self.cache.put(key, image)
+            future.set_result(image)
+            return image
+        finally:
+            self._pending -= 1
+            self._inflight.pop(key, None)
+
+    # ── Endpunkte ────────────────────────────────────────────────────────────
+
+    async def health(self, request: Request) -> Response:
+        return Response.json({"status": "ok", "workers": self.workers, "pending": self._pending})
+
+    async def metrics(self, request: Request) -> Response:
+        body = perf.render_prometheus().encode("utf-8")
+        return Response(200, body, "text/plain; version=0.0.4; charset=utf-8")
+
+    async def analyze(self, request: Request) -> Response:
+        return Response.json(_analyze(_description(request.json())))
+
+    async def render(self, request: Request) -> Response:
+        data = request.query if request.method == "GET" else request.json()
+        fmt = str(data.get("format", "png")).lower()
+        if fmt not in FORMATS:
+            raise HTTPError(400, f"'format' muss eines von {sorted(FORMATS)} sein")
+        if fmt != "svg" and not image_encoding.is_available(fmt):
+            raise HTTPError(400, f"Format {fmt} wird auf diesem Server nicht unterstützt")
+        size = _int_arg(data, "size", DEFAULT_RENDER_SIZE, MIN_RENDER_SIZE, MAX_RENDER_SIZE)
+
+        params = data.get("params")
+        if params is None:
+            params = _analyze(_description(data))
+        elif not isinstance(params, dict):
+            raise HTTPError(400, "'params' muss ein Objekt sein")
+
+        digest = params_hash(params, size, fmt)
+        etag = f'"{digest[:32]}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={CACHE_MAX_AGE}",
+        }
+        if _etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(304, headers=headers)
+
+        if fmt == "svg":
+            body = png_to_svg(await self._render_cached(params, size, "png"))
+        else:
+            body = await self._render_cached(params, size, fmt)
+        return Response(200, body, FORMATS[fmt], headers)
+
+    async def list_ratings(self, request: Request) -> Response:
+        after_id = _int_arg(request.query, "after_id", 0, 0, 2**63 - 1)
+        limit = _int_arg(request.query, "limit", 100, 1, 1000)
+        page = await asyncio.to_thread(
+            lambda: next(self.db.iter_evaluations(batch_size=limit, after_id=after_id), [])
+        )
+        next_after = page[-1]["id"] if len(page) == limit else None
+        return Response.json({"items": page, "next_after_id": next_after})
+
+    async def get_rating(self, request: Request) -> Response:
+        try:
+            evaluation_id = int(request.path.rsplit("/", 1)[1])
+        except ValueError:
+            raise HTTPError(404, "Nicht gefunden")
+        entry = await asyncio.to_thread(self.db.get_evaluation_with_image, evaluation_id)
+        if entry is None:
+            raise HTTPError(404, f"Eintrag {evaluation_id} nicht gefunden")
+        entry.pop("image_blob", None)
+        return Response.json(entry)
+
+    async def create_rating(self, request: Request) -> Response:
+        data = request.json()
+        rating = _int_arg(data, "rating", 0, 1, 5)
+        comment = data.get("comment") or None
+        if comment is not None and not isinstance(comment, str):
+            raise HTTPError(400, "'comment' muss ein String sein")
+
+        if "evaluation_id" in data:
+            evaluation_id = _int_arg(data, "evaluation_id", 0, 1, 2**63 - 1)
+            exists = await asyncio.to_thread(self.db.evaluation_exists, evaluation_id)
+            if not exists:
+                raise HTTPError(404, f"Eintrag {evaluation_id} nicht gefunden")
+            await asyncio.to_thread(self.db.save_rating, evaluation_id, rating, comment)
+            return Response.json({"id": evaluation_id, "rating": rating})
+
+        description = _description(data)
+        params = _analyze(description)
+        image_format = image_encoding.IMAGE_FORMAT
+        image = await self._render_cached(params, RATING_RENDER_SIZE, image_format)
+
+        def save() -> int:
+            from imagegen import render_info
+            new_id = self.db.save_visualization(description, params, image, image_format, render_info(params, RATING_RENDER_SIZE))
+            self.db.save_rating(new_id, rating, comment)
+            return new_id
+
+        new_id = await asyncio.to_thread(save)
+        return Response.json({"id": new_id, "rating": rating}, 201, {"Location": f"/ratings/{new_id}"})
+
+
+    # ── Job-Queue (Koordinator für job_queue.py work --url …) ────────────────
+
+    async def enqueue_jobs(self, request: Request) -> Response:
+        jobs = request.json().get("jobs")
+        if not isinstance(jobs, list) or not all(isinstance(j, dict) and "kind" in j and "payload" in j for j in jobs):
+            raise HTTPError(400, "'jobs' muss eine Liste von {kind, payload} sein")
+        added = await asyncio.to_thread(self.jobs.enqueue_many, jobs)
+        return Response.json({"added": added})
+
+    async def lease_jobs(self, request: Request) -> Response:
+        data = request.json()
+        limit = _int_arg(data, "limit", 1, 1, MAX_JOB_LEASE)
+        jobs = await asyncio.to_thread(self.jobs.lease, _worker_name(data), limit)
+        return Response.json({"jobs": jobs})
+
+    async def heartbeat_jobs(self, request: Request) -> Response:
+        data = request.json()
+        active = await asyncio.to_thread(self.jobs.heartbeat, _worker_name(data), _tokens(data))
+        return Response.json({"active": active})
+
+    async def complete_job(self, request: Request) -> Response:
+        import job_queue
+        data = request.json()
+        result = data.get("result")
+        if not isinstance(result, dict):
+            raise HTTPError(400, "'result' muss ein Objekt sein")
+        try:
+            stored = await asyncio.to_thread(self.jobs.complete, _token(data), job_queue.decode_result(result))
+        except job_queue.LeaseLost:
+            raise HTTPError(409, "Lease abgelaufen")
+        return Response.json({"result": stored})
+
+    async def fail_job(self, request: Request) -> Response:
+        import job_queue
+        data = request.json()
+        try:
+            state = await asyncio.to_thread(self.jobs.fail, _token(data), str(data.get("error", ""))[:2000])
+        except job_queue.LeaseLost:
+            raise HTTPError(409, "Lease abgelaufen")
+        return Response.json({"state": state})
+
+    async def release_jobs(self, request: Request) -> Response:
+        released = await asyncio.to_thread(self.jobs.release, _tokens(request.json()))
+        return Response.json({"released": released})
+
+    async def job_stats(self, request: Request) -> Response:
+        return Response.json(await asyncio.to_thread(self.jobs.stats))
+
+
+def _worker_name(data: Dict[str, Any]) -> str:
+    worker = data.get("worker")
+    if not isinstance(worker, str) or not worker or len(worker) > 200:
+        raise HTTPError(400, "'worker' fehlt")
+    return worker
+
+
+def _token(data: Dict[str, Any]) -> str:
+    token = data.get("token")
+    if not isinstance(token, str) or not token:
+        raise HTTPError(400, "'token' fehlt")
+    return token
+
+
+def _tokens(data: Dict[str, Any]) -> List[str]:
+    tokens = data.get("tokens", [])
+    if not isinstance(tokens, list) or not all(isinstance(t, str) for t in tokens):
+        raise HTTPError(400, "'tokens' muss eine Liste von Strings sein")
+    return tokens
+
+
+async def serve(host: str, port: int, workers: Optional[int] = None):
+    api = RenderAPI(workers=workers)
+    server = await api.start(host, port)
+    print(f"[render_api] http://{host}:{port} ({api.workers} Render-Prozesse)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        api.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP-API für Analyse, Rendering und Bewertungen")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=None, help="Anzahl Render-Prozesse")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Inkrementelles Neu-Rendern des Archivs nach Änderungen am Renderer.
+
+Jedes lokal gerenderte Bild wird mit ``imagegen.RENDERER_VERSION`` und dem
+Fingerprint der Renderer-Teile gespeichert, von denen es abhing
+(``imagegen.render_fingerprint``: Weintyp-Zweig mit Layer-1-Verlauf und
+Kreismaske, sichtbare Ringe, Bläschen, Restzucker-Balken). Nach einer
+Änderung z.B. an ``RING_DEFINITIONS`` sind nur die Einträge veraltet, deren
+Fingerprint sich dadurch ändert. Mit reduzierter Genauigkeit gerenderte
+Bilder (WINE_RENDER_PRECISION) haben einen eigenen Fingerprint und gelten
+ebenfalls als veraltet; neu gerendert wird immer exakt.
+
+Ablauf:
+- Planen: Version und Fingerprint jedes Eintrags gegen den aktuellen Code
+  prüfen (nur Parameter, keine Bilder; etwa 0,1 ms pro Eintrag)
+- veraltete Einträge in Batches an einen Prozess-Pool: rendern in der Größe
+  des gespeicherten Bildes, im gespeicherten Format kodieren und mit dem
+  alten Bild vergleichen
+- pro Batch eine Transaktion: geänderte Bilder werden samt Vorschaubild,
+  Hash und Version getauscht, bei pixelgleichen wird nur die Version
+  nachgetragen – Leser sehen immer entweder das alte oder das neue Bild
+
+Einträge ohne Version (vor dieser Spalte gespeichert, mit Bild importiert
+oder von der externen API) werden nur übernommen, wenn das neu gerenderte Bild
+pixelgleich ist. Abweichende bleiben unverändert, da es sich um Bilder der
+externen API handeln kann; ``--include-unversioned`` ersetzt auch diese.
+
+Verwendung:
+    python rerender.py                                # veraltete Einträge neu rendern
+    python rerender.py --dry-run                      # nur zählen
+    python rerender.py --include-unversioned --processes 8
+    python rerender.py --verify                       # Selbsttest: unverändert bleibt unverändert
+"""
+import argparse
+import concurrent.futures
+import io
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import expert_db as db
+
+
+# Einträge pro Worker-Aufgabe und Transaktion
+BATCH_SIZE = 32
+# Batches pro Worker-Prozess, die gleichzeitig unterwegs sein dürfen
+PREFETCH = 2
+
+
+def plan(include_unversioned: bool = True, up_to_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Liefert die Einträge, die neu gerendert werden müssen, mit ``reason``:
+    "version" (RENDERER_VERSION geändert), "fingerprint" oder "unversioned".
+    """
+    from imagegen import RENDERER_VERSION, render_fingerprint
+    for page in db.iter_render_info(up_to_id=up_to_id):
+        for row in page:
+            if row["renderer_version"] is None:
+                if not include_unversioned:
+                    continue
+                row["reason"] = "unversioned"
+            elif row["renderer_version"] != RENDERER_VERSION:
+                row["reason"] = "version"
+            elif row["render_fingerprint"] != render_fingerprint(row["viz_params"]):
+                row["reason"] = "fingerprint"
+            else:
+                continue
+            yield row
+
+
+def _same_pixels(a: bytes, b: bytes) -> bool:
+    import numpy as np
+    from PIL import Image
+    with Image.open(io.BytesIO(a)) as img_a, Image.open(io.BytesIO(b)) as img_b:
+        if img_a.size != img_b.size:
+            return False
+        return np.array_equal(np.asarray(img_a.convert("RGB")), np.asarray(img_b.convert("RGB")))
+
+
+def _rerender_one(row: Dict[str, Any], stored: bytes, stored_format: str) -> Dict[str, Any]:
+    """
+    Worker: Eintrag in der Größe des gespeicherten Bildes neu rendern (immer
+    exakt, unabhängig von WINE_RENDER_PRECISION) und vergleichen.
+
+    Verglichen werden die dekodierten Pixel beider kodierter Bilder, damit
+    auch verlustbehaftete Formate bei unveränderter Ausgabe als gleich gelten.
+    """
+    from PIL import Image
+    from image_encoding import IMAGE_FORMAT, encode_image, is_available
+    from imagegen import render_info, render_wine_image
+    with Image.open(io.BytesIO(stored)) as img:
+        # Render-Größe = Höhe; der Restzucker-Balken macht das Bild nur breiter
+        size = img.height
+    fmt = stored_format if is_available(stored_format) else IMAGE_FORMAT
+    img = render_wine_image(row["viz_params"], size, precision="exact")
+    image = encode_image(img, fmt)
+    result = {"id": row["id"], "reason": row["reason"], "render_info": render_info(row["viz_params"], size, "exact")}
+    if fmt == stored_format and (image == stored or _same_pixels(image, stored)):
+        result["changed"] = False
+        return result
+    thumbnail, image_hash = db.image_derivatives(img)
+    result.update(changed=True, image=image, format=fmt, derivatives=(thumbnail, image_hash))
+    return result
+
+
+def _rerender_batch(items: List[tuple]) -> List[Dict[str, Any]]:
+    """Worker: ein Batch (Eintrag, Bild, Format); Fehler betreffen nur den einzelnen Eintrag."""
+    results = []
+    for row, stored, stored_format in items:
+        try:
+            results.append(_rerender_one(row, stored, stored_format))
+        except Exception as e:
+            results.append({"id": row["id"], "error": f"{type(e).__name__}: {e}"})
+    return results
+
+
+def _store(results: List[Dict[str, Any]], replace_unversioned: bool, counts: Dict[str, int]):
+    """Schreibt einen Batch in einer Transaktion."""
+    with db.write_transaction("rerender") as conn:
+        for r in results:
+            if "error" in r:
+                counts["errors"] += 1
+                print(f"[rerender] Eintrag {r['id']}: {r['error']}")
+            elif not r["changed"]:
+                db.set_render_info(conn, r["id"], r["render_info"])
+                counts["unchanged"] += 1
+            elif r["reason"] == "unversioned" and not replace_unversioned:
+                counts["skipped"] += 1
+            elif db.replace_image(conn, r["id"], r["image"], r["format"], r["derivatives"], r["render_info"]):
+                counts["replaced"] += 1
+            else:
+                counts["missing"] += 1
+
+
+def verify(sizes=(128, 350)) -> List[str]:
+    """
+    Prüft, dass ein unveränderter Renderer "unverändert" statt "ersetzt"
+    ergibt: Referenzprofile (bench_render.PROFILES, auch mit Restzucker-Balken
+    und Bläschen) werden gerendert und wie ein veralteter Eintrag erneut
+    verglichen. Liefert die abweichenden Fälle.
+    """
+    from bench_render import PROFILES
+    from image_encoding import IMAGE_FORMAT, encode_image
+    from imagegen import render_wine_image
+    failures = []
+    for name, params in PROFILES.items():
+        for size in sizes:
+            stored = encode_image(render_wine_image(params, size, precision="exact"), IMAGE_FORMAT)
+            row = {"id": 0, "reason": "version", "viz_params": params}
+            if _rerender_one(row, stored, IMAGE_FORMAT)["changed"]:
+                failures.append(f"{name}@{size}")
+    return failures
+
+
+def rerender(
+    include_unversioned: bool = False,
+    processes: Optional[int] = None,
+    batch_size: int = BATCH_SIZE,
+) -> Dict[str, int]:
+    """
+    Rendert alle veralteten Einträge neu und tauscht geänderte Bilder aus.
+
+    Args:
+        include_unversioned: Auch abweichende Einträge ohne Version ersetzen
+            (pixelgleiche werden immer übernommen)
+        processes: Worker-Prozesse (Standard: CPU-Kerne)
+        batch_size: Einträge pro Worker-Aufgabe und Transaktion
+
+    Returns:
+        Zähler: planned, replaced, unchanged, skipped, missing, errors
+    """
+    processes = processes or os.cpu_count() or 1
+    counts = dict.fromkeys(("planned", "replaced", "unchanged", "skipped", "missing", "errors"), 0)
+    _, max_id = db.count_evaluations()
+    rows = plan(up_to_id=max_id)
+    in_flight: set = set()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        while True:
+            batch = [row for _, row in zip(range(batch_size), rows)]
+            if batch:
+                counts["planned"] += len(batch)
+                images = db.get_images([row["id"] for row in batch])
+                items = [(row,) + images[row["id"]] for row in batch if row["id"] in images]
+                counts["missing"] += len(batch) - len(items)
+                in_flight.add(pool.submit(_rerender_batch, items))
+            if not in_flight:
+                break
+            if batch and len(in_flight) < processes * PREFETCH:
+                continue
+            done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                _store(future.result(), include_unversioned, counts)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Veraltete Bilder im Archiv neu rendern")
+    parser.add_argument("--dry-run", action="store_true", help="Nur zählen, nichts rendern")
+    parser.add_argument("--include-unversioned", action="store_true",
+                        help="Auch abweichende Einträge ohne Renderer-Version ersetzen")
+    parser.add_argument("--processes", type=int, default=None, help="Worker-Prozesse (Standard: CPU-Kerne)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--verify", action="store_true",
+                        help="Prüfen, dass unveränderte Bilder als unverändert erkannt werden")
+    args = parser.parse_args()
+
+    if args.verify:
+        failures = verify()
+        print("[rerender] Vergleich ok" if not failures else f"[rerender] als geändert erkannt: {failures}")
+        raise SystemExit(1 if failures else 0)
+
+    start = time.perf_counter()
+    if args.dry_run:
+        reasons: Dict[str, int] = {}
+        for row in plan():
+            reasons[row["reason"]] = reasons.get(row["reason"], 0) + 1
+        detail = ", ".join(f"{reason}: {n}" for reason, n in sorted(reasons.items())) or "keine"
+        print(f"[rerender] {sum(reasons.values())} Einträge veraltet ({detail})")
+        return
+
+    counts = rerender(args.include_unversioned, args.processes, args.batch_size)
+    print(f"[rerender] {counts['planned']} veraltet: {counts['replaced']} ersetzt, "
+          f"{counts['unchanged']} unverändert, {counts['skipped']} ohne Version übersprungen, "
+          f"{counts['missing']} gelöscht, {counts['errors']} Fehler "
+          f"({time.perf_counter() - start:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
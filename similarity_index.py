@@ -0,0 +1,443 @@
+"""
+Ähnlichkeitsindex über die Visualisierungs-Parameter ("Ähnliche Weine").
+
+Jeder Eintrag in ``evaluations`` wird als float32-Vektor abgelegt:
+
+- die 16 numerischen Parameter des Textanalysators (0..1, Restzucker auf der
+  logarithmischen Skala des Restzucker-Balkens)
+- die Helligkeit der Basisfarbe (wie in imagegen: Mittel der RGB-Werte)
+- der Weintyp als One-Hot über weiß/rot/rosé ("auto" wird wie in imagegen
+  aus der Basisfarbe bestimmt)
+
+Die Suche ist Brute-Force über die ganze Matrix (|v|² - 2·v·q, dann
+argpartition); bei 20 Dimensionen ist das auch für zehntausende Einträge
+deutlich schneller als eine Millisekunde und braucht keinen Baum, der bei
+Löschungen umgebaut werden müsste.
+
+Der Index liegt neben der Datenbank (``evaluations.similarity.npz``) und
+wird über expert_db.add_change_listener inkrementell nachgeführt. Der
+Listener läuft im Writer-Thread und merkt sich nur die IDs; gelesen wird
+erst bei der nächsten Abfrage, gebündelt in einer Abfrage.
+
+Verwendung:
+    python similarity_index.py build
+    python similarity_index.py query "Riesling, Limette, Schiefer" -k 5
+    python similarity_index.py bench --rows 20000
+"""
+import atexit
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+import expert_db as db
+
+
+NUMERIC_KEYS = (
+    "acidity", "body", "tannin", "depth", "sweetness", "oak_intensity", "effervescence",
+    "mineral_intensity", "herbal_intensity", "spice_intensity",
+    "fruit_citrus", "fruit_stone", "fruit_tropical", "fruit_red", "fruit_dark",
+    "residual_sugar",
+)
+WINE_TYPES = ("white", "red", "rose")
+DIMENSIONS = len(NUMERIC_KEYS) + 1 + len(WINE_TYPES)
+
+# Gewicht des Weintyps: verschiedene Typen liegen √2·Gewicht auseinander
+WINE_TYPE_WEIGHT = float(os.environ.get("WINE_SIMILARITY_TYPE_WEIGHT", 1.0))
+
+# Restzucker-Skala wie overlays.SugarBar (log10, 1..500 g/L → 0..1)
+SUGAR_MIN = 1.0
+SUGAR_MAX = 500.0
+
+# Bei Änderung der Merkmale wird eine gespeicherte Datei verworfen
+FEATURE_VERSION = 1
+
+# Index höchstens alle SAVE_INTERVAL Sekunden auf die Platte schreiben (plus beim Beenden)
+SAVE_INTERVAL = float(os.environ.get("WINE_SIMILARITY_SAVE_INTERVAL", 30))
+
+
+def index_path() -> Path:
+    """Datei des Index neben der aktuellen Datenbank."""
+    return db.DB_PATH.with_name(db.DB_PATH.stem + ".similarity.npz")
+
+
+def _float(params: Dict[str, Any], key: str) -> float:
+    try:
+        value = float(params.get(key) or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+    return value if math.isfinite(value) else 0.0
+
+
+def _sugar_scale(residual_sugar: float) -> float:
+    if residual_sugar <= 0:
+        return 0.0
+    clamped = max(SUGAR_MIN, min(residual_sugar, SUGAR_MAX))
+    return math.log10(clamped) / math.log10(SUGAR_MAX)
+
+
+def _base_rgb(params: Dict[str, Any]) -> Tuple[int, int, int]:
+    hex_str = str(params.get("base_color_hex") or "#F6F2AF").lstrip("#")
+    try:
+        return int(hex_str[0:2], 16), int(hex_str[2:4], 16), int(hex_str[4:6], 16)
+    except ValueError:
+        return 246, 242, 175
+
+
+def wine_type(params: Dict[str, Any]) -> str:
+    """Weintyp wie ihn imagegen._Scene verwendet ("auto" wird aus der Basisfarbe bestimmt)."""
+    value = params.get("wine_type", "auto")
+    if value in WINE_TYPES:
+        return value
+    rgb = _base_rgb(params)
+    brightness = sum(rgb) / 3 / 255.0
+    if brightness < 0.5:
+        return "red"
+    if brightness < 0.7 and rgb[0] > rgb[1] + 30 and rgb[1] < 160:
+        return "rose"
+    return "white"
+
+
+def vectorize(params: Dict[str, Any]) -> np.ndarray:
+    """Merkmalsvektor (float32, Länge DIMENSIONS) für ein viz_params-Dict."""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for i, key in enumerate(NUMERIC_KEYS):
+        value = _float(params, key)
+        vector[i] = _sugar_scale(value) if key == "residual_sugar" else value
+    vector[len(NUMERIC_KEYS)] = sum(_base_rgb(params)) / 3 / 255.0
+    vector[len(NUMERIC_KEYS) + 1 + WINE_TYPES.index(wine_type(params))] = WINE_TYPE_WEIGHT
+    return vector
+
+
+def _db_signature() -> Tuple[float, ...]:
+    """Kennzahlen des DB-Inhalts, mit denen eine gespeicherte Datei abgeglichen wird."""
+    conn = db._connect()
+    row = conn.execute(
+        "SELECT COUNT(*), TOTAL(id), COUNT(rating), TOTAL(rating) FROM evaluations"
+    ).fetchone()
+    conn.close()
+    return tuple(float(v) for v in row)
+
+
+class SimilarityIndex:
+    """
+    Vektoren aller Einträge mit ID und Bewertung.
+
+    Zeilen liegen dicht in vorab vergrößerten Arrays (Kapazität verdoppelt
+    sich); beim Löschen rückt die letzte Zeile in die Lücke.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._lock = threading.Lock()
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._vectors = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        self._ratings = np.full(capacity, np.nan, dtype=np.float32)
+        self._rows: Dict[int, int] = {}
+        self._n = 0
+        self._max_id = 0
+        # Vom Listener gesammelt, bei der nächsten Abfrage angewendet
+        self._pending: Set[int] = set()
+        self._catch_up = False
+        self._resync = False
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return self._n
+
+    # ── Pflege ───────────────────────────────────────────────────────────────
+
+    def _grow(self, needed: int):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        n = self._n
+        ids = np.zeros(capacity, dtype=np.int64)
+        vectors = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        norms = np.zeros(capacity, dtype=np.float32)
+        ratings = np.full(capacity, np.nan, dtype=np.float32)
+        ids[:n], vectors[:n], norms[:n], ratings[:n] = (
+            self._ids[:n], self._vectors[:n], self._norms[:n], self._ratings[:n]
+        )
+        self._ids, self._vectors, self._norms, self._ratings = ids, vectors, norms, ratings
+
+    def _upsert(self, evaluation_id: int, params: Dict[str, Any], rating: Optional[int]):
+        row = self._rows.get(evaluation_id)
+        if row is None:
+            self._grow(self._n + 1)
+            row = self._n
+            self._n += 1
+            self._rows[evaluation_id] = row
+            self._ids[row] = evaluation_id
+            self._max_id = max(self._max_id, evaluation_id)
+        vector = vectorize(params)
+        self._vectors[row] = vector
+        self._norms[row] = vector @ vector
+        self._ratings[row] = np.nan if rating is None else rating
+        self._dirty = True
+
+    def _remove(self, evaluation_id: int):
+        row = self._rows.pop(evaluation_id, None)
+        if row is None:
+            return
+        last = self._n - 1
+        if row != last:
+            moved_id = int(self._ids[last])
+            self._ids[row] = moved_id
+            self._vectors[row] = self._vectors[last]
+            self._norms[row] = self._norms[last]
+            self._ratings[row] = self._ratings[last]
+            self._rows[moved_id] = row
+        self._ratings[last] = np.nan
+        self._n = last
+        self._dirty = True
+
+    def add_rows(self, rows: Iterable[Dict[str, Any]]):
+        """Übernimmt Einträge im Format von expert_db.iter_evaluations."""
+        with self._lock:
+            for row in rows:
+                self._upsert(row["id"], row["viz_params"], row["rating"])
+
+    def build(self, batch_size: int = 2000) -> "SimilarityIndex":
+        """Baut den Index komplett aus der Datenbank auf."""
+        start = time.perf_counter()
+        for batch in db.iter_evaluations(batch_size=batch_size):
+            self.add_rows(batch)
+        print(f"[similarity_index] {self._n} Einträge indiziert ({time.perf_counter() - start:.2f}s)")
+        return self
+
+    def on_change(self, event: str, evaluation_id: Optional[int]):
+        """
+        Listener für expert_db.add_change_listener.
+
+        Läuft im Writer-Thread: nur vormerken, nicht lesen (kein wait_for,
+        keine Abfrage, damit der Writer nicht blockiert).
+        """
+        with self._lock:
+            if event in ("save", "rating", "delete") and evaluation_id is not None:
+                self._pending.add(evaluation_id)
+            elif event == "import":
+                # Importierte Einträge bekommen neue, größere IDs
+                self._catch_up = True
+            elif event == "external":
+                # Anderer Prozess: welche Einträge betroffen sind, ist unbekannt
+                self._resync = True
+
+    def _sync(self):
+        """Wendet vorgemerkte Änderungen an (aufrufen mit gehaltenem Lock)."""
+        if self._resync:
+            self._resync = False
+            self._pending.clear()
+            self._rows.clear()
+            self._ratings[:] = np.nan
+            self._n = self._max_id = 0
+            self._dirty = True
+            self._catch_up = True
+        if self._pending:
+            ids = sorted(self._pending)
+            self._pending.clear()
+            found = {}
+            for start in range(0, len(ids), 500):  # SQLite-Limit für Parameter
+                found.update((row["id"], row) for row in db.get_viz_params(ids[start:start + 500]))
+            for evaluation_id in ids:
+                row = found.get(evaluation_id)
+                if row is None:
+                    self._remove(evaluation_id)
+                else:
+                    self._upsert(evaluation_id, row["viz_params"], row["rating"])
+        if self._catch_up:
+            self._catch_up = False
+            for batch in db.iter_evaluations(batch_size=2000, after_id=self._max_id):
+                for row in batch:
+                    self._upsert(row["id"], row["viz_params"], row["rating"])
+        if self._dirty and time.monotonic() - self._saved_at > SAVE_INTERVAL:
+            self._save()
+
+    # ── Abfrage ──────────────────────────────────────────────────────────────
+
+    def query(
+        self,
+        params: Dict[str, Any],
+        k: int = 5,
+        rated_only: bool = True,
+        exclude_id: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Die ``k`` nächsten Einträge zu ``params``.
+
+        Args:
+            params: viz_params des gesuchten Weins
+            k: Anzahl Treffer
+            rated_only: Nur bewertete Einträge liefern
+            exclude_id: Diesen Eintrag auslassen (z.B. den angezeigten selbst)
+
+        Returns:
+            Liste von Dicts mit id, distance und rating, nächster Treffer zuerst
+        """
+        q = vectorize(params)
+        with self._lock:
+            if self._pending or self._catch_up or self._resync:
+                self._sync()
+            n = self._n
+            if n == 0 or k <= 0:
+                return []
+            ratings = self._ratings[:n]
+            # |v - q|² ohne den für alle gleichen Term |q|²
+            scores = self._norms[:n] - 2.0 * (self._vectors[:n] @ q)
+            if rated_only:
+                scores = np.where(np.isnan(ratings), np.inf, scores)
+            if exclude_id is not None and exclude_id in self._rows:
+                scores[self._rows[exclude_id]] = np.inf
+            k = min(k, n)
+            top = np.argpartition(scores, k - 1)[:k] if k < n else np.arange(n)
+            top = top[np.argsort(scores[top], kind="stable")]
+            q_norm = float(q @ q)
+            return [
+                {
+                    "id": int(self._ids[i]),
+                    "distance": math.sqrt(max(float(scores[i]) + q_norm, 0.0)),
+                    "rating": None if np.isnan(ratings[i]) else int(ratings[i]),
+                }
+                for i in top if np.isfinite(scores[i])
+            ]
+
+    # ── Persistenz ───────────────────────────────────────────────────────────
+
+    def _signature(self) -> Tuple[float, ...]:
+        n = self._n
+        ratings = self._ratings[:n]
+        rated = ~np.isnan(ratings)
+        return (
+            float(n), float(self._ids[:n].sum()),
+            float(rated.sum()), float(ratings[rated].sum()),
+        )
+
+    def _save(self):
+        path = index_path()
+        tmp = path.with_name(path.name + ".tmp")
+        n = self._n
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                version=np.int64(FEATURE_VERSION),
+                type_weight=np.float32(WINE_TYPE_WEIGHT),
+                signature=np.array(self._signature(), dtype=np.float64),
+                ids=self._ids[:n], vectors=self._vectors[:n], ratings=self._ratings[:n],
+            )
+        os.replace(tmp, path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def save(self):
+        """Schreibt den Index atomar neben die Datenbank (nach ausstehenden Schreibzugriffen)."""
+        db.flush_writes()
+        with self._lock:
+            self._sync()
+            self._save()
+
+    def _load(self, path: Path) -> bool:
+        """Lädt eine gespeicherte Datei, sofern sie zur Datenbank passt."""
+        try:
+            with np.load(path) as data:
+                if int(data["version"]) != FEATURE_VERSION or float(data["type_weight"]) != np.float32(WINE_TYPE_WEIGHT):
+                    return False
+                signature = tuple(float(v) for v in data["signature"])
+                ids, vectors, ratings = data["ids"], data["vectors"], data["ratings"]
+        except (OSError, KeyError, ValueError) as e:
+            print(f"[similarity_index] Datei nicht lesbar ({e})")
+            return False
+        if signature != _db_signature():
+            return False
+        with self._lock:
+            n = len(ids)
+            self._grow(n)
+            self._ids[:n], self._vectors[:n], self._ratings[:n] = ids, vectors, ratings
+            self._norms[:n] = np.einsum("ij,ij->i", vectors, vectors)
+            self._rows = {int(evaluation_id): row for row, evaluation_id in enumerate(ids)}
+            self._n = n
+            self._max_id = int(ids.max()) if n else 0
+        return True
+
+
+def open_index() -> SimilarityIndex:
+    """
+    Lädt den gespeicherten Index oder baut ihn neu auf und hält ihn aktuell.
+
+    Der Listener wird vor dem Laden registriert, damit keine Änderung
+    dazwischen verloren geht (doppelt angewendete Änderungen sind harmlos).
+    """
+    index = SimilarityIndex()
+    db.add_change_listener(index.on_change)
+    path = index_path()
+    if path.exists() and index._load(path):
+        print(f"[similarity_index] {len(index)} Einträge aus {path.name} geladen")
+    else:
+        index.build()
+        index.save()
+    atexit.register(index.save)
+    return index
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CLI
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _bench(rows: int, queries: int, k: int):
+    """Abfragezeit auf zufälligen Vektoren (ohne Datenbank)."""
+    rng = np.random.default_rng(0)
+    index = SimilarityIndex()
+    samples = []
+    for i in range(rows):
+        params = {key: float(rng.random()) for key in NUMERIC_KEYS}
+        params["residual_sugar"] = float(rng.uniform(0, 300))
+        params["wine_type"] = WINE_TYPES[i % 3]
+        samples.append(params)
+        index._upsert(i + 1, params, int(rng.integers(1, 6)) if rng.random() < 0.7 else None)
+    times = []
+    for i in range(queries):
+        start = time.perf_counter()
+        index.query(samples[i % rows], k=k)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    print(f"{rows} Einträge, k={k}: Median {times[len(times) // 2] * 1e3:.3f} ms, "
+          f"p99 {times[int(len(times) * 0.99)] * 1e3:.3f} ms")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ähnlichkeitsindex über viz_params")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="Index aus der Datenbank neu aufbauen und speichern")
+    p_query = sub.add_parser("query", help="Ähnliche bewertete Weine zu einer Beschreibung")
+    p_query.add_argument("description")
+    p_query.add_argument("-k", type=int, default=5)
+    p_query.add_argument("--all", action="store_true", help="Auch unbewertete Einträge")
+    p_bench = sub.add_parser("bench", help="Abfragezeit mit synthetischen Einträgen messen")
+    p_bench.add_argument("--rows", type=int, default=20000)
+    p_bench.add_argument("--queries", type=int, default=2000)
+    p_bench.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        _bench(args.rows, args.queries, args.k)
+    elif args.command == "build":
+        SimilarityIndex().build().save()
+        print(f"[similarity_index] gespeichert: {index_path()}")
+    else:
+        from text_analyzer import analyze_wine_description
+        index = open_index()
+        params = analyze_wine_description(args.description)
+        for hit in index.query(params, k=args.k, rated_only=not args.all):
+            print(f"ID {hit['id']:>6}  Abstand {hit['distance']:.3f}  {'⭐' * (hit['rating'] or 0) or '❓'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Startzeit-Profil: Import-Zeiten der Module und Zeit bis zum ersten Rendern der App.
+
+Jede Messung läuft in einem frischen Python-Prozess, damit nichts aus einem
+vorherigen Lauf im Modul-Cache liegt.
+
+Verwendung:
+    python startup_profile.py imports                      # Import-Zeiten (python -X importtime)
+    python startup_profile.py imports --module render_api --top 30
+    python startup_profile.py first-paint --repeat 5       # erster Skriptlauf von app.py (Median)
+    python startup_profile.py all --json > startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+
+ROOT = Path(__file__).parent
+
+# Module, deren Importkosten beim Start eine Rolle spielen
+DEFAULT_MODULES = ("app_cache", "expert_db", "imagefetch", "imagegen", "text_analyzer", "render_api")
+
+# Misst den ersten Lauf von app.py ohne die Importzeit von Streamlit selbst;
+# ein leeres Skript läuft vorher, damit auch die Testumgebung schon warm ist
+_FIRST_PAINT_SNIPPET = """
+import time
+from streamlit.testing.v1 import AppTest
+AppTest.from_string("import streamlit as st; st.title('warmup')").run()
+start = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=120).run()
+elapsed = time.perf_counter() - start
+print("FIRST_PAINT", elapsed, len(at.exception))
+"""
+
+
+def _run_python(args: List[str], env: Dict[str, str] = None) -> subprocess.CompletedProcess:
+    # Ohne Bytecode-Cache würde jeder Lauf geänderte Module neu kompilieren
+    environ = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+    return subprocess.run(
+        [sys.executable] + args, cwd=ROOT, capture_output=True, text=True,
+        env={**environ, **(env or {})},
+    )
+
+
+def _parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Parst die Ausgabe von ``-X importtime`` (Zeiten in Mikrosekunden)."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        name = name[1:]  # Einrückung nach dem Trennzeichen zeigt die Verschachtelung
+        entries.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_ms": int(self_us.strip()) / 1000,
+            "cumulative_ms": int(cumulative_us.strip()) / 1000,
+        })
+    return entries
+
+
+def profile_imports(module: str, top: int = 15) -> Dict[str, Any]:
+    """Importiert ``module`` in einem neuen Prozess und sammelt die teuersten Module."""
+    _run_python(["-c", f"import {module}"])  # Bytecode-Cache füllen, sonst misst man das Kompilieren
+    result = _run_python(["-X", "importtime", "-c", f"import {module}"])
+    if result.returncode != 0:
+        raise RuntimeError(f"Import von {module} fehlgeschlagen:\n{result.stderr[-2000:]}")
+    entries = _parse_importtime(result.stderr)
+    target = next((e for e in entries if e["module"] == module), None)
+    return {
+        "module": module,
+        "total_ms": round(target["cumulative_ms"], 2) if target else 0.0,
+        "module_count": len(entries),
+        "slowest": sorted(entries, key=lambda e: e["self_ms"], reverse=True)[:top],
+    }
+
+
+def profile_first_paint(repeat: int = 3, app: str = "app.py") -> Dict[str, Any]:
+    """Zeit für den ersten vollständigen Lauf von app.py (jeweils neuer Prozess)."""
+    snippet = _FIRST_PAINT_SNIPPET.format(app=str((ROOT / app).resolve()))
+    times = []
+    _run_python(["-c", snippet])  # Bytecode-Cache füllen
+    for _ in range(repeat):
+        result = _run_python(["-c", snippet])
+        line = next((l for l in result.stdout.splitlines() if l.startswith("FIRST_PAINT")), None)
+        if line is None:
+            raise RuntimeError(f"App-Lauf fehlgeschlagen:\n{result.stderr[-2000:]}")
+        _, seconds, exceptions = line.split()
+        if int(exceptions):
+            print(f"[startup] Warnung: app.py meldet {exceptions} Exception(s)", file=sys.stderr)
+        times.append(float(seconds) * 1000)
+    return {
+        "repeat": repeat,
+        "median_ms": round(statistics.median(times), 1),
+        "min_ms": round(min(times), 1),
+        "runs_ms": [round(t, 1) for t in times],
+    }
+
+
+def _print_imports(report: Dict[str, Any]):
+    print(f"[startup] import {report['module']}: {report['total_ms']:.1f} ms, {report['module_count']} Module")
+    for entry in report["slowest"]:
+        print(f"    {entry['self_ms']:>8.2f} ms self {entry['cumulative_ms']:>9.2f} ms kumuliert  {entry['module']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startzeit-Profil")
+    parser.add_argument("command", choices=["imports", "first-paint", "all"])
+    parser.add_argument("--module", nargs="+", default=list(DEFAULT_MODULES))
+    parser.add_argument("--top", type=int, default=10, help="Teuerste Module pro Import anzeigen")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    report: Dict[str, Any] = {}
+    if args.command in ("imports", "all"):
+        report["imports"] = [profile_imports(m, args.top) for m in args.module]
+    if args.command in ("first-paint", "all"):
+        report["first_paint"] = profile_first_paint(args.repeat)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for entry in report.get("imports", []):
+        _print_imports(entry)
+    if "first_paint" in report:
+        fp = report["first_paint"]
+        print(f"[startup] erster Lauf von app.py: Median {fp['median_ms']} ms, "
+              f"Minimum {fp['min_ms']} ms ({fp['repeat']} Prozesse)")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ Basiert auf der Heuristik aus bsp_runner.py
 """
 from typing import Dict
 
+from perf import timed
+
 
 def _score(text: str, words: list[str]) -> float:
     """Zählt wie viele Wörter aus der Liste im Text vorkommen."""
@@ -12,6 +14,7 @@ def _score(text: str, words: list[str]) -> float:
     return min(1.0, hits / max(1, len(words)))
 
 
+@timed("analyzer.analyze")
 def analyze_wine_description(txt: str) -> Dict:
     """
     Analysiert eine Weinbeschreibung und extrahiert Visualisierungs-Parameter.